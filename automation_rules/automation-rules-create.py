@@ -19,8 +19,116 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import boto3
 import argparse
 import json
+import time
+import utils
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError
+
+# Clients shared by every region, keyed by session, service and region
+client_pool = utils.ClientPool(rate_limiter=utils.RateLimiter())
+
+# Progress events of every region, written by a background thread
+events = utils.EventLog()
+
+
+def prepare_rules(rule_definition):
+    """
+    Fills in the RuleOrder and Description of rule definitions that do not set them
+    :param rule_definition: rule definition dict, or list of rule definitions
+    :return: list of rule definitions
+    """
+
+    if isinstance(rule_definition, dict):
+        rule_definition = [rule_definition]
+
+    cnt = 1
+    for rule in rule_definition:
+        if not "RuleOrder" in rule:
+            rule["RuleOrder"] = cnt
+            cnt += 1
+        if not "Description" in rule:
+            rule[
+                "Description"
+            ] = f"Automatically created rule for {rule.get('RuleName','')}"
+    return rule_definition
+
+
+def get_deployed_rules(sh_client, rule_names):
+    """
+    Gets the deployed rules of a region sharing a name with the rule definitions
+    :param sh_client: SecurityHub client of the region
+    :param rule_names: set of RuleNames of the rule definitions
+    :return: dict of RuleName:AutomationRulesConfig, the first rule in rule order is used for duplicate names
+    :raises utils.UnprocessedRulesError: if some of the deployed rules could not be read
+    """
+
+    rule_arns = OrderedDict()
+    for metadata in utils.list_automation_rules(sh_client):
+        if metadata["RuleName"] in rule_names:
+            rule_arns.setdefault(metadata["RuleName"], metadata["RuleArn"])
+    if not rule_arns:
+        return dict()
+
+    rules, unprocessed = utils.get_automation_rules(sh_client, list(rule_arns.values()))
+    if unprocessed:
+        raise utils.UnprocessedRulesError(unprocessed)
+    return dict((rule["RuleName"], rule) for rule in rules)
+
+
+def deploy_region(session, aws_region, rules, deploy_mode):
+    """
+    Deploys the rule definitions to a region, creating missing rules and updating changed ones in upsert mode
+    :param session: boto3 Session of the account
+    :param aws_region: AWS Region to deploy to
+    :param rules: list of rule definitions
+    :param deploy_mode: upsert, or create to create every rule
+    :return: list of {aws_region: message} failures
+    """
+
+    start_time = time.time()
+    events.emit("deploy", "started", region=aws_region, message="Deploying rule to region: {}".format(aws_region))
+    sh_client = client_pool.client(session, "securityhub", aws_region)
+    failures = []
+
+    try:
+        if deploy_mode == "create":
+            to_create, to_update, unchanged = rules, [], []
+        else:
+            deployed_rules = get_deployed_rules(sh_client, set(rule["RuleName"] for rule in rules))
+            to_create, to_update, unchanged = utils.plan_rules(rules, deployed_rules)
+
+        # Unchanged rules are only counted in the region summary of the progress messages
+        for rule_name in unchanged:
+            events.emit("deploy_rule", "skipped", region=aws_region, rule=rule_name)
+
+        for rule in to_create:
+            sh_client.create_automation_rule(**rule)
+            events.emit("create_rule", "succeeded", region=aws_region, rule=rule.get("RuleName", ""),
+                        message=f"Rule {rule.get('RuleName','')} deployed successfully.")
+
+        for batch in utils.chunks(to_update, utils.AUTOMATION_RULES_BATCH_SIZE):
+            response = sh_client.batch_update_automation_rules(UpdateAutomationRulesRequestItems=batch)
+            for rule_arn in response.get("ProcessedAutomationRules", []):
+                events.emit("update_rule", "succeeded", region=aws_region, rule=rule_arn,
+                            message=f"Rule {rule_arn} updated successfully.")
+            for unprocessed in response.get("UnprocessedAutomationRules", []):
+                events.emit("update_rule", "failed", region=aws_region, rule=unprocessed.get("RuleArn"), error_code=unprocessed.get("ErrorCode"),
+                            message=f"Rule {unprocessed.get('RuleArn')} could not be updated: {unprocessed.get('ErrorMessage')}")
+                failures.append({aws_region: "Unable to update rule {}: {}".format(unprocessed.get("RuleArn"), unprocessed.get("ErrorMessage"))})
+
+    except (ClientError, BotoCoreError, utils.UnprocessedRulesError) as e:
+        events.emit("deploy", "failed", region=aws_region, duration=time.time() - start_time, error=e,
+                    message="Error Processing Region {}".format(aws_region))
+        failures.append({aws_region: repr(e)})
+        return failures
+
+    events.emit("deploy", "failed" if failures else "succeeded", region=aws_region, duration=time.time() - start_time,
+                created=len(to_create), updated=len(to_update), unchanged=len(unchanged),
+                message="Region {}: {} rules created, {} updated, {} unchanged".format(aws_region, len(to_create), len(to_update), len(unchanged)))
+    return failures
 
-from botocore.exceptions import ClientError
 
 parser = argparse.ArgumentParser(
     description="Deploy Security Hub automation rules to multiple regions."
@@ -36,27 +144,41 @@ parser.add_argument(
     type=argparse.FileType("r"),
     help="Path to json file containing the rule definition.",
 )
+parser.add_argument(
+    "--deploy_mode",
+    type=str,
+    choices=["upsert", "create"],
+    default="upsert",
+    help="upsert creates missing rules and updates changed rules matched by RuleName, create creates every rule again (default: upsert)",
+)
+parser.add_argument(
+    "--max_workers",
+    type=int,
+    default=10,
+    help="Number of regions to deploy to concurrently (default: 10)",
+)
+utils.add_region_arguments(parser)
+utils.add_client_arguments(parser)
+utils.add_event_arguments(parser)
 args = parser.parse_args()
 
-rule_definition = json.load(args.input_file)
+events.open(args.events_file)
+if args.max_workers < 1:
+    raise ValueError("max_workers must be at least 1")
+utils.configure_clients(client_pool, args)
+
+rules = prepare_rules(json.load(args.input_file))
 
 # Getting SecurityHub regions
 session = boto3.session.Session()
 
-securityhub_regions = []
 eligible_regions = []
 if args.enabled_regions:
     eligible_regions = [str(item) for item in args.enabled_regions.split(",")]
     print("Deploying rule in these regions: {}".format(eligible_regions))
 else:
     print("No regions provided.  Getting list of eligible regions")
-    securityhub_regions = session.get_available_regions("securityhub")
-    for aws_region in securityhub_regions:
-        acct_client = session.client("account")
-        acct_response = acct_client.get_region_opt_status(RegionName=aws_region)
-        region_status=(acct_response['RegionOptStatus'])
-        if region_status in ['ENABLED','ENABLED_BY_DEFAULT']:
-            eligible_regions.append(aws_region)
+    eligible_regions = utils.get_eligible_regions(session, "securityhub", args.regions_cache, args.regions_cache_ttl, client_pool, not args.all_available_regions, events)
 
     print(
         "Deploying rule in all available SecurityHub regions {}".format(
@@ -66,29 +188,16 @@ else:
 
 
 failed_regions = []
-for aws_region in eligible_regions:
-    print("Deploying rule to region: ", aws_region)
-    sh_client = session.client("securityhub", region_name=aws_region)
-    cnt = 1
-    try:
-        if isinstance(rule_definition, dict):
-            rule_definition = [rule_definition]
-        for rule in rule_definition:
-            if not "RuleOrder" in rule:
-                rule["RuleOrder"] = cnt
-                cnt += 1
-            if not "Description" in rule:
-                rule[
-                    "Description"
-                ] = f"Automatically created rule for {rule.get('RuleName','')}"
-
-            sh_client.create_automation_rule(**rule)
-            print(f"Rule {rule.get('RuleName','')} deployed successfully.")
-
-    except ClientError as e:
-        print("Error Processing Region {}".format(aws_region))
-        failed_regions.append({aws_region: repr(e)})
+with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+    region_futures = OrderedDict(
+        (aws_region, executor.submit(deploy_region, session, aws_region, rules, args.deploy_mode))
+        for aws_region in eligible_regions
+    )
+    # Collect failures in region order so the report does not depend on scheduling
+    for aws_region, future in region_futures.items():
+        failed_regions.extend(future.result())
 
+events.flush()
 if len(failed_regions) > 0:
     print("---------------------------------------------------------------")
     print("Failed Regions")
@@ -18,62 +18,155 @@ SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import boto3
 import argparse
+import csv
 import json
+import sys
+import utils
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError
+
+# Clients shared by every region, keyed by session, service and region
+client_pool = utils.ClientPool(rate_limiter=utils.RateLimiter())
+
+# Columns of the CSV output, Criteria and Actions are written as JSON
+CSV_FIELDS = ["Region", "RuleArn", "RuleName", "RuleOrder", "RuleStatus", "IsTerminal", "Description",
+              "CreatedAt", "UpdatedAt", "CreatedBy", "Criteria", "Actions"]
+
+
+def list_region_rules(session, aws_region, full_details):
+    """
+    Lists every automation rule of a region, following NextToken
+    :param session: boto3 Session of the account
+    :param aws_region: AWS Region to list
+    :param full_details: also get the Criteria and Actions of the rules with batch_get_automation_rules
+    :return: list of AutomationRulesMetadata, or of AutomationRulesConfig with full_details, in rule order
+    :raises utils.UnprocessedRulesError: if the details of some rules could not be read
+    """
+
+    sh_client = client_pool.client(session, "securityhub", aws_region)
+    rules = utils.list_automation_rules(sh_client)
+    if not full_details or not rules:
+        return rules
+
+    details, unprocessed = utils.get_automation_rules(sh_client, [rule["RuleArn"] for rule in rules])
+    if unprocessed:
+        raise utils.UnprocessedRulesError(unprocessed)
+    details = dict((rule["RuleArn"], rule) for rule in details)
+    return [details[rule["RuleArn"]] for rule in rules if rule["RuleArn"] in details]
+
+
+def print_region_rules(aws_region, rules):
+    print("*******************************************")
+    print("Retrieving rules from region: ", aws_region)
+    if rules:
+        for msg in rules:
+            print("------------------------------------")
+            print("Rule ARN: ", msg["RuleArn"])
+            print("Rule Name: ", msg["RuleName"])
+            print("Rule Status: ", msg["RuleStatus"])
+            print("Rule Order: ", msg["RuleOrder"])
+    else:
+        print("No rules in this region")
+
+
+def to_record(aws_region, rule):
+    """
+    Returns a rule as a JSON serializable dict with its region and ISO 8601 timestamps
+    """
+
+    record = OrderedDict([("Region", aws_region)])
+    for field, value in rule.items():
+        record[field] = value.isoformat() if hasattr(value, "isoformat") else value
+    return record
+
+
+def write_rules(region_rules, output_format, output):
+    """
+    Writes the rules of every region as a JSON list or as CSV rows
+    :param region_rules: OrderedDict of region:list of AutomationRulesConfig
+    :param output_format: json or csv
+    :param output: file object to write to
+    """
+
+    records = [to_record(aws_region, rule) for aws_region, rules in region_rules.items() for rule in rules]
+    if output_format == "json":
+        json.dump(records, output, indent=2)
+        output.write("\n")
+        return
+
+    writer = csv.DictWriter(output, fieldnames=CSV_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for record in records:
+        row = dict(record)
+        for field in ("Criteria", "Actions"):
+            row[field] = json.dumps(record.get(field, {} if field == "Criteria" else []), sort_keys=True)
+        writer.writerow(row)
 
-from botocore.exceptions import ClientError
 
 parser = argparse.ArgumentParser(description='List deployed automation rules in one or many regions.')
 parser.add_argument('--deployed_regions', type=str, required=False, help="Comma separated list of regions to list rules from. If not specified, rules from all regions will be retrieved.")
+parser.add_argument('--output_format', type=str, choices=['text', 'json', 'csv'], default='text', help="text prints a summary of each rule, json and csv write the full rules including Criteria and Actions (default: text)")
+parser.add_argument('--output_file', type=str, required=False, help="Optional path of the file the json or csv output is written to, instead of stdout")
+parser.add_argument('--max_workers', type=int, default=10, help="Number of regions to list concurrently (default: 10)")
+utils.add_region_arguments(parser)
+utils.add_client_arguments(parser)
 args = parser.parse_args()
 
+if args.max_workers < 1:
+    raise ValueError("max_workers must be at least 1")
+utils.configure_clients(client_pool, args)
+
+# Keep stdout machine readable when the json or csv output is written to it
+full_details = args.output_format != "text"
+log = sys.stderr if full_details and not args.output_file else sys.stdout
+
 # Getting SecurityHub regions
 session = boto3.session.Session()
 
-securityhub_regions = []
 eligible_regions = []
 if args.deployed_regions:
     eligible_regions = [str(item) for item in args.deployed_regions.split(",")]
-    print("Listing rules in these regions: {}".format(eligible_regions))
+    print("Listing rules in these regions: {}".format(eligible_regions), file=log)
 else:
-    print("No regions provided.  Getting list of eligible regions")
-    securityhub_regions = session.get_available_regions("securityhub")
-    for aws_region in securityhub_regions:
-        acct_client = session.client("account")
-        acct_response = acct_client.get_region_opt_status(RegionName=aws_region)
-        region_status=(acct_response['RegionOptStatus'])
-        if region_status in ['ENABLED','ENABLED_BY_DEFAULT']:
-            eligible_regions.append(aws_region)
+    print("No regions provided.  Getting list of eligible regions", file=log)
+    eligible_regions = utils.get_eligible_regions(session, "securityhub", args.regions_cache, args.regions_cache_ttl, client_pool, not args.all_available_regions, utils.EventLog(log))
 
     print(
         "Listing rules in all available SecurityHub regions {}".format(
             eligible_regions
-        )
+        ),
+        file=log,
     )
 
 
-for aws_region in eligible_regions:
-    print("*******************************************")
-    print("Retrieving rules from region: ", aws_region)
-    sh_client = session.client("securityhub", region_name=aws_region)
-
-    try:
-        rules = sh_client.list_automation_rules(MaxResults=100).get(
-            "AutomationRulesMetadata", []
-        )
-        if rules:
-            for msg in rules:
-                rule_arn = msg["RuleArn"]
-                rule_name = msg["RuleName"]
-                rule_status = msg["RuleStatus"]
-                rule_order = msg["RuleOrder"]
-                print("------------------------------------")
-                print("Rule ARN: ", rule_arn)
-                print("Rule Name: ", rule_name)
-                print("Rule Status: ", rule_status)
-                print("Rule Order: ", rule_order)
-        else:
-            print("No rules in this region")
-
-    except ClientError as e:
-        print("Error Processing Region {}".format(aws_region))
-        print(e)
+region_rules = OrderedDict()
+failed_regions = []
+with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+    region_futures = OrderedDict(
+        (aws_region, executor.submit(list_region_rules, session, aws_region, full_details))
+        for aws_region in eligible_regions
+    )
+    # Report the regions in order so the output does not depend on scheduling
+    for aws_region, future in region_futures.items():
+        try:
+            region_rules[aws_region] = future.result()
+        except (ClientError, BotoCoreError, utils.UnprocessedRulesError) as e:
+            print("Error Processing Region {}".format(aws_region), file=log)
+            print(e, file=log)
+            failed_regions.append(aws_region)
+            continue
+
+        if not full_details:
+            print_region_rules(aws_region, region_rules[aws_region])
+
+if full_details and args.output_file:
+    with open(args.output_file, "w", newline="") as output_file:
+        write_rules(region_rules, args.output_format, output_file)
+    print("Wrote {} rules from {} regions to {}".format(sum(len(rules) for rules in region_rules.values()), len(region_rules), args.output_file))
+elif full_details:
+    write_rules(region_rules, args.output_format, sys.stdout)
+
+if failed_regions:
+    print("Unable to list rules in regions: {}".format(", ".join(failed_regions)), file=log)
@@ -0,0 +1,130 @@
+import datetime
+import os
+import sys
+
+from botocore.utils import parse_timestamp
+from dateutil.tz import tzutc
+
+# The client, credential, rate limiting, metrics, event, region and standards helpers shared by every script
+# directory live in the common directory of the repository
+COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
+
+from sharedutils import (ClientPool, EventLog, RateLimiter, add_client_arguments, add_event_arguments, add_region_arguments,
+                         chunks, configure_clients, get_eligible_regions)
+
+# Maximum number of rules accepted by a single automation rules list or batch call
+AUTOMATION_RULES_BATCH_SIZE = 100
+
+# Fields compared with the deployed rule and sent to batch_update_automation_rules, Tags are only set on creation
+RULE_UPDATABLE_FIELDS = ('RuleStatus', 'RuleOrder', 'Description', 'IsTerminal', 'Criteria', 'Actions')
+
+# Keys of the automation rule criteria holding timestamps, returned as datetimes by SecurityHub
+RULE_TIMESTAMP_KEYS = ('Start', 'End')
+
+
+def list_automation_rules(sh_client):
+    """
+    Pages through the automation rules of a region
+    :param sh_client: SecurityHub client of the region
+    :return: list of AutomationRulesMetadata, in rule order
+    """
+
+    metadata = []
+    params = {'MaxResults': AUTOMATION_RULES_BATCH_SIZE}
+    while True:
+        response = sh_client.list_automation_rules(**params)
+        metadata.extend(response.get('AutomationRulesMetadata', []))
+        if not response.get('NextToken'):
+            return metadata
+        params['NextToken'] = response['NextToken']
+
+
+def get_automation_rules(sh_client, rule_arns):
+    """
+    Gets the full definition of automation rules, in batches of AUTOMATION_RULES_BATCH_SIZE rules
+    :param sh_client: SecurityHub client of the region
+    :param rule_arns: list of RuleArns to get
+    :return: tuple of (list of AutomationRulesConfig, list of UnprocessedAutomationRules)
+    """
+
+    rules = []
+    unprocessed = []
+    for batch in chunks(list(rule_arns), AUTOMATION_RULES_BATCH_SIZE):
+        response = sh_client.batch_get_automation_rules(AutomationRulesArns=batch)
+        rules.extend(response.get('Rules', []))
+        unprocessed.extend(response.get('UnprocessedAutomationRules', []))
+    return rules, unprocessed
+
+
+class UnprocessedRulesError(Exception):
+    """
+    Raised when SecurityHub could not return some of the automation rules of a region
+    """
+
+    def __init__(self, unprocessed):
+        """
+        :param unprocessed: list of UnprocessedAutomationRules
+        """
+
+        super(UnprocessedRulesError, self).__init__("Unable to get automation rules: {}".format(unprocessed))
+        self.unprocessed = unprocessed
+
+
+def normalize_rule_value(value, key=None):
+    """
+    Normalizes a field of a rule definition or of a deployed AutomationRulesConfig, so both compare
+    equal when SecurityHub only changed their representation: timestamps become UTC datetimes, whole
+    floats become integers and keys without a value are dropped
+    :param value: field value
+    :param key: key of the value in its parent dict
+    :return: normalized copy of the value
+    """
+
+    if isinstance(value, dict):
+        normalized = dict()
+        for field, item in value.items():
+            item = normalize_rule_value(item, field)
+            if item is not None and item != [] and item != {}:
+                normalized[field] = item
+        return normalized
+    if isinstance(value, list):
+        return [normalize_rule_value(item) for item in value]
+    if key in RULE_TIMESTAMP_KEYS and isinstance(value, (str, datetime.datetime)):
+        timestamp = parse_timestamp(value) if isinstance(value, str) else value
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=tzutc())
+        return timestamp.astimezone(tzutc())
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def plan_rules(rules, deployed_rules):
+    """
+    Compares rule definitions with the rules deployed in a region
+    :param rules: list of rule definitions
+    :param deployed_rules: dict of RuleName:AutomationRulesConfig of the deployed rules
+    :return: tuple of (rules to create, UpdateAutomationRulesRequestItems of changed rules, names of unchanged rules)
+    """
+
+    to_create = []
+    to_update = []
+    unchanged = []
+    for rule in rules:
+        deployed = deployed_rules.get(rule['RuleName'])
+        if deployed is None:
+            to_create.append(rule)
+            continue
+
+        # Only the fields set by the definition are compared, so rules are never reset to defaults
+        changes = dict((field, rule[field]) for field in RULE_UPDATABLE_FIELDS
+                       if field in rule and normalize_rule_value(rule[field], field) != normalize_rule_value(deployed.get(field), field))
+        if changes:
+            changes['RuleArn'] = deployed['RuleArn']
+            to_update.append(changes)
+        else:
+            unchanged.append(rule['RuleName'])
+
+    return to_create, to_update, unchanged
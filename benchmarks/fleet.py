@@ -0,0 +1,778 @@
+"""
+In-memory stand-in for the AWS APIs used by the scripts of this repository, simulating a fleet of
+accounts and regions so the scripts can be benchmarked offline.
+
+Requests are answered from a before-send handler registered last on every botocore client, so
+parameter validation, signing, the scripts' rate limiter and botocore retries all run as they
+would against AWS. Responses are serialized for the protocol of each service and parsed by
+botocore as usual. aiobotocore clients are answered the same way when aiobotocore is installed,
+with the latency awaited instead of slept.
+"""
+
+import asyncio
+import botocore.client
+import contextvars
+import datetime
+import json
+import re
+import threading
+import time
+import uuid
+
+from botocore.awsrequest import AWSResponse
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dateutil.tz import tzutc
+from xml.sax.saxutils import escape
+
+try:
+    from aiobotocore.awsrequest import AioAWSResponse
+    from aiobotocore.client import AioClientCreator
+except ImportError:
+    AioClientCreator = None
+
+# Account the default credentials of the benchmark belong to
+ADMIN_ACCOUNT = '999999999999'
+
+# Access keys of assumed role credentials embed the account so requests can be attributed to it
+ASSUMED_KEY_PREFIX = 'ASIA'
+
+# Page sizes of the paginated SecurityHub operations
+MEMBERS_PAGE_SIZE = 50
+STANDARDS_PAGE_SIZE = 25
+CONTROLS_PAGE_SIZE = 25
+AUTOMATION_RULES_PAGE_SIZE = 100
+
+CIS12_STANDARD = 'ruleset/cis-aws-foundations-benchmark/v/1.2.0'
+CIS12_SUBSCRIPTION = 'subscription/cis-aws-foundations-benchmark/v/1.2.0'
+CIS14_STANDARD = 'standards/cis-aws-foundations-benchmark/v/1.4.0'
+CIS14_SUBSCRIPTION = 'subscription/cis-aws-foundations-benchmark/v/1.4.0'
+
+# Controls of the simulated CIS standards
+CIS12_CONTROLS = ['CIS.{}.{}'.format(section, number) for section, count in ((1, 22), (2, 9), (3, 14), (4, 3)) for number in range(1, count + 1)]
+CIS14_CONTROLS = ['CIS.{}.{}'.format(section, number) for section, count in ((1, 20), (2, 7), (3, 11), (4, 15), (5, 4)) for number in range(1, count + 1)]
+
+# Error code and HTTP status of throttled requests per protocol
+THROTTLING_ERRORS = {
+    'query': ('Throttling', 400),
+    'rest-xml': ('SlowDown', 503),
+    'json': ('ThrottlingException', 400),
+    'rest-json': ('TooManyRequestsException', 429)
+}
+
+
+class FakeError(Exception):
+    """
+    Error response of a simulated API call
+    """
+
+    def __init__(self, code, message='', status=400):
+        super(FakeError, self).__init__(code)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+class _Body(object):
+    def __init__(self, content):
+        self.content = content
+
+    def stream(self, **kwargs):
+        yield self.content
+
+    def read(self, *args):
+        return self.content
+
+
+class _AsyncBody(_Body):
+    async def read(self, *args):
+        return self.content
+
+
+class _Bucket(object):
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.tokens = burst
+        self.burst = burst
+        self.timestamp = time.time()
+
+    def take(self):
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class SimulatedFleet(object):
+    """
+    Simulated accounts and regions answering SecurityHub, Config, STS, IAM, S3 and Account API calls
+    """
+
+    def __init__(self, latency=0, invite_delay=0, standards_delay=0, throttle_rate=0, throttle_burst=None):
+        """
+        :param latency: seconds added to every request attempt
+        :param invite_delay: seconds before invitations and accepted memberships become visible
+        :param standards_delay: seconds a new standards subscription stays PENDING
+        :param throttle_rate: requests per second allowed per account, region and operation, 0 for no throttling
+        :param throttle_burst: requests allowed at once per account, region and operation, defaults to twice the rate
+        """
+
+        self.latency = latency
+        self.invite_delay = invite_delay
+        self.standards_delay = standards_delay
+        self.throttle_rate = throttle_rate
+        self.throttle_burst = throttle_burst or max(1, 2 * throttle_rate)
+
+        self.lock = threading.RLock()
+        self.request = contextvars.ContextVar('fleet_request')
+        self.calls = Counter()
+        self.throttled = Counter()
+        self.buckets = dict()
+
+        self.hubs = set()
+        self.standards = dict()
+        self.controls = dict()
+        self.members = defaultdict(dict)
+        self.invitations = dict()
+        self.pending = []
+        self.config = dict()
+        self.buckets_s3 = set()
+        self.service_linked_roles = set()
+        self.products = defaultdict(set)
+        self.automation_rules = defaultdict(dict)
+
+        self._original_create_client = None
+        self._original_create_aio_client = None
+
+    # Seeding
+
+    def enable_hub(self, account, region, standards=()):
+        """
+        Enables SecurityHub and READY standards subscriptions in an account and region
+        """
+
+        with self.lock:
+            self.hubs.add((account, region))
+            for standard in standards:
+                self._subscribe(account, region, self.regional_standard(region, standard), ready=True)
+
+    def enable_config(self, account, region):
+        """
+        Sets up a recording AWS Config recorder and delivery channel in an account and region
+        """
+
+        with self.lock:
+            self.config[(account, region)] = {'recorders': ['default'], 'recording': True, 'channels': ['config-s3-delivery']}
+            self.service_linked_roles.add(account)
+            self.buckets_s3.add('config-bucket-{}'.format(account))
+
+    def add_member(self, admin_account, account, region, status='Enabled'):
+        """
+        Records an account as a member of an administrator account in a region
+        """
+
+        with self.lock:
+            self.members[(admin_account, region)][account] = status
+
+    def enable_products(self, account, region, products):
+        """
+        Subscribes an account and region to product integrations, e.g. aws/guardduty
+        """
+
+        with self.lock:
+            self.products[(account, region)].update(products)
+
+    def disable_controls(self, account, region, subscription, control_ids):
+        """
+        Disables controls of a standards subscription
+        """
+
+        with self.lock:
+            controls = self.controls[(account, region, subscription)]
+            for control_id in control_ids:
+                controls[control_id] = 'DISABLED'
+
+    def add_automation_rules(self, account, region, rules):
+        """
+        Deploys automation rules, given as create_automation_rule parameters, in an account and region
+        """
+
+        with self.lock:
+            for rule in rules:
+                self._create_automation_rule(account, region, rule)
+
+    # Installation
+
+    def install(self):
+        """
+        Makes every botocore client created from now on talk to the fleet
+        """
+
+        fleet = self
+        original = self._original_create_client = botocore.client.ClientCreator.create_client
+
+        def create_client(creator, *args, **kwargs):
+            client = original(creator, *args, **kwargs)
+            fleet.register(client)
+            return client
+
+        botocore.client.ClientCreator.create_client = create_client
+
+        if AioClientCreator is not None:
+            original_aio = self._original_create_aio_client = AioClientCreator.create_client
+
+            async def create_aio_client(creator, *args, **kwargs):
+                client = await original_aio(creator, *args, **kwargs)
+                fleet.register(client, asynchronous=True)
+                return client
+
+            AioClientCreator.create_client = create_aio_client
+
+    def uninstall(self):
+        """
+        Restores the botocore client creation
+        """
+
+        botocore.client.ClientCreator.create_client = self._original_create_client
+        if AioClientCreator is not None:
+            AioClientCreator.create_client = self._original_create_aio_client
+
+    @contextmanager
+    def installed(self):
+        self.install()
+        try:
+            yield self
+        finally:
+            self.uninstall()
+
+    def register(self, client, asynchronous=False):
+        """
+        Registers the handlers answering the requests of a client
+        :param client: botocore client
+        :param asynchronous: True for aiobotocore clients, whose handlers may be coroutines
+        """
+
+        service_model = client.meta.service_model
+        region = client.meta.region_name
+
+        def before_parameter_build(params, context, **kwargs):
+            context['fleet_params'] = dict(params)
+
+        def before_call(model, context, **kwargs):
+            # Requests of a thread or task are sent one at a time, so the parameters are kept per context
+            self.request.set((model, context.get('fleet_params', {})))
+
+        def before_send(request, **kwargs):
+            model, params = self.request.get()
+            if self.latency:
+                time.sleep(self.latency)
+            return self.respond(service_model, model, region, request, params)
+
+        async def before_send_async(request, **kwargs):
+            model, params = self.request.get()
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            response = self.respond(service_model, model, region, request, params)
+            return AioAWSResponse(response.url, response.status_code, response.headers, _AsyncBody(response.raw.content))
+
+        client.meta.events.register('before-parameter-build', before_parameter_build)
+        client.meta.events.register('before-call', before_call)
+        client.meta.events.register_last('before-send', before_send_async if asynchronous else before_send)
+
+    # Request handling
+
+    def respond(self, service_model, operation_model, region, request, params):
+        """
+        Answers one request attempt, after the latency of the attempt has passed
+        :return: botocore AWSResponse
+        """
+
+        service = service_model.service_name
+        operation = operation_model.name
+        account = self.caller_account(request)
+        protocol = service_model.protocol
+
+        with self.lock:
+            self.calls[(service, operation)] += 1
+            if self.throttle_rate and not self._take_token(account, region, service, operation):
+                self.throttled[(service, operation)] += 1
+                code, status = THROTTLING_ERRORS[protocol]
+                return self.error_response(request, protocol, FakeError(code, 'Rate exceeded', status))
+
+            self._apply_pending()
+            try:
+                handler = getattr(self, '_{}_{}'.format(service, operation))
+            except AttributeError:
+                raise NotImplementedError('{} {} is not simulated'.format(service, operation))
+            try:
+                data = handler(account, region, params)
+            except FakeError as e:
+                return self.error_response(request, protocol, e)
+
+        return self.success_response(request, service_model, operation_model, data)
+
+    def caller_account(self, request):
+        authorization = request.headers.get('Authorization', b'')
+        if isinstance(authorization, bytes):
+            authorization = authorization.decode('utf-8')
+        match = re.search(r'Credential=([A-Z0-9]+)/', authorization)
+        if match and match.group(1).startswith(ASSUMED_KEY_PREFIX):
+            return match.group(1)[len(ASSUMED_KEY_PREFIX):]
+        return ADMIN_ACCOUNT
+
+    def _take_token(self, account, region, service, operation):
+        key = (account, region, service, operation)
+        if key not in self.buckets:
+            self.buckets[key] = _Bucket(self.throttle_rate, self.throttle_burst)
+        return self.buckets[key].take()
+
+    def _apply_pending(self):
+        now = time.time()
+        ready = [change for change in self.pending if change[0] <= now]
+        self.pending = [change for change in self.pending if change[0] > now]
+        for visible_at, apply_change in ready:
+            apply_change()
+
+    def _later(self, apply_change):
+        if self.invite_delay:
+            self.pending.append((time.time() + self.invite_delay, apply_change))
+        else:
+            apply_change()
+
+    # Serialization
+
+    def success_response(self, request, service_model, operation_model, data):
+        protocol = service_model.protocol
+        headers = {'x-amzn-RequestId': str(uuid.uuid4())}
+        if data is None:
+            return AWSResponse(request.url, 204 if protocol == 'rest-xml' else 200, headers, _Body(b''))
+        if protocol in ('json', 'rest-json'):
+            headers['Content-Type'] = 'application/x-amz-json-1.1' if protocol == 'json' else 'application/json'
+            body = json.dumps(data, default=_json_default)
+        elif protocol == 'query':
+            headers['Content-Type'] = 'text/xml'
+            body = '<{op}Response xmlns="{ns}"><{op}Result>{result}</{op}Result><ResponseMetadata><RequestId>{id}</RequestId></ResponseMetadata></{op}Response>'.format(
+                op=operation_model.name, ns=service_model.metadata.get('xmlNamespace', ''), result=_to_xml(data), id=headers['x-amzn-RequestId'])
+        else:
+            headers['Content-Type'] = 'application/xml'
+            body = '<{op}Result>{result}</{op}Result>'.format(op=operation_model.name, result=_to_xml(data))
+        return AWSResponse(request.url, 200, headers, _Body(body.encode('utf-8')))
+
+    def error_response(self, request, protocol, error):
+        headers = {'x-amzn-RequestId': str(uuid.uuid4())}
+        if protocol in ('json', 'rest-json'):
+            headers['Content-Type'] = 'application/x-amz-json-1.1' if protocol == 'json' else 'application/json'
+            headers['x-amzn-ErrorType'] = error.code
+            body = json.dumps({'__type': error.code, 'message': error.message})
+        elif protocol == 'query':
+            headers['Content-Type'] = 'text/xml'
+            body = '<ErrorResponse><Error><Type>Sender</Type><Code>{}</Code><Message>{}</Message></Error><RequestId>{}</RequestId></ErrorResponse>'.format(
+                error.code, escape(error.message), headers['x-amzn-RequestId'])
+        else:
+            headers['Content-Type'] = 'application/xml'
+            body = '<Error><Code>{}</Code><Message>{}</Message></Error>'.format(error.code, escape(error.message))
+        return AWSResponse(request.url, error.status, headers, _Body(body.encode('utf-8')))
+
+    # STS, IAM, S3 and Account
+
+    def _sts_GetCallerIdentity(self, account, region, params):
+        return {'UserId': 'AIDABENCHMARK', 'Account': account, 'Arn': 'arn:aws:iam::{}:user/benchmark'.format(account)}
+
+    def _sts_AssumeRole(self, account, region, params):
+        target = params['RoleArn'].split(':')[4]
+        return {
+            'Credentials': {
+                'AccessKeyId': ASSUMED_KEY_PREFIX + target,
+                'SecretAccessKey': 'benchmark',
+                'SessionToken': 'benchmark',
+                'Expiration': datetime.datetime.now(tzutc()) + datetime.timedelta(hours=1)
+            },
+            'AssumedRoleUser': {'AssumedRoleId': 'AROABENCHMARK:' + params['RoleSessionName'], 'Arn': params['RoleArn']}
+        }
+
+    def _iam_CreateServiceLinkedRole(self, account, region, params):
+        if account in self.service_linked_roles:
+            raise FakeError('InvalidInput', 'Service role name AWSServiceRoleForConfig has been taken in this account')
+        self.service_linked_roles.add(account)
+        return {'Role': {'RoleName': 'AWSServiceRoleForConfig', 'Arn': 'arn:aws:iam::{}:role/aws-service-role/config.amazonaws.com/AWSServiceRoleForConfig'.format(account)}}
+
+    def _s3_ListObjects(self, account, region, params):
+        if params['Bucket'] not in self.buckets_s3:
+            raise FakeError('NoSuchBucket', 'The specified bucket does not exist', 404)
+        return {'Name': params['Bucket'], 'IsTruncated': False}
+
+    def _s3_CreateBucket(self, account, region, params):
+        self.buckets_s3.add(params['Bucket'])
+        return {}
+
+    def _s3_PutBucketPolicy(self, account, region, params):
+        return None
+
+    def _account_ListRegions(self, account, region, params):
+        regions = sorted(set(r for (a, r) in self.hubs) | set(['us-east-1']))
+        return {'Regions': [{'RegionName': name, 'RegionOptStatus': 'ENABLED_BY_DEFAULT'} for name in regions]}
+
+    def _account_GetRegionOptStatus(self, account, region, params):
+        return {'RegionName': params['RegionName'], 'RegionOptStatus': 'ENABLED_BY_DEFAULT'}
+
+    # AWS Config
+
+    def _config_state(self, account, region):
+        return self.config.setdefault((account, region), {'recorders': [], 'recording': False, 'channels': []})
+
+    def _config_DescribeConfigurationRecorders(self, account, region, params):
+        state = self._config_state(account, region)
+        return {'ConfigurationRecorders': [{'name': name} for name in state['recorders']]}
+
+    def _config_DescribeConfigurationRecorderStatus(self, account, region, params):
+        state = self._config_state(account, region)
+        return {'ConfigurationRecordersStatus': [{'name': name, 'recording': state['recording']} for name in state['recorders']]}
+
+    def _config_DescribeDeliveryChannels(self, account, region, params):
+        state = self._config_state(account, region)
+        return {'DeliveryChannels': [{'name': name} for name in state['channels']]}
+
+    def _config_PutConfigurationRecorder(self, account, region, params):
+        self._config_state(account, region)['recorders'] = [params['ConfigurationRecorder']['name']]
+        return {}
+
+    def _config_PutDeliveryChannel(self, account, region, params):
+        self._config_state(account, region)['channels'] = [params['DeliveryChannel']['name']]
+        return {}
+
+    def _config_StartConfigurationRecorder(self, account, region, params):
+        state = self._config_state(account, region)
+        if not state['channels']:
+            raise FakeError('NoAvailableDeliveryChannelException', 'Delivery channel is not available to start configuration recorder')
+        state['recording'] = True
+        return {}
+
+    # SecurityHub hub and standards
+
+    @staticmethod
+    def regional_standard(region, standard):
+        return 'arn:aws:securityhub:{}::{}'.format(region, standard) if standard.startswith('standards/') else 'arn:aws:securityhub:::{}'.format(standard)
+
+    @staticmethod
+    def subscription_arn(account, region, standard_arn):
+        resource = standard_arn.split(':', 5)[5]
+        return 'arn:aws:securityhub:{}:{}:subscription/{}'.format(region, account, resource.split('/', 1)[1])
+
+    def _subscribe(self, account, region, standard_arn, ready=False):
+        subscription_arn = self.subscription_arn(account, region, standard_arn)
+        self.standards[(account, region, subscription_arn)] = {
+            'StandardsArn': standard_arn,
+            'StandardsSubscriptionArn': subscription_arn,
+            'ready_at': 0 if ready else time.time() + self.standards_delay
+        }
+        control_ids = CIS12_CONTROLS if CIS12_STANDARD in standard_arn else CIS14_CONTROLS if CIS14_STANDARD in standard_arn else []
+        self.controls[(account, region, subscription_arn)] = dict((control_id, 'ENABLED') for control_id in control_ids)
+        return subscription_arn
+
+    def _require_hub(self, account, region):
+        if (account, region) not in self.hubs:
+            raise FakeError('InvalidAccessException', 'Account {} is not subscribed to AWS Security Hub'.format(account), 401)
+
+    def _subscription(self, account, region, subscription_arn):
+        subscription = self.standards[(account, region, subscription_arn)]
+        status = 'READY' if time.time() >= subscription['ready_at'] else 'PENDING'
+        return {'StandardsArn': subscription['StandardsArn'], 'StandardsSubscriptionArn': subscription_arn, 'StandardsInput': {}, 'StandardsStatus': status}
+
+    def _securityhub_EnableSecurityHub(self, account, region, params):
+        if (account, region) in self.hubs:
+            raise FakeError('ResourceConflictException', 'Account {} is already subscribed to Security Hub'.format(account), 409)
+        self.hubs.add((account, region))
+        return {}
+
+    def _securityhub_DescribeHub(self, account, region, params):
+        self._require_hub(account, region)
+        return {'HubArn': 'arn:aws:securityhub:{}:{}:hub/default'.format(region, account)}
+
+    def _securityhub_DisableSecurityHub(self, account, region, params):
+        self._require_hub(account, region)
+        self.hubs.discard((account, region))
+        for key in [key for key in self.standards if key[:2] == (account, region)]:
+            del self.standards[key]
+        return {}
+
+    def _securityhub_BatchEnableStandards(self, account, region, params):
+        self._require_hub(account, region)
+        subscriptions = []
+        for request in params['StandardsSubscriptionRequests']:
+            subscription_arn = self.subscription_arn(account, region, request['StandardsArn'])
+            if (account, region, subscription_arn) not in self.standards:
+                self._subscribe(account, region, request['StandardsArn'])
+            subscriptions.append(self._subscription(account, region, subscription_arn))
+        return {'StandardsSubscriptions': subscriptions}
+
+    def _securityhub_BatchDisableStandards(self, account, region, params):
+        self._require_hub(account, region)
+        subscriptions = []
+        for subscription_arn in params['StandardsSubscriptionArns']:
+            subscription = self.standards.pop((account, region, subscription_arn), None)
+            if subscription is not None:
+                subscriptions.append({'StandardsArn': subscription['StandardsArn'], 'StandardsSubscriptionArn': subscription_arn, 'StandardsInput': {}, 'StandardsStatus': 'DELETING'})
+        return {'StandardsSubscriptions': subscriptions}
+
+    def _securityhub_GetEnabledStandards(self, account, region, params):
+        self._require_hub(account, region)
+        subscription_arns = params.get('StandardsSubscriptionArns') or [key[2] for key in sorted(self.standards) if key[:2] == (account, region)]
+        subscriptions = [self._subscription(account, region, arn) for arn in subscription_arns if (account, region, arn) in self.standards]
+        return _page(subscriptions, 'StandardsSubscriptions', params, STANDARDS_PAGE_SIZE)
+
+    def _securityhub_DescribeStandardsControls(self, account, region, params):
+        self._require_hub(account, region)
+        subscription_arn = params['StandardsSubscriptionArn']
+        if (account, region, subscription_arn) not in self.standards:
+            raise FakeError('ResourceNotFoundException', 'Subscription {} not found'.format(subscription_arn), 404)
+        standard = subscription_arn.split(':', 5)[5].split('/', 1)[1]
+        controls = [{
+            'StandardsControlArn': 'arn:aws:securityhub:{}:{}:control/{}/{}'.format(region, account, standard.replace('standards/', ''), control_id.replace('CIS.', '')),
+            'ControlId': control_id,
+            'ControlStatus': status
+        } for control_id, status in sorted(self.controls[(account, region, subscription_arn)].items())]
+        return _page(controls, 'Controls', params, CONTROLS_PAGE_SIZE)
+
+    def _securityhub_UpdateStandardsControl(self, account, region, params):
+        self._require_hub(account, region)
+        standard, control = params['StandardsControlArn'].split(':', 5)[5].rsplit('/', 1)
+        subscription_arn = 'arn:aws:securityhub:{}:{}:subscription/{}'.format(region, account, standard.replace('control/', '', 1))
+        controls = self.controls.get((account, region, subscription_arn))
+        if controls is None or 'CIS.' + control not in controls:
+            raise FakeError('ResourceNotFoundException', 'Control {} not found'.format(params['StandardsControlArn']), 404)
+        controls['CIS.' + control] = params['ControlStatus']
+        return {}
+
+    @staticmethod
+    def security_control_id(control_id):
+        return 'Benchmark.' + control_id.replace('CIS.', '')
+
+    def _associated_control(self, account, region, association):
+        # Returns the controls of the subscription and the standard control ID of a security control, if associated
+        control_id = 'CIS.' + association['SecurityControlId'].replace('Benchmark.', '', 1)
+        controls = self.controls.get((account, region, self.subscription_arn(account, region, association['StandardsArn'])))
+        if controls is None or control_id not in controls:
+            return None, control_id
+        return controls, control_id
+
+    def _securityhub_ListSecurityControlDefinitions(self, account, region, params):
+        self._require_hub(account, region)
+        control_ids = CIS14_CONTROLS if CIS14_STANDARD in params.get('StandardsArn', CIS14_STANDARD) else []
+        definitions = [{
+            'SecurityControlId': self.security_control_id(control_id),
+            'Title': control_id,
+            'Description': control_id,
+            'RemediationUrl': 'https://example.com/{}'.format(control_id),
+            'SeverityRating': 'MEDIUM',
+            'CurrentRegionAvailability': 'AVAILABLE'
+        } for control_id in control_ids]
+        return _page(definitions, 'SecurityControlDefinitions', params, CONTROLS_PAGE_SIZE)
+
+    def _securityhub_BatchGetStandardsControlAssociations(self, account, region, params):
+        self._require_hub(account, region)
+        details = []
+        unprocessed = []
+        for association in params['StandardsControlAssociationIds']:
+            controls, control_id = self._associated_control(account, region, association)
+            if controls is None:
+                unprocessed.append({'StandardsControlAssociationId': association, 'ErrorCode': 'RESOURCE_NOT_FOUND', 'ErrorReason': 'Not found'})
+                continue
+            standard = association['StandardsArn'].split(':', 5)[5].replace('standards/', '', 1)
+            details.append({
+                'StandardsArn': association['StandardsArn'],
+                'SecurityControlId': association['SecurityControlId'],
+                'SecurityControlArn': 'arn:aws:securityhub:{}:{}:security-control/{}'.format(region, account, association['SecurityControlId']),
+                'AssociationStatus': controls[control_id],
+                'StandardsControlArns': ['arn:aws:securityhub:{}:{}:control/{}/{}'.format(region, account, standard, control_id.replace('CIS.', ''))]
+            })
+        return {'StandardsControlAssociationDetails': details, 'UnprocessedAssociations': unprocessed}
+
+    def _securityhub_BatchUpdateStandardsControlAssociations(self, account, region, params):
+        self._require_hub(account, region)
+        unprocessed = []
+        for update in params['StandardsControlAssociationUpdates']:
+            controls, control_id = self._associated_control(account, region, update)
+            if controls is None:
+                unprocessed.append({'StandardsControlAssociationUpdate': update, 'ErrorCode': 'RESOURCE_NOT_FOUND', 'ErrorReason': 'Not found'})
+                continue
+            controls[control_id] = update['AssociationStatus']
+        return {'UnprocessedAssociationUpdates': unprocessed}
+
+    def _securityhub_DisableImportFindingsForProduct(self, account, region, params):
+        self._require_hub(account, region)
+        product = params['ProductSubscriptionArn'].split(':product-subscription/', 1)[1]
+        if product not in self.products[(account, region)]:
+            raise FakeError('ResourceNotFoundException', 'Product subscription not found', 404)
+        self.products[(account, region)].discard(product)
+        return {}
+
+    # SecurityHub membership
+
+    def _administrator_of(self, account, region):
+        for (admin_account, admin_region), members in self.members.items():
+            if admin_region == region and members.get(account) in ('Enabled', 'Associated', 'Invited'):
+                return admin_account
+        return None
+
+    def _securityhub_ListMembers(self, account, region, params):
+        self._require_hub(account, region)
+        members = [{'AccountId': member, 'AdministratorId': account, 'MasterId': account, 'MemberStatus': status}
+                   for member, status in sorted(self.members[(account, region)].items())
+                   if not params.get('OnlyAssociated', True) or status in ('Enabled', 'Associated')]
+        return _page(members, 'Members', params, MEMBERS_PAGE_SIZE)
+
+    def _securityhub_GetMembers(self, account, region, params):
+        self._require_hub(account, region)
+        if len(params['AccountIds']) > 50:
+            raise FakeError('InvalidInputException', 'AccountIds must contain at most 50 accounts')
+        members = self.members[(account, region)]
+        return {
+            'Members': [{'AccountId': member, 'MemberStatus': members[member]} for member in params['AccountIds'] if member in members],
+            'UnprocessedAccounts': [{'AccountId': member, 'ProcessingResult': 'Account is not a member'} for member in params['AccountIds'] if member not in members]
+        }
+
+    def _securityhub_CreateMembers(self, account, region, params):
+        self._require_hub(account, region)
+        if len(params['AccountDetails']) > 50:
+            raise FakeError('InvalidInputException', 'AccountDetails must contain at most 50 accounts')
+        for details in params['AccountDetails']:
+            self.members[(account, region)].setdefault(details['AccountId'], 'Created')
+        return {'UnprocessedAccounts': []}
+
+    def _securityhub_InviteMembers(self, account, region, params):
+        self._require_hub(account, region)
+        if len(params['AccountIds']) > 50:
+            raise FakeError('InvalidInputException', 'AccountIds must contain at most 50 accounts')
+        for member in params['AccountIds']:
+            self.members[(account, region)][member] = 'Invited'
+
+            def deliver(member=member):
+                self.invitations[(member, region)] = account
+            self._later(deliver)
+        return {'UnprocessedAccounts': []}
+
+    def _securityhub_ListInvitations(self, account, region, params):
+        self._require_hub(account, region)
+        administrator = self.invitations.get((account, region))
+        invitations = [{'AccountId': administrator, 'InvitationId': 'invitation-{}-{}'.format(administrator, account), 'MemberStatus': 'Invited'}] if administrator else []
+        return {'Invitations': invitations}
+
+    def _securityhub_AcceptInvitation(self, account, region, params):
+        self._require_hub(account, region)
+        administrator = self.invitations.pop((account, region), None)
+        if administrator is None:
+            raise FakeError('ResourceNotFoundException', 'Invitation not found', 404)
+
+        def associate():
+            self.members[(administrator, region)][account] = 'Enabled'
+        self._later(associate)
+        return {}
+
+    _securityhub_AcceptAdministratorInvitation = _securityhub_AcceptInvitation
+
+    def _securityhub_GetMasterAccount(self, account, region, params):
+        self._require_hub(account, region)
+        administrator = self._administrator_of(account, region)
+        if administrator is None:
+            return {}
+        return {'Master': {'AccountId': administrator, 'MemberStatus': self.members[(administrator, region)][account]}}
+
+    def _securityhub_DisassociateFromMasterAccount(self, account, region, params):
+        self._require_hub(account, region)
+        administrator = self._administrator_of(account, region)
+        if administrator is not None:
+            self.members[(administrator, region)][account] = 'Removed'
+        return {}
+
+    def _securityhub_DisassociateMembers(self, account, region, params):
+        self._require_hub(account, region)
+        for member in params['AccountIds']:
+            if member in self.members[(account, region)]:
+                self.members[(account, region)][member] = 'Removed'
+        return {}
+
+    def _securityhub_DeleteMembers(self, account, region, params):
+        self._require_hub(account, region)
+        for member in params['AccountIds']:
+            self.members[(account, region)].pop(member, None)
+        return {'UnprocessedAccounts': []}
+
+    # SecurityHub automation rules
+
+    def _create_automation_rule(self, account, region, params):
+        rule_arn = 'arn:aws:securityhub:{}:{}:automation-rule/{}'.format(region, account, uuid.uuid4())
+        now = datetime.datetime.now(tzutc())
+        rule = {'RuleStatus': 'ENABLED', 'IsTerminal': False, 'CreatedAt': now, 'UpdatedAt': now, 'CreatedBy': account}
+        rule.update((key, value) for key, value in params.items() if key != 'Tags')
+        rule['RuleArn'] = rule_arn
+        self.automation_rules[(account, region)][rule_arn] = rule
+        return rule_arn
+
+    def _securityhub_CreateAutomationRule(self, account, region, params):
+        self._require_hub(account, region)
+        return {'RuleArn': self._create_automation_rule(account, region, params)}
+
+    def _securityhub_ListAutomationRules(self, account, region, params):
+        self._require_hub(account, region)
+        rules = sorted(self.automation_rules[(account, region)].values(), key=lambda rule: rule['RuleOrder'])
+        metadata = [dict((key, rule[key]) for key in ('RuleArn', 'RuleStatus', 'RuleOrder', 'RuleName', 'Description', 'IsTerminal', 'CreatedAt', 'UpdatedAt', 'CreatedBy'))
+                    for rule in rules]
+        return _page(metadata, 'AutomationRulesMetadata', params, AUTOMATION_RULES_PAGE_SIZE)
+
+    def _securityhub_BatchGetAutomationRules(self, account, region, params):
+        self._require_hub(account, region)
+        if len(params['AutomationRulesArns']) > 100:
+            raise FakeError('InvalidInputException', 'AutomationRulesArns must contain at most 100 rules')
+        rules = self.automation_rules[(account, region)]
+        return {
+            'Rules': [rules[rule_arn] for rule_arn in params['AutomationRulesArns'] if rule_arn in rules],
+            'UnprocessedAutomationRules': [{'RuleArn': rule_arn, 'ErrorCode': 404, 'ErrorMessage': 'Rule not found'}
+                                           for rule_arn in params['AutomationRulesArns'] if rule_arn not in rules]
+        }
+
+    def _securityhub_BatchUpdateAutomationRules(self, account, region, params):
+        self._require_hub(account, region)
+        if len(params['UpdateAutomationRulesRequestItems']) > 100:
+            raise FakeError('InvalidInputException', 'UpdateAutomationRulesRequestItems must contain at most 100 rules')
+        rules = self.automation_rules[(account, region)]
+        processed = []
+        unprocessed = []
+        for item in params['UpdateAutomationRulesRequestItems']:
+            rule = rules.get(item['RuleArn'])
+            if rule is None:
+                unprocessed.append({'RuleArn': item['RuleArn'], 'ErrorCode': 404, 'ErrorMessage': 'Rule not found'})
+                continue
+            rule.update(item)
+            rule['UpdatedAt'] = datetime.datetime.now(tzutc())
+            processed.append(item['RuleArn'])
+        return {'ProcessedAutomationRules': processed, 'UnprocessedAutomationRules': unprocessed}
+
+
+def _page(items, key, params, page_size):
+    page_size = min(params.get('MaxResults') or page_size, page_size)
+    start = int(params.get('NextToken') or 0)
+    result = {key: items[start:start + page_size]}
+    if start + page_size < len(items):
+        result['NextToken'] = str(start + page_size)
+    return result
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return (value - datetime.datetime(1970, 1, 1, tzinfo=tzutc())).total_seconds()
+    raise TypeError(repr(value))
+
+
+def _to_xml(value):
+    if isinstance(value, dict):
+        return ''.join('<{key}>{value}</{key}>'.format(key=key, value=_to_xml(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return ''.join('<member>{}</member>'.format(_to_xml(item)) for item in value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return escape(str(value))
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+
+from collections import OrderedDict
+
+import fleet as simulated
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROLE_NAME = 'BenchmarkRole'
+FSBP_STANDARD = 'standards/aws-foundational-security-best-practices/v/1.0.0'
+
+# CIS 1.2 controls disabled in every account of the cis14 scenario, each mapping to a CIS 1.4 control,
+# CIS.3.4 is past the first page of describe_standards_controls
+CIS12_DISABLED_CONTROLS = ['CIS.1.1', 'CIS.2.1', 'CIS.3.4']
+CIS14_MAPPED_CONTROLS = ['CIS.1.7', 'CIS.3.1', 'CIS.4.4']
+
+# Rules of the automation rules scenarios, deployed to the administrator account
+AUTOMATION_RULES = [{
+    'RuleName': 'benchmark-rule-{}'.format(number),
+    'RuleOrder': number,
+    'Description': 'Suppresses the findings of generator benchmark-{}'.format(number),
+    'Criteria': {'GeneratorId': [{'Value': 'benchmark-{}'.format(number), 'Comparison': 'EQUALS'}]},
+    'Actions': [{'Type': 'FINDING_FIELDS_UPDATE', 'FindingFieldsUpdate': {'Workflow': {'Status': 'SUPPRESSED'}}}]
+} for number in range(1, 31)]
+
+
+def member_accounts(count):
+    return ['{:012d}'.format(100000000000 + number) for number in range(count)]
+
+
+def seed_enabled(fleet, accounts, regions):
+    """
+    Seeds an administrator account and members that are fully enabled and linked
+    """
+
+    for region in regions:
+        fleet.enable_hub(simulated.ADMIN_ACCOUNT, region, [FSBP_STANDARD])
+        for account in accounts:
+            fleet.enable_hub(account, region, [FSBP_STANDARD])
+            fleet.enable_config(account, region)
+            fleet.add_member(simulated.ADMIN_ACCOUNT, account, region)
+
+
+def seed_products(fleet, accounts, regions):
+    seed_enabled(fleet, accounts, regions)
+    for region in regions:
+        for account in accounts + [simulated.ADMIN_ACCOUNT]:
+            fleet.enable_products(account, region, ['aws/guardduty'])
+
+
+def seed_cis12(fleet, accounts, regions):
+    for region in regions:
+        for account in accounts:
+            fleet.enable_hub(account, region, [simulated.CIS12_STANDARD])
+            fleet.disable_controls(account, region, 'arn:aws:securityhub:{}:{}:{}'.format(region, account, simulated.CIS12_SUBSCRIPTION), CIS12_DISABLED_CONTROLS)
+
+
+def seed_automation_rules(fleet, accounts, regions):
+    for region in regions:
+        fleet.enable_hub(simulated.ADMIN_ACCOUNT, region)
+        fleet.add_automation_rules(simulated.ADMIN_ACCOUNT, region, AUTOMATION_RULES)
+
+
+def check_members(fleet, accounts, regions, status):
+    linked = sum(1 for region in regions for account in accounts if fleet.members[(simulated.ADMIN_ACCOUNT, region)].get(account) == status)
+    return '{}/{} account/regions {}'.format(linked, len(accounts) * len(regions), status)
+
+
+def check_disabled(fleet, accounts, regions):
+    disabled = sum(1 for region in regions for account in accounts if (account, region) not in fleet.hubs)
+    return '{}/{} account/regions disabled'.format(disabled, len(accounts) * len(regions))
+
+
+def check_products(fleet, accounts, regions):
+    disabled = sum(1 for region in regions for account in accounts if 'aws/guardduty' not in fleet.products[(account, region)])
+    return '{}/{} account/regions without aws/guardduty'.format(disabled, len(accounts) * len(regions))
+
+
+def check_cis14(fleet, accounts, regions):
+    aligned = 0
+    for region in regions:
+        for account in accounts:
+            controls = fleet.controls.get((account, region, 'arn:aws:securityhub:{}:{}:{}'.format(region, account, simulated.CIS14_SUBSCRIPTION)), {})
+            if controls and all(controls[control_id] == 'DISABLED' for control_id in CIS14_MAPPED_CONTROLS):
+                aligned += 1
+    return '{}/{} account/regions aligned with CIS 1.2'.format(aligned, len(accounts) * len(regions))
+
+
+def check_automation_rules(fleet, accounts, regions):
+    expected = sorted(rule['RuleName'] for rule in AUTOMATION_RULES)
+    deployed = 0
+    for region in regions:
+        if sorted(rule['RuleName'] for rule in fleet.automation_rules[(simulated.ADMIN_ACCOUNT, region)].values()) == expected:
+            deployed += 1
+    return '{}/{} regions with every rule deployed once'.format(deployed, len(regions))
+
+
+# Scenario name: (script, default account count, seed function, arguments function, check function)
+SCENARIOS = OrderedDict([
+    ('enable', (
+        'multiaccount-enable/enablesecurityhub.py', 100, None,
+        lambda files, regions, args: ['--master_account', simulated.ADMIN_ACCOUNT, '--assume_role', ROLE_NAME, '--enabled_regions', ','.join(regions),
+                                      '--enable_standards', FSBP_STANDARD, '--max_workers', str(args.max_workers), files['csv']],
+        lambda fleet, accounts, regions: check_members(fleet, accounts, regions, 'Enabled'))),
+    ('enable-steady', (
+        'multiaccount-enable/enablesecurityhub.py', 100, seed_enabled,
+        lambda files, regions, args: ['--master_account', simulated.ADMIN_ACCOUNT, '--assume_role', ROLE_NAME, '--enabled_regions', ','.join(regions),
+                                      '--enable_standards', FSBP_STANDARD, '--max_workers', str(args.max_workers), '--plan', files['csv']],
+        lambda fleet, accounts, regions: check_members(fleet, accounts, regions, 'Enabled'))),
+    ('disable', (
+        'multiaccount-enable/disablesecurityhub.py', 50, seed_enabled,
+        lambda files, regions, args: ['--master_account', simulated.ADMIN_ACCOUNT, '--assume_role', ROLE_NAME, '--enabled_regions', ','.join(regions), files['csv']],
+        check_disabled)),
+    ('enable-asyncio', (
+        'multiaccount-enable/enablesecurityhub.py', 100, None,
+        lambda files, regions, args: ['--master_account', simulated.ADMIN_ACCOUNT, '--assume_role', ROLE_NAME, '--enabled_regions', ','.join(regions),
+                                      '--enable_standards', FSBP_STANDARD, '--engine', 'asyncio', '--max_concurrency', str(args.max_concurrency), files['csv']],
+        lambda fleet, accounts, regions: check_members(fleet, accounts, regions, 'Enabled'))),
+    ('disable-asyncio', (
+        'multiaccount-enable/disablesecurityhub.py', 50, seed_enabled,
+        lambda files, regions, args: ['--master_account', simulated.ADMIN_ACCOUNT, '--assume_role', ROLE_NAME, '--enabled_regions', ','.join(regions),
+                                      '--engine', 'asyncio', '--max_concurrency', str(args.max_concurrency), files['csv']],
+        check_disabled)),
+    ('productdisablement', (
+        'multiaccount-product-disablement/productdisablement.py', 100, seed_products,
+        lambda files, regions, args: ['--assume_role_name', ROLE_NAME, '--regions-to-disable', ','.join(regions), '--products', 'aws/guardduty'],
+        check_products)),
+    ('cis14', (
+        'cis14-enable/enablecis14.py', 3, seed_cis12,
+        lambda files, regions, args: ['--assume_role', ROLE_NAME, '--enabled_regions', ','.join(regions), '--map_cis12_disabled_controls', 'Yes',
+                                      '--disable_cis12', 'Yes', '--max_workers', str(args.max_workers), '--input_file', files['txt']],
+        check_cis14)),
+    ('rules-redeploy', (
+        'automation_rules/automation-rules-create.py', 0, seed_automation_rules,
+        lambda files, regions, args: ['--enabled_regions', ','.join(regions), '--max_workers', str(args.max_workers), '--input_file', files['rules']],
+        check_automation_rules)),
+])
+
+# Scenarios running the asyncio engine, only run by default when aiobotocore is installed
+ASYNCIO_SCENARIOS = ('enable-asyncio', 'disable-asyncio')
+DEFAULT_SCENARIOS = [name for name in SCENARIOS if name not in ASYNCIO_SCENARIOS or simulated.AioClientCreator is not None]
+
+
+def run_script(script, argv, verbose=False):
+    """
+    Runs a script of the repository in this process, as if started from the command line
+    :return: captured output of the script
+    """
+
+    path = os.path.join(REPO_DIR, script)
+    script_dir = os.path.dirname(path)
+    saved = sys.argv, sys.stdin, list(sys.path)
+    # Every script directory has its own utils module
+    sys.modules.pop('utils', None)
+    sys.path.insert(0, script_dir)
+    sys.argv = [path] + argv
+    sys.stdin = io.StringIO('yes\n')
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verbose else output):
+            runpy.run_path(path, run_name='__main__')
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            output.write('Exited with status {}\n'.format(e.code))
+    finally:
+        sys.argv, sys.stdin, sys.path[:] = saved
+    return output.getvalue()
+
+
+def run_scenario(name, args, work_dir):
+    """
+    Seeds a simulated fleet, runs the script of a scenario against it and measures the run
+    :return: OrderedDict of results
+    """
+
+    script, default_accounts, seed, script_args, check = SCENARIOS[name]
+    accounts = member_accounts(args.accounts or default_accounts)
+    regions = [str(region) for region in args.regions.split(',')]
+
+    files = {
+        'csv': os.path.join(work_dir, '{}.csv'.format(name)),
+        'txt': os.path.join(work_dir, '{}.txt'.format(name)),
+        'rules': os.path.join(work_dir, '{}.json'.format(name))
+    }
+    with open(files['csv'], 'w') as csv_file:
+        csv_file.writelines('{},{}@example.com\n'.format(account, account) for account in accounts)
+    with open(files['txt'], 'w') as txt_file:
+        txt_file.writelines('{}\n'.format(account) for account in accounts)
+    with open(files['rules'], 'w') as rules_file:
+        json.dump(AUTOMATION_RULES, rules_file)
+
+    fleet = simulated.SimulatedFleet(
+        latency=args.latency / 1000.0,
+        invite_delay=args.invite_delay,
+        standards_delay=args.standards_delay,
+        throttle_rate=args.throttle_rate,
+        throttle_burst=args.throttle_burst
+    )
+    if seed is not None:
+        seed(fleet, accounts, regions)
+
+    with fleet.installed():
+        start = time.time()
+        output = run_script(script, script_args(files, regions, args), args.verbose)
+        elapsed = time.time() - start
+
+    return OrderedDict([
+        ('scenario', name),
+        ('accounts', len(accounts)),
+        ('regions', len(regions)),
+        ('wall_seconds', round(elapsed, 2)),
+        ('api_calls', sum(fleet.calls.values())),
+        ('throttled', sum(fleet.throttled.values())),
+        ('outcome', check(fleet, accounts, regions)),
+        ('failed_accounts', 'Failed Accounts' in output or 'Failed Regions' in output),
+        ('operations', OrderedDict(('{}.{}'.format(service, operation), count) for (service, operation), count in sorted(fleet.calls.items())))
+    ])
+
+
+def print_results(results):
+    print('{:<20} {:>8} {:>7} {:>10} {:>9} {:>9}  {}'.format('scenario', 'accounts', 'regions', 'wall (s)', 'calls', 'throttled', 'outcome'))
+    for result in results:
+        print('{scenario:<20} {accounts:>8} {regions:>7} {wall_seconds:>10} {api_calls:>9} {throttled:>9}  {outcome}'.format(**result))
+
+
+def compare_results(results, baseline_file, tolerance):
+    """
+    Compares wall-clock time and call counts with a previous --output file
+    :return: list of regression messages
+    """
+
+    with open(baseline_file) as baseline_input:
+        baseline = dict((result['scenario'], result) for result in json.load(baseline_input))
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(result['scenario'])
+        if previous is None or (previous['accounts'], previous['regions']) != (result['accounts'], result['regions']):
+            continue
+        for metric in ('wall_seconds', 'api_calls'):
+            if result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append('{}: {} went from {} to {}'.format(result['scenario'], metric, previous[metric], result[metric]))
+    return regressions
+
+
+if __name__ == '__main__':
+
+    # Setup command line arguments
+    parser = argparse.ArgumentParser(description='Benchmark the multi-account scripts against a simulated fleet of accounts')
+    parser.add_argument('--scenarios', type=str, default=','.join(DEFAULT_SCENARIOS), help="Comma separated list of scenarios to run (default: {})".format(','.join(DEFAULT_SCENARIOS)))
+    parser.add_argument('--accounts', type=int, help="Number of member accounts, overriding the default of each scenario")
+    parser.add_argument('--regions', type=str, default='us-east-1,us-west-2', help="Comma separated list of regions (default: us-east-1,us-west-2)")
+    parser.add_argument('--latency', type=float, default=20, help="Milliseconds added to every request (default: 20)")
+    parser.add_argument('--invite_delay', type=float, default=2, help="Seconds before invitations and accepted memberships become visible (default: 2)")
+    parser.add_argument('--standards_delay', type=float, default=1, help="Seconds new standards subscriptions stay PENDING (default: 1)")
+    parser.add_argument('--throttle_rate', type=float, default=10, help="Requests per second allowed per account, region and operation, 0 to disable throttling (default: 10)")
+    parser.add_argument('--throttle_burst', type=float, help="Requests allowed at once per account, region and operation (default: twice the rate)")
+    parser.add_argument('--max_workers', type=int, default=10, help="--max_workers passed to scripts that support it (default: 10)")
+    parser.add_argument('--max_concurrency', type=int, default=500, help="--max_concurrency passed to the asyncio scenarios (default: 500)")
+    parser.add_argument('--output', type=str, help="Optional path of a JSON file the results are written to")
+    parser.add_argument('--compare', type=str, help="Optional path of a previous --output file to compare with, exits with status 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Relative increase of wall-clock time or calls reported as a regression (default: 0.1)")
+    parser.add_argument('--verbose', action='store_true', help="Show the output of the scripts")
+    args = parser.parse_args()
+
+    scenarios = [str(item) for item in args.scenarios.split(',')]
+    unknown = [scenario for scenario in scenarios if scenario not in SCENARIOS]
+    if unknown:
+        raise ValueError("Unknown scenarios: {}".format(', '.join(unknown)))
+
+    # Keep the scripts away from real credentials and configuration
+    os.environ.update({
+        'AWS_ACCESS_KEY_ID': 'AKIABENCHMARK0000000',
+        'AWS_SECRET_ACCESS_KEY': 'benchmark',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'AWS_CONFIG_FILE': os.devnull,
+        'AWS_SHARED_CREDENTIALS_FILE': os.devnull,
+        'AWS_EC2_METADATA_DISABLED': 'true'
+    })
+    for variable in ('AWS_PROFILE', 'AWS_SESSION_TOKEN', 'AWS_ROLE_ARN', 'AWS_WEB_IDENTITY_TOKEN_FILE'):
+        os.environ.pop(variable, None)
+
+    work_dir = tempfile.mkdtemp(prefix='securityhub-benchmarks-')
+    results = []
+    try:
+        for scenario in scenarios:
+            print("Running scenario {}".format(scenario))
+            results.append(run_scenario(scenario, args, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.tolerance)
+        if regressions:
+            print("Regressions against {}:".format(args.compare))
+            for regression in regressions:
+                print("  {}".format(regression))
+            raise SystemExit(1)
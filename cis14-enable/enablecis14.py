@@ -20,16 +20,34 @@ import boto3
 import sys
 import time
 import argparse
+import json
 import re
-import string
+import threading
 import utils
-import time
 
-from botocore.exceptions import ClientError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError
+
+# Clients shared by every account and region of the run
+client_pool = utils.ClientPool(rate_limiter=utils.RateLimiter(operation_rates=utils.OPERATION_RATE_LIMITS))
+
+# Credentials of the assumed roles, shared by every assume_role call of the run
+credential_cache = utils.CredentialCache('EnableSecurityHub', client_pool=client_pool)
+
+# Progress events of the run, written by a background thread
+events = utils.EventLog()
+
+# Control statuses of the CIS 1.2 subscriptions, optionally persisted between runs
+control_cache = utils.ControlStatusCache()
+
+# Security control IDs of the CIS 1.4 controls, looked up once per region
+security_control_cache = utils.SecurityControlIdCache()
 
 CIS14_ARN_BASE = 'standards/cis-aws-foundations-benchmark/v/1.4.0'
 CIS_14_CONTROL_BASE='control/cis-aws-foundations-benchmark/v/1.4.0'
 CIS12_standard = 'subscription/cis-aws-foundations-benchmark/v/1.2.0'
+CIS14_standard = 'subscription/cis-aws-foundations-benchmark/v/1.4.0'
 
 def assume_role(aws_account_number, role_name):
     """
@@ -40,33 +58,264 @@ def assume_role(aws_account_number, role_name):
     :return: SecurityHub client in the specified AWS Account and Region
     """
 
-    # Beginning the assume role process for account
-    sts_client = boto3.client('sts')
+    # Sessions are cached by role ARN and refresh their credentials before they expire
+    start_time = time.time()
+    session = credential_cache.get_session(aws_account_number, role_name)
+
+    events.emit('assume_role', 'succeeded', account=aws_account_number, duration=time.time() - start_time,
+                message="Assumed session for {}.".format(aws_account_number))
+
+    return session
+
+
+def prepare_control_mapping(sh_client, account, aws_region):
+    """
+    Maps the disabled CIS 1.2 controls of an account and region to the CIS 1.4 controls to disable. Only CIS 1.2
+    is read, so the mapping is prepared while CIS 1.4 is still being enabled
+    :param sh_client: SecurityHub client in the account and region
+    :param account: AWS Account Number
+    :param aws_region: AWS Region
+    :return: dict of CIS 1.4 StandardsControlArn:(CIS 1.4 control ID, CIS 1.2 control ID), None if CIS 1.2 is not READY
+    """
+
+    #Confirm that CIS 1.2 standard is enabled in the account
+    enabled_standard=sh_client.get_enabled_standards(StandardsSubscriptionArns=['arn:aws:securityhub:{}:{}:{}'.format(aws_region, account, CIS12_standard)])
 
-    # Get the current partition
-    partition = sts_client.get_caller_identity()['Arn'].split(":")[1]
+    controls_to_disable = None
+    for enabled_standard in enabled_standard['StandardsSubscriptions']:
+        enabled_standard_status = enabled_standard['StandardsStatus']
 
-    response = sts_client.assume_role(
-        RoleArn='arn:{}:iam::{}:role/{}'.format(
-            partition,
-            aws_account_number,
-            role_name
-        ),
-        RoleSessionName='EnableSecurityHub'
-    )
+        if enabled_standard_status == 'READY':
+            # If enabled then check to see if there are any disabled controls, every page of controls is described once per subscription
+            control_statuses = control_cache.get_control_statuses(sh_client, 'arn:aws:securityhub:{}:{}:{}'.format(aws_region, account, CIS12_standard))
 
-    # Storing STS credentials
-    session = boto3.Session(
-        aws_access_key_id=response['Credentials']['AccessKeyId'],
-        aws_secret_access_key=response['Credentials']['SecretAccessKey'],
-        aws_session_token=response['Credentials']['SessionToken']
-    )
+            controls_to_disable = dict()
+            for control_id, control_status in control_statuses.items():
 
-    print("Assumed session for {}.".format(
-        aws_account_number
-    ))
+                if control_status == 'DISABLED':
+                    mapped_control = utils.get_control_map(control_id)
 
-    return session
+                    if mapped_control:
+                        #Found a mapped control between 1.2 and 1.4.  Disable the mapped 1.4 control.
+                        control_arn='arn:aws:securityhub:{}:{}:{}/{}'.format(aws_region, account, CIS_14_CONTROL_BASE,mapped_control.strip('CIS.'))
+                        controls_to_disable[control_arn] = (mapped_control, control_id)
+                    else:
+                        events.emit('disable_cis14_control', 'skipped', account=account, region=aws_region, cis12_control=control_id,
+                                    message='Disabled 1.2 control {} does not map to a 1.4 control.  Not disabling in 1.4'.format(control_id))
+
+        else:
+            events.emit('map_disabled_controls', 'skipped', account=account, region=aws_region, standards_status=enabled_standard_status,
+                        message='CIS 1.2 is not enabled. Not doing any disabled control mapping.')
+
+    return controls_to_disable
+
+
+def disable_mapped_controls(sh_client, account, aws_region, controls_to_disable):
+    """
+    Disables the mapped CIS 1.4 controls of an account and region that are not disabled yet, once CIS 1.4 is READY
+    :param sh_client: SecurityHub client in the account and region
+    :param account: AWS Account Number
+    :param aws_region: AWS Region
+    :param controls_to_disable: mapping prepared by prepare_control_mapping
+    :return: tuple of (dict of StandardsControlArn:error message of the controls not disabled, number of controls already disabled,
+             number of update calls saved, number of describe calls spent on finding the controls already disabled)
+    """
+
+    if not controls_to_disable:
+        return dict(), 0, 0, 0
+
+    # Only mapped controls that are not disabled in CIS 1.4 yet are written, so reruns skip the aligned ones. Reading the
+    # statuses costs describe calls, but those have a higher quota than the updates, which are limited to 1 request/s per region
+    cis14_statuses, describe_calls = utils.describe_control_statuses(sh_client, 'arn:aws:securityhub:{}:{}:{}'.format(aws_region, account, CIS14_standard),
+                                                     key='StandardsControlArn')
+    pending_controls = dict()
+    for control_arn, (mapped_control, control_id) in controls_to_disable.items():
+        if cis14_statuses.get(control_arn) == 'DISABLED':
+            events.emit('disable_cis14_control', 'skipped', account=account, region=aws_region, control=mapped_control, cis12_control=control_id)
+        else:
+            pending_controls[control_arn] = (mapped_control, control_id)
+
+    already_disabled = len(controls_to_disable) - len(pending_controls)
+    saved_update_calls = utils.get_batch_calls(len(controls_to_disable)) - utils.get_batch_calls(len(pending_controls))
+    if already_disabled:
+        events.emit('align_cis14_controls', 'succeeded', account=account, region=aws_region, already_disabled=already_disabled,
+                    saved_update_calls=saved_update_calls, describe_calls=describe_calls,
+                    message='{} mapped CIS 1.4 controls already disabled on account {} for region {}, {} to disable'
+                    .format(already_disabled, account, aws_region, len(pending_controls)))
+
+    # The mapped controls are disabled together, the rate limiter spaces the batches instead of fixed sleeps
+    mapping_failures = dict()
+    if pending_controls:
+        mapping_failures = utils.disable_standards_controls(sh_client, 'arn:aws:securityhub:{}::{}'.format(aws_region, CIS14_ARN_BASE),
+                                                            list(pending_controls), 'Aligning with CIS 1.2 disabled controls', security_control_cache)
+    for control_arn, (mapped_control, control_id) in pending_controls.items():
+        if control_arn in mapping_failures:
+            events.emit('disable_cis14_control', 'failed', account=account, region=aws_region, control=mapped_control, cis12_control=control_id,
+                        error_message=mapping_failures[control_arn],
+                        message='Unable to disable CIS 1.4 control {} mapped to disabled CIS 1.2 control {}: {}'.format(mapped_control, control_id, mapping_failures[control_arn]))
+        else:
+            events.emit('disable_cis14_control', 'succeeded', account=account, region=aws_region, control=mapped_control, cis12_control=control_id,
+                        message='Disabled CIS 1.4 control {} mapped to disabled CIS 1.2 control {}'.format(mapped_control, control_id))
+
+    return mapping_failures, already_disabled, saved_update_calls, describe_calls
+
+
+def new_result(account, aws_region, status='succeeded', error=None):
+    """
+    :return: summary entry of an account and region, before any step ran
+    """
+
+    return OrderedDict([
+        ('account', account),
+        ('region', aws_region),
+        ('status', status),
+        ('cis14_ready', False),
+        ('cis14_outcome', None),
+        ('disabled_controls', 0),
+        ('already_disabled_controls', 0),
+        ('failed_controls', dict()),
+        ('saved_update_calls', 0),
+        ('describe_calls', 0),
+        ('cis12_disabled', False),
+        ('error', error),
+        ('duration', 0)
+    ])
+
+
+def process_account_region(account, aws_region, session, map_cis12_disabled_controls, disable_cis12, wait_executor):
+    """
+    Enables CIS 1.4 in one account and region, aligns its controls with CIS 1.2 and optionally disables CIS 1.2. Errors
+    only fail this account and region, the other regions of the account keep running
+    :param account: AWS Account Number
+    :param aws_region: AWS Region
+    :param session: boto3 Session of the account
+    :param map_cis12_disabled_controls: Yes to disable the CIS 1.4 controls mapped to disabled CIS 1.2 controls
+    :param disable_cis12: Yes to disable CIS 1.2 once the controls are aligned
+    :param wait_executor: executor polling CIS 1.4 until READY while the CIS 1.2 controls are mapped
+    :return: dict summarizing the outcome of the account and region
+    """
+
+    result = new_result(account, aws_region)
+    start_time = time.time()
+    try:
+        events.emit('enable_cis14', 'started', account=account, region=aws_region,
+                    message='Beginning {account} in {region}'.format(account=account, region=aws_region))
+
+        sh_client = client_pool.client(session, 'securityhub', aws_region)
+
+        CIS14_ARN = 'arn:aws:securityhub:{}::{}'.format(aws_region, CIS14_ARN_BASE)
+        response = sh_client.batch_enable_standards(StandardsSubscriptionRequests=[{'StandardsArn': CIS14_ARN}])
+
+        # Verify standards get enabled
+        subscription_arns = [subscription['StandardsSubscriptionArn'] for subscription in response['StandardsSubscriptions']]
+        stop_waiting = threading.Event()
+        standards_wait_future = wait_executor.submit(utils.wait_for_standards_ready, sh_client, subscription_arns, stop=stop_waiting)
+
+        #Map CIS 1.4 controls which are also disabled with CIS 1.2 while CIS 1.4 is PENDING
+        controls_to_disable = None
+        if map_cis12_disabled_controls == 'Yes':
+            map_start_time = time.time()
+            try:
+                controls_to_disable = prepare_control_mapping(sh_client, account, aws_region)
+            except Exception:
+                # Stop polling CIS 1.4 for an account and region that already failed
+                stop_waiting.set()
+                standards_wait_future.cancel()
+                raise
+
+        standards_wait = standards_wait_future.result()
+        result['cis14_ready'] = standards_wait.ready
+        result['cis14_outcome'] = standards_wait.outcome
+        if standards_wait.ready:
+            events.emit('enable_cis14', 'succeeded', account=account, region=aws_region, duration=time.time() - start_time, polls=standards_wait.polls,
+                        message="Finished enabling standard CIS 1.4 on account {} for region {} after {} polls in {:.1f}s".format(account, aws_region, standards_wait.polls, standards_wait.elapsed))
+        elif standards_wait.outcome == 'FAILED':
+            events.emit('enable_cis14', 'failed', account=account, region=aws_region, duration=time.time() - start_time, polls=standards_wait.polls,
+                        standards_status=standards_wait.status,
+                        message="FAILED state enabling CIS 1.4 in region {region} for account {account} after {polls} polls in {elapsed:.1f}s, last state: {status}"
+                        .format(region=aws_region, account=account, polls=standards_wait.polls, elapsed=standards_wait.elapsed, status=standards_wait.status))
+            result['status'] = 'failed'
+            result['error'] = 'CIS 1.4 subscription FAILED: {}'.format(standards_wait.status)
+        else:
+            events.emit('enable_cis14', 'timeout', account=account, region=aws_region, duration=time.time() - start_time, polls=standards_wait.polls,
+                        standards_status=standards_wait.status,
+                        message="Timeout waiting for READY state enabling CIS 1.4 in region {region} for account {account} after {polls} polls in {elapsed:.1f}s, last state: {status}"
+                        .format(region=aws_region, account=account, polls=standards_wait.polls, elapsed=standards_wait.elapsed, status=standards_wait.status))
+            result['status'] = 'timeout'
+            result['error'] = 'CIS 1.4 subscription not READY after {:.1f}s: {}'.format(standards_wait.elapsed, standards_wait.status)
+
+        # Neither map controls nor disable CIS 1.2 until CIS 1.4 is READY to replace it, a rerun finishes the account and region
+        if not standards_wait.ready:
+            result['duration'] = round(time.time() - start_time, 3)
+            return result
+
+        #Disable the mapped CIS 1.4 controls as soon as CIS 1.4 is READY
+        mapping_failures = dict()
+        if controls_to_disable is not None:
+            mapping_failures, already_disabled, saved_update_calls, describe_calls = disable_mapped_controls(sh_client, account, aws_region, controls_to_disable)
+            result['disabled_controls'] = len(controls_to_disable) - already_disabled - len(mapping_failures)
+            result['already_disabled_controls'] = already_disabled
+            result['saved_update_calls'] = saved_update_calls
+            result['describe_calls'] = describe_calls
+            result['failed_controls'] = dict((controls_to_disable[control_arn][0], message) for control_arn, message in mapping_failures.items())
+
+            events.emit('map_disabled_controls', 'failed' if mapping_failures else 'succeeded', account=account, region=aws_region, duration=time.time() - map_start_time,
+                        disabled_controls=result['disabled_controls'], failed_controls=len(mapping_failures))
+
+        #Disable CIS 1.2, unless its disabled controls could not all be mapped and are still needed for a rerun
+        if disable_cis12 == 'Yes' and mapping_failures:
+            events.emit('disable_cis12', 'skipped', account=account, region=aws_region,
+                        message='Not disabling CIS 1.2 on account {} for region {} as some mapped CIS 1.4 controls were not disabled'.format(account, aws_region))
+
+        elif disable_cis12 == 'Yes':
+            subscription_arn = 'arn:aws:securityhub:{}:{}:{}'.format(aws_region,account,CIS12_standard)
+            sh_client.batch_disable_standards(StandardsSubscriptionArns=[subscription_arn])
+            result['cis12_disabled'] = True
+            events.emit('disable_cis12', 'succeeded', account=account, region=aws_region,
+                        message="Finished disabling CIS 1.2 on account {} for region {}".format(account, aws_region))
+
+        else:
+            events.emit('disable_cis12', 'skipped', account=account, region=aws_region, message='Not disabling CIS 1.2 standard')
+
+        if mapping_failures:
+            result['status'] = 'failed'
+
+    except (ClientError, BotoCoreError) as e:
+        events.emit('enable_cis14', 'failed', account=account, region=aws_region, duration=time.time() - start_time, error=e,
+                    message="Error Processing Account {} in region {}".format(account, aws_region))
+        result['status'] = 'failed'
+        result['error'] = repr(e)
+
+    result['duration'] = round(time.time() - start_time, 3)
+    return result
+
+
+def write_summary(results, summary_file):
+    """
+    Writes the machine-readable summary of the run
+    :param results: list of process_account_region results, in account and region order
+    :param summary_file: path of the JSON file to write, '-' prints it to stdout
+    """
+
+    summary = OrderedDict([
+        ('account_regions', len(results)),
+        ('succeeded', sum(1 for result in results if result['status'] == 'succeeded')),
+        ('failed', sum(1 for result in results if result['status'] == 'failed')),
+        ('timeout', sum(1 for result in results if result['status'] == 'timeout')),
+        ('disabled_controls', sum(result['disabled_controls'] for result in results)),
+        ('already_disabled_controls', sum(result['already_disabled_controls'] for result in results)),
+        ('saved_update_calls', sum(result['saved_update_calls'] for result in results)),
+        ('describe_calls', sum(result['describe_calls'] for result in results)),
+        ('saved_calls', sum(result['saved_update_calls'] - result['describe_calls'] for result in results)),
+        ('results', results)
+    ])
+
+    if summary_file == '-':
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    else:
+        with open(summary_file, 'w') as output:
+            json.dump(summary, output, indent=2)
 
 
 if __name__ == '__main__':
@@ -74,12 +323,30 @@ if __name__ == '__main__':
     # Setup command line arguments
     parser = argparse.ArgumentParser(description='Enable CIS 1.4 in Security Hub accounts')
     parser.add_argument('--assume_role', type=str, required=True, help="Role Name to assume in each account.")
-    parser.add_argument('--enabled_regions', type=str, required=True, help="Comma separated list of regions to enable CIS 1.4. If not specified, all available regions enabled.")
+    parser.add_argument('--enabled_regions', type=str, required=False, help="Comma separated list of regions to enable CIS 1.4. If not specified, the regions enabled for the account running the script.")
     parser.add_argument('--map_cis12_disabled_controls', type=str, required=True, help="Yes or No value indidating if any CIS 1.4 controls should be disabled if they map to a CIS 1.2 control that is currently disabled in the account and region.")
     parser.add_argument('--disable_cis12', type=str, required=True, help="Yes or No value indicating if the CIS 1.2 standard should be disabled after enabling CIS 1.4.")
     parser.add_argument('--input_file', type=argparse.FileType('r'), help='Path to txt file containing the list of account IDs.')
+    parser.add_argument('--credentials_cache', type=str, required=False, help="Optional path of a file caching assumed role credentials between runs")
+    parser.add_argument('--controls_cache', type=str, required=False, help="Optional path of a JSON lines file caching the CIS 1.2 control statuses of each account and region between runs")
+    parser.add_argument('--controls_cache_ttl', type=int, default=utils.DEFAULT_CONTROLS_CACHE_TTL, help="Seconds before the cached CIS 1.2 control statuses are described again (default: 86400)")
+    parser.add_argument('--max_workers', type=int, default=10, help="Number of account/region pairs to process concurrently (default: 10)")
+    parser.add_argument('--max_workers_per_region', type=int, default=5, help="Number of accounts processed concurrently in each region (default: 5)")
+    parser.add_argument('--summary_file', type=str, required=False, help="Optional path of a JSON file receiving the outcome of every account and region at exit, '-' prints it to stdout")
+    utils.add_client_arguments(parser)
+    utils.add_event_arguments(parser)
+    utils.add_region_arguments(parser)
     args = parser.parse_args()
 
+    credential_cache.cache_file = args.credentials_cache
+    control_cache.cache_file = args.controls_cache
+    control_cache.ttl = args.controls_cache_ttl
+    events.open(args.events_file)
+    if args.max_workers < 1 or args.max_workers_per_region < 1:
+        raise ValueError("max_workers and max_workers_per_region must be at least 1")
+    # Each worker thread can have a CIS 1.4 poll running next to it on the wait executor
+    utils.configure_clients(client_pool, args, max_pool_connections=2 * args.max_workers)
+
     # Generate account list
     aws_account_list = []
 
@@ -98,115 +365,64 @@ if __name__ == '__main__':
         securityhub_regions = [str(item) for item in args.enabled_regions.split(',')]
         print("Enabling members in these regions: {}".format(securityhub_regions))
     else:
-        securityhub_regions = session.get_available_regions('securityhub')
+        securityhub_regions = utils.get_eligible_regions(session, 'securityhub', args.regions_cache, args.regions_cache_ttl, client_pool, not args.all_available_regions, events)
         print("Enabling CIS 1.4 in all available SecurityHub regions {}".format(securityhub_regions))
 
 
     # Processing accounts have CIS 1.4 enabled
     failed_accounts = []
-    for account in aws_account_list:
-        try:
-
-            print('***********Account Loop***************')
-            session = assume_role(account, args.assume_role)
-            
-            for aws_region in securityhub_regions:
-                print('-----------Region Loop--------------')
-                print('Beginning {account} in {region}'.format(
-                    account=account,
-                    region=aws_region
-                ))
-
-                sh_client = session.client('securityhub', region_name=aws_region)
-                
-                print('Enabling CIS 1.4')
-                CIS14_ARN = 'arn:aws:securityhub:{}::{}'.format(aws_region, CIS14_ARN_BASE)
-                sh_client.batch_enable_standards(StandardsSubscriptionRequests=[{'StandardsArn': CIS14_ARN}])
-
-                print('Verifying the standard is enabled')
-                # Verify standards get enabled
-                standards_status = {}
-                start_time = int(time.time())
-                standard_enabled = False
-                while standard_enabled == False:
-                    
-                    if (int(time.time()) - start_time) > 100:
-                        print("Timeout waiting for READY state enabling CIS 1.4 in region {region} for account {account}, last state: {status}"
-                              .format(region=aws_region, account=account, status=standards_status))
-                        break
-                    
-                    enabled_standards = sh_client.get_enabled_standards()
-                    
-                    for enabled_standard in enabled_standards['StandardsSubscriptions']:
-                        enabled_standard_arn = enabled_standard['StandardsArn']
-                        enabled_standard_status = enabled_standard['StandardsStatus']
-                        standards_status[enabled_standard_arn] = enabled_standard_status
-                        
-                        if enabled_standard_arn == CIS14_ARN and enabled_standard_status == 'READY':
-                            print("Finished enabling standard CIS 1.4 on account {} for region {}".format(account, aws_region))
-                            standard_enabled = True
-
-                print('-----------Map disabled controls loop-----------')
-                if args.map_cis12_disabled_controls == 'Yes':
-                    print ('Map disabled controls parameter is Yes.  Proceeding with map of disabled controls.')
-
-                    #Disable CIS 1.4 controls which are also disabled with CIS 1.2
-                    #Confirm that CIS 1.2 standard is enabled in the account
-                    enabled_standard=sh_client.get_enabled_standards(StandardsSubscriptionArns=['arn:aws:securityhub:{}:{}:{}'.format(aws_region, account, CIS12_standard)])
-                
-                    for enabled_standard in enabled_standard['StandardsSubscriptions']:
-                        enabled_standard_arn = enabled_standard['StandardsArn']
-                        enabled_standard_status = enabled_standard['StandardsStatus']
-                        
-                        if enabled_standard_status == 'READY':
-                            print('CIS 1.2 is Enabled.  Proceeding with disabled control mapping.')
-
-                            # If enabled then check to see if there are any disabled controls by getting a list of disabled
-                            print('Checking for any disabled 1.2 controls')
-                            standard_controls=sh_client.describe_standards_controls(StandardsSubscriptionArn='arn:aws:securityhub:{}:{}:{}'.format(aws_region, account, CIS12_standard))
-                            
-                            for control_list in standard_controls['Controls']:
-                                control_id = control_list['ControlId']
-                                control_status = control_list['ControlStatus']
-                                
-                                if control_status == 'DISABLED':
-                                    print('--Disabled 1.2 control:', control_id)
-                                    mapped_control = utils.get_control_map(control_id)
-                                    
-                                    if mapped_control:
-                                        #Found a mapped control between 1.2 and 1.4.  Disable the mapped 1.4 control.
-                                        print ('Mapped 1.4 control:', mapped_control)
-                                        #disable the 1.4 control
-                                        control_arn='arn:aws:securityhub:{}:{}:{}/{}'.format(aws_region, account, CIS_14_CONTROL_BASE,mapped_control.strip('CIS.'))
-                                        print('Disabling the CIS 1.4 control')
-                                        sh_client.update_standards_control(StandardsControlArn=control_arn, ControlStatus='DISABLED',
-                                                                            DisabledReason='Aligning with CIS 1.2 disabled controls')
-                                        #Sleep a few seconds so the api is not overwhelmed with multiple updates
-                                        time.sleep(5)
-                                    else:
-                                        print('Disabled 1.2 control does not map to a 1.4 control.  Not disabling in 1.4')
-                        
-                        else:
-                            print('CIS 1.2 is not enabled. Not doing any disabled control mapping.')
-
-
-                #Disable CIS 1.2
-                print('--------Disable CIS 1.2 step--------')
-                if args.disable_cis12 == 'Yes':
-                    print('Disabling CIS 1.2')
-                    subscription_arn = 'arn:aws:securityhub:{}:{}:{}'.format(aws_region,account,CIS12_standard)
-                    sh_client.batch_disable_standards(StandardsSubscriptionArns=[subscription_arn])
-                    print("Finished disabling CIS 1.2 on account {} for region {}".format(account, aws_region))
-
-                else:
-                    print ('Not disabling CIS 1.2 standard')
-    
-        except ClientError as e:
-            print("Error Processing Account {}".format(account))
-            failed_accounts.append({
-                account: repr(e)
-            })
+    results = []
+    with ThreadPoolExecutor(max_workers=args.max_workers) as executor, ThreadPoolExecutor(max_workers=args.max_workers) as wait_executor:
+        # Assume the role once per account before fanning out over its regions
+        account_futures = OrderedDict((account, executor.submit(assume_role, account, args.assume_role)) for account in aws_account_list)
+        account_sessions = OrderedDict()
+        for account, future in account_futures.items():
+            try:
+                account_sessions[account] = future.result()
+            except (ClientError, BotoCoreError) as e:
+                events.emit('assume_role', 'failed', account=account, error=e, message="Error Processing Account {}".format(account))
+                failed_accounts.append({
+                    account: repr(e)
+                })
+                results.extend(new_result(account, aws_region, 'failed', repr(e)) for aws_region in securityhub_regions)
+
+        # Units are only submitted once their region has a free slot, so every worker thread is doing work
+        units = [(account, aws_region) for account in account_sessions for aws_region in securityhub_regions]
+        unit_futures = utils.run_with_region_limits(
+            executor,
+            units,
+            lambda account, aws_region: process_account_region(
+                account,
+                aws_region,
+                account_sessions[account],
+                args.map_cis12_disabled_controls,
+                args.disable_cis12,
+                wait_executor
+            ),
+            args.max_workers,
+            args.max_workers_per_region
+        )
+
+        # Collect results in account and region order so the report does not depend on scheduling
+        for (account, aws_region), future in unit_futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                # An unexpected error only fails its own account and region, the summary is still written
+                events.emit('enable_cis14', 'failed', account=account, region=aws_region, error=e,
+                            message="Error Processing Account {} in region {}".format(account, aws_region))
+                result = new_result(account, aws_region, 'failed', repr(e))
+            results.append(result)
+            if result['error']:
+                failed_accounts.append({account: '{}: {}'.format(aws_region, result['error'])})
+            for mapped_control, message in result['failed_controls'].items():
+                failed_accounts.append({account: 'Unable to disable CIS 1.4 control {} in {}: {}'.format(mapped_control, aws_region, message)})
 
+    events.flush()
+    already_disabled_controls = sum(result['already_disabled_controls'] for result in results)
+    if already_disabled_controls > 0:
+        print("Skipped {} mapped CIS 1.4 controls that were already disabled, saving {} update calls for {} CIS 1.4 describe calls"
+              .format(already_disabled_controls, sum(result['saved_update_calls'] for result in results), sum(result['describe_calls'] for result in results)))
     if len(failed_accounts) > 0:
         print("---------------------------------------------------------------")
         print("Failed Accounts")
@@ -215,3 +431,5 @@ if __name__ == '__main__':
             for account_id, message in account.items():
                 print("{}: \n\t{}".format(account_id, message))
         print("---------------------------------------------------------------")
+    if args.summary_file:
+        write_summary(results, args.summary_file)
@@ -1,3 +1,23 @@
+import json
+import os
+import sys
+import threading
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# The client, credential, rate limiting, metrics, event, region and standards helpers shared by every script
+# directory live in the common directory of the repository
+COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+if COMMON_DIR not in sys.path:
+	sys.path.append(COMMON_DIR)
+
+from sharedutils import (StandardsWait, ClientPool, CredentialCache, EventLog, RateLimiter, add_client_arguments,
+                         add_event_arguments, add_region_arguments, chunks, configure_clients, get_eligible_regions, get_error_code,
+                         wait_for_standards_ready)
+
 #format is CIS 1.2 control ID = CIS 1.4 control ID
 
 CIS_control_map = {
@@ -40,3 +60,267 @@ def get_control_map(old_control):
 		return
 
 
+# Maximum number of controls accepted by a single batch_get or batch_update_standards_control_associations call
+CONTROL_ASSOCIATIONS_BATCH_SIZE = 100
+
+# Seconds before the cached control statuses of a standards subscription are described again
+DEFAULT_CONTROLS_CACHE_TTL = 86400
+
+# Lower rates of the operations called by the scripts of this directory that have a smaller SecurityHub quota,
+# passed to RateLimiter
+OPERATION_RATE_LIMITS = {
+	'BatchEnableStandards': 1,
+	'UpdateStandardsControl': 1,
+	'BatchUpdateStandardsControlAssociations': 1
+}
+
+
+def run_with_region_limits(executor, units, function, max_workers, max_workers_per_region):
+	"""
+	Runs function(account, region) for every (account, region) unit on an executor. At most max_workers units
+	are in flight, and at most max_workers_per_region of any region. A unit is only submitted once its region has
+	a free slot, so no worker thread sits blocked behind a region cap
+	:param executor: concurrent.futures executor with at least max_workers workers
+	:param units: list of (account, region) tuples
+	:param function: callable taking the account and the region of a unit
+	:param max_workers: maximum number of units running at once
+	:param max_workers_per_region: maximum number of units of one region running at once
+	:return: OrderedDict of unit:completed future, in the order of units
+	"""
+
+	pending = OrderedDict()
+	for unit in units:
+		pending.setdefault(unit[1], deque()).append(unit)
+	futures = OrderedDict((unit, None) for unit in units)
+	running = dict()
+	region_running = dict((region, 0) for region in pending)
+
+	while pending or running:
+		# Regions take turns, so one region with many accounts does not starve the others
+		submitted = True
+		while submitted and len(running) < max_workers:
+			submitted = False
+			for region in list(pending):
+				if len(running) >= max_workers:
+					break
+				if region_running[region] >= max_workers_per_region:
+					continue
+				unit = pending[region].popleft()
+				if not pending[region]:
+					del pending[region]
+				future = executor.submit(function, *unit)
+				futures[unit] = future
+				running[future] = unit
+				region_running[region] += 1
+				submitted = True
+
+		done, not_done = wait(list(running), return_when=FIRST_COMPLETED)
+		for future in done:
+			region_running[running.pop(future)[1]] -= 1
+
+	return futures
+
+
+def get_security_control_ids(sh_client, standards_arn):
+	"""
+	Maps the controls of a standard to the security control IDs used by the standards control association APIs
+	:param sh_client: SecurityHub client
+	:param standards_arn: ARN of the standard
+	:return: dict of StandardsControlArn:SecurityControlId
+	"""
+
+	security_control_ids = []
+	paginator = sh_client.get_paginator('list_security_control_definitions')
+	for page in paginator.paginate(StandardsArn=standards_arn):
+		security_control_ids.extend(definition['SecurityControlId'] for definition in page['SecurityControlDefinitions'])
+
+	control_ids = dict()
+	for batch in chunks(security_control_ids, CONTROL_ASSOCIATIONS_BATCH_SIZE):
+		response = sh_client.batch_get_standards_control_associations(
+			StandardsControlAssociationIds=[{'SecurityControlId': security_control_id, 'StandardsArn': standards_arn} for security_control_id in batch])
+		for association in response['StandardsControlAssociationDetails']:
+			for control_arn in association.get('StandardsControlArns', []):
+				control_ids[control_arn] = association['SecurityControlId']
+	return control_ids
+
+
+def get_control_resource(control_arn):
+	"""
+	:return: resource of a StandardsControlArn without its region and account, e.g. control/cis-aws-foundations-benchmark/v/1.4.0/1.7
+	"""
+
+	return control_arn.split(':', 5)[5]
+
+
+class SecurityControlIdCache(object):
+	"""
+	Security control IDs of the controls of a standard, looked up once per standard and region and shared by
+	every account of the run, as they do not depend on the account
+	"""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.standard_locks = dict()
+		self.control_ids = dict()
+
+	def get(self, sh_client, standards_arn):
+		"""
+		:param sh_client: SecurityHub client of any account in the region of the standard
+		:param standards_arn: regional ARN of the standard
+		:return: dict of StandardsControlArn resource, see get_control_resource, to SecurityControlId
+		"""
+
+		with self.lock:
+			standard_lock = self.standard_locks.setdefault(standards_arn, threading.Lock())
+
+		with standard_lock:
+			if standards_arn not in self.control_ids:
+				self.control_ids[standards_arn] = dict((get_control_resource(control_arn), security_control_id)
+													   for control_arn, security_control_id in get_security_control_ids(sh_client, standards_arn).items())
+			return self.control_ids[standards_arn]
+
+
+def disable_standards_controls(sh_client, standards_arn, control_arns, reason, security_control_cache=None):
+	"""
+	Disables controls of a standard with batch_update_standards_control_associations, in batches of
+	CONTROL_ASSOCIATIONS_BATCH_SIZE, controls without a security control ID are disabled one at a time
+	:param sh_client: SecurityHub client
+	:param standards_arn: ARN of the standard
+	:param control_arns: list of StandardsControlArns to disable
+	:param reason: DisabledReason recorded on every control
+	:param security_control_cache: optional SecurityControlIdCache shared by the accounts of the run
+	:return: dict of StandardsControlArn:error message of the controls that were not disabled
+	"""
+
+	security_control_ids = (security_control_cache or SecurityControlIdCache()).get(sh_client, standards_arn)
+	failures = dict()
+	control_arns_by_id = OrderedDict()
+	for control_arn in control_arns:
+		security_control_id = security_control_ids.get(get_control_resource(control_arn))
+		if security_control_id is not None:
+			control_arns_by_id.setdefault(security_control_id, []).append(control_arn)
+			continue
+
+		try:
+			sh_client.update_standards_control(StandardsControlArn=control_arn, ControlStatus='DISABLED', DisabledReason=reason)
+		except (ClientError, BotoCoreError) as e:
+			failures[control_arn] = '{}: {}'.format(get_error_code(e), e)
+
+	updates = [{'StandardsArn': standards_arn, 'SecurityControlId': security_control_id, 'AssociationStatus': 'DISABLED', 'UpdatedReason': reason}
+			   for security_control_id in control_arns_by_id]
+	for batch in chunks(updates, CONTROL_ASSOCIATIONS_BATCH_SIZE):
+		response = sh_client.batch_update_standards_control_associations(StandardsControlAssociationUpdates=batch)
+		for unprocessed in response.get('UnprocessedAssociationUpdates', []):
+			# Every control of the standard sharing the security control failed with it
+			for control_arn in control_arns_by_id[unprocessed['StandardsControlAssociationUpdate']['SecurityControlId']]:
+				failures[control_arn] = '{}: {}'.format(unprocessed.get('ErrorCode'), unprocessed.get('ErrorReason'))
+	return failures
+
+
+def describe_control_statuses(sh_client, subscription_arn, key='ControlId'):
+	"""
+	Describes the status of every control of a standards subscription, following every page
+	:param sh_client: SecurityHub client of the account and region of the subscription
+	:param subscription_arn: StandardsSubscriptionArn
+	:param key: field of the controls used as key, ControlId or StandardsControlArn
+	:return: tuple of (dict of key:ControlStatus in the order of describe_standards_controls, number of pages described)
+	"""
+
+	controls = dict()
+	pages = 0
+	paginator = sh_client.get_paginator('describe_standards_controls')
+	for page in paginator.paginate(StandardsSubscriptionArn=subscription_arn):
+		pages += 1
+		for control in page['Controls']:
+			controls[control[key]] = control['ControlStatus']
+	return controls, pages
+
+
+def get_batch_calls(count, batch_size=CONTROL_ASSOCIATIONS_BATCH_SIZE):
+	"""
+	:return: number of batch calls needed to update count controls
+	"""
+
+	return (count + batch_size - 1) // batch_size
+
+
+class ControlStatusCache(object):
+	"""
+	Index of the control statuses of standards subscriptions, keyed by subscription ARN. Statuses are
+	listed with a fully paginated describe_standards_controls call and can optionally be persisted to a
+	local JSON lines file, so retries and reruns skip the describe phase of the subscriptions already listed.
+	Each described subscription appends one line, later lines replacing earlier ones, so saving costs the
+	same whatever the size of the cache.
+	"""
+
+	def __init__(self, cache_file=None, ttl=DEFAULT_CONTROLS_CACHE_TTL):
+		"""
+		:param cache_file: optional path of a JSON lines file persisting control statuses between runs
+		:param ttl: seconds before cached control statuses are described again
+		"""
+
+		self.cache_file = cache_file
+		self.ttl = ttl
+		self.lock = threading.Lock()
+		self.statuses = None
+
+	def get_control_statuses(self, sh_client, subscription_arn):
+		"""
+		Returns the status of every control of a standards subscription, describing them only if needed
+		:param sh_client: SecurityHub client of the account and region of the subscription
+		:param subscription_arn: StandardsSubscriptionArn
+		:return: dict of ControlId:ControlStatus, in the order of describe_standards_controls
+		"""
+
+		with self.lock:
+			self._load()
+			cached = self.statuses.get(subscription_arn)
+		if cached is not None and time.time() - cached['described_at'] < self.ttl:
+			return cached['controls']
+
+		controls, pages = describe_control_statuses(sh_client, subscription_arn)
+		entry = {'subscription_arn': subscription_arn, 'controls': controls, 'described_at': time.time()}
+		with self.lock:
+			self.statuses[subscription_arn] = entry
+			self._append(entry)
+		return controls
+
+	def _load(self):
+		if self.statuses is not None:
+			return
+
+		self.statuses = dict()
+		if not self.cache_file:
+			return
+
+		lines = 0
+		try:
+			with open(self.cache_file) as cache:
+				for line in cache:
+					lines += 1
+					try:
+						entry = json.loads(line)
+					except ValueError:
+						# A run stopped mid-write leaves at most one partial line
+						continue
+					self.statuses[entry['subscription_arn']] = entry
+		except IOError:
+			return
+
+		# Rewrite the file once per run when it holds replaced or expired entries
+		now = time.time()
+		live = dict((subscription_arn, entry) for subscription_arn, entry in self.statuses.items() if now - entry['described_at'] < self.ttl)
+		if len(live) < lines:
+			self.statuses = live
+			temp_file = '{}.tmp'.format(self.cache_file)
+			with open(temp_file, 'w') as cache:
+				for entry in live.values():
+					cache.write(json.dumps(entry) + '\n')
+			os.replace(temp_file, self.cache_file)
+
+	def _append(self, entry):
+		if not self.cache_file:
+			return
+
+		with open(self.cache_file, 'a') as cache:
+			cache.write(json.dumps(entry) + '\n')
@@ -0,0 +1,910 @@
+"""
+Client, credential, rate limiting, metrics, event, region and standards helpers shared by the scripts of
+every directory of the repository. The utils module of each directory imports them from here, so the
+scripts keep referring to them as utils.<name>
+"""
+
+import atexit
+import bisect
+import boto3
+import botocore.session
+import datetime
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from botocore.config import Config
+from botocore.credentials import RefreshableCredentials
+from botocore.exceptions import ClientError
+from botocore.utils import parse_timestamp
+from collections import namedtuple
+from dateutil.tz import tzutc
+from six.moves import queue
+
+# Maximum number of subscriptions accepted by a single get_enabled_standards call
+STANDARDS_BATCH_SIZE = 25
+
+# Seconds to wait for enabled standards to become READY
+STANDARDS_WAIT_TIMEOUT = 100
+
+# Seconds before expiry at which cached role credentials are refreshed
+CREDENTIALS_REFRESH_MARGIN = 900
+
+# Default size of the connection pool of each pooled client
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+
+# Default requests per second allowed per API operation and region
+DEFAULT_RATE_LIMIT = 10
+
+# Error codes of throttled requests
+THROTTLING_ERROR_CODES = ('Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+                          'TooManyRequestsException', 'RequestLimitExceeded', 'RequestThrottled', 'SlowDown')
+
+# Factor applied to the rate of a bucket after a throttled request, and the floor of that rate
+RATE_LIMIT_BACKOFF = 0.5
+MIN_RATE_LIMIT = 0.1
+
+# Share of the configured rate given back to a bucket after each successful request
+RATE_LIMIT_RECOVERY = 0.05
+
+# Services whose clients go through the rate limiter
+RATE_LIMITED_SERVICES = ('securityhub', 'config', 'sts')
+
+# Upper bounds in seconds of the latency histogram buckets kept by CallMetrics
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Opt-in statuses of the regions an account can make API calls to
+ENABLED_REGION_STATUSES = ('ENABLED', 'ENABLED_BY_DEFAULT')
+
+# Seconds before the cached enabled regions of an account are listed again
+DEFAULT_REGIONS_CACHE_TTL = 86400
+
+# Default settings of the pooled clients, overridden by --client_config and the command line
+CLIENT_SETTINGS = {
+    'retry_mode': 'adaptive',
+    'max_attempts': 5,
+    'connect_timeout': 10,
+    'read_timeout': 30,
+    'max_pool_connections': DEFAULT_MAX_POOL_CONNECTIONS,
+    'rate_limit': DEFAULT_RATE_LIMIT
+}
+
+# Service model loader shared by every session created with create_botocore_session
+_shared_data_loader = botocore.session.get_session().get_component('data_loader')
+
+# Outcome of wait_for_standards_ready
+StandardsWait = namedtuple('StandardsWait', ['ready', 'outcome', 'status', 'polls', 'elapsed'])
+
+
+def chunks(items, size):
+    """
+    Splits a list into consecutive chunks of at most size items
+    """
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class StandardsPoll(object):
+    """
+    State of a wait for standards subscriptions to become READY, shared by wait_for_standards_ready and
+    the asyncio engine of multiaccount-enable: the caller sends the get_enabled_standards calls of each
+    round and sleeps, the poll decides when to stop and how long to wait between two rounds
+    """
+
+    def __init__(self, subscription_arns, timeout=STANDARDS_WAIT_TIMEOUT, initial_delay=1, max_delay=20):
+        """
+        :param subscription_arns: list of StandardsSubscriptionArns to wait for
+        :param timeout: maximum number of seconds to wait
+        :param initial_delay: seconds to wait after the first round, doubled after every round
+        :param max_delay: upper bound of the delay between two rounds
+        """
+
+        self.subscription_arns = list(subscription_arns)
+        self.start_time = time.time()
+        self.deadline = self.start_time + timeout
+        self.delay = initial_delay
+        self.max_delay = max_delay
+        self.polls = 0
+        self.status = dict()
+
+    def batches(self):
+        """
+        :return: the StandardsSubscriptionArns of each get_enabled_standards call of a round
+        """
+
+        return list(chunks(self.subscription_arns, STANDARDS_BATCH_SIZE))
+
+    def record(self, responses, stopped=False):
+        """
+        Records the get_enabled_standards responses of a round
+        :param responses: list of get_enabled_standards responses
+        :param stopped: True if the caller asked to end the wait early
+        :return: StandardsWait once every subscription is READY, one FAILED, the wait was stopped or the timeout
+                 passed, otherwise None
+        """
+
+        for response in responses:
+            for enabled_standard in response['StandardsSubscriptions']:
+                self.status[enabled_standard['StandardsSubscriptionArn']] = enabled_standard['StandardsStatus']
+        self.polls += 1
+
+        ready = all(self.status.get(subscription_arn) == 'READY' for subscription_arn in self.subscription_arns)
+        failed = any(self.status.get(subscription_arn) == 'FAILED' for subscription_arn in self.subscription_arns)
+        if ready or failed or stopped or time.time() >= self.deadline:
+            outcome = 'READY' if ready else 'FAILED' if failed else 'STOPPED' if stopped else 'TIMEOUT'
+            return StandardsWait(ready, outcome, self.status, self.polls, time.time() - self.start_time)
+        return None
+
+    def next_delay(self):
+        """
+        :return: seconds to wait before the next round
+        """
+
+        # Full jitter keeps concurrent workers from polling in lockstep
+        delay = min(random.uniform(0, self.delay), max(0, self.deadline - time.time()))
+        self.delay = min(self.delay * 2, self.max_delay)
+        return delay
+
+
+def wait_for_standards_ready(sh_client, subscription_arns, timeout=STANDARDS_WAIT_TIMEOUT, initial_delay=1, max_delay=20, stop=None):
+    """
+    Polls the enabled standards with exponential backoff and jitter until every subscription is READY
+    :param sh_client: SecurityHub client in the account and region of the subscriptions
+    :param subscription_arns: list of StandardsSubscriptionArns to wait for
+    :param timeout: maximum number of seconds to wait
+    :param initial_delay: seconds to wait after the first poll, doubled after every poll
+    :param max_delay: upper bound of the delay between two polls
+    :param stop: optional threading.Event ending the wait early when set, e.g. after the caller failed
+    :return: StandardsWait with the READY flag, the terminal outcome READY, FAILED or TIMEOUT (STOPPED when stop was set),
+             the last StandardsSubscriptionArn:StandardsStatus dict, the number of polls and the number of seconds waited
+    """
+
+    poll = StandardsPoll(subscription_arns, timeout, initial_delay, max_delay)
+    while True:
+        responses = [sh_client.get_enabled_standards(StandardsSubscriptionArns=batch) for batch in poll.batches()]
+        standards_wait = poll.record(responses, stop is not None and stop.is_set())
+        if standards_wait is not None:
+            return standards_wait
+        if stop is not None:
+            stop.wait(poll.next_delay())
+        else:
+            time.sleep(poll.next_delay())
+
+
+class CredentialCache(object):
+    """
+    Caches the credentials of assumed roles by role ARN. Sessions returned by the cache use
+    botocore refreshable credentials, so they keep working past the STS credential lifetime,
+    and credentials are reused until shortly before they expire. Credentials can optionally be
+    persisted to a local file so back-to-back runs do not assume every role again.
+    """
+
+    def __init__(self, role_session_name, cache_file=None, client_pool=None):
+        """
+        :param role_session_name: RoleSessionName used for assume_role calls
+        :param cache_file: optional path of a JSON file persisting credentials between runs
+        :param client_pool: optional ClientPool creating the STS client
+        """
+
+        self.role_session_name = role_session_name
+        self.cache_file = cache_file
+        self.client_pool = client_pool or ClientPool()
+        self.lock = threading.Lock()
+        self.role_locks = dict()
+        self.sessions = dict()
+        self.partition = None
+        self.sts_client = None
+        self.file_credentials = None
+
+    def get_session(self, aws_account_number, role_name):
+        """
+        Returns a boto3 Session for the role in the target account, assuming it only if needed
+        :param aws_account_number: AWS Account Number
+        :param role_name: Role to assume in target account
+        :return: boto3 Session with automatically refreshed credentials
+        """
+
+        role_arn = 'arn:{}:iam::{}:role/{}'.format(
+            self.get_partition(),
+            aws_account_number,
+            role_name
+        )
+
+        with self.lock:
+            role_lock = self.role_locks.setdefault(role_arn, threading.Lock())
+
+        with role_lock:
+            if role_arn not in self.sessions:
+                credentials = RefreshableCredentials.create_from_metadata(
+                    metadata=self._get_credentials(role_arn),
+                    refresh_using=lambda: self._get_credentials(role_arn, refresh=True),
+                    method='sts-assume-role'
+                )
+                botocore_session = create_botocore_session()
+                botocore_session._credentials = credentials
+                self.sessions[role_arn] = boto3.Session(botocore_session=botocore_session)
+
+            return self.sessions[role_arn]
+
+    def get_partition(self):
+        """
+        Returns the partition of the caller, resolved once per run
+        """
+
+        with self.lock:
+            if self.partition is None:
+                self.partition = self._get_sts_client().get_caller_identity()['Arn'].split(":")[1]
+            return self.partition
+
+    def _get_sts_client(self):
+        if self.sts_client is None:
+            self.sts_client = self.client_pool.client(boto3.Session(botocore_session=create_botocore_session()), 'sts')
+        return self.sts_client
+
+    def _get_credentials(self, role_arn, refresh=False):
+        if not refresh:
+            credentials = self._read_file_credentials(role_arn)
+            if credentials is not None:
+                return credentials
+
+        with self.lock:
+            sts_client = self._get_sts_client()
+
+        response = sts_client.assume_role(
+            RoleArn=role_arn,
+            RoleSessionName=self.role_session_name
+        )
+
+        credentials = {
+            'access_key': response['Credentials']['AccessKeyId'],
+            'secret_key': response['Credentials']['SecretAccessKey'],
+            'token': response['Credentials']['SessionToken'],
+            'expiry_time': response['Credentials']['Expiration'].isoformat()
+        }
+        self._write_file_credentials(role_arn, credentials)
+
+        return credentials
+
+    def _read_file_credentials(self, role_arn):
+        if not self.cache_file:
+            return None
+
+        with self.lock:
+            if self.file_credentials is None:
+                try:
+                    with open(self.cache_file) as cache:
+                        self.file_credentials = json.load(cache)
+                except (IOError, ValueError):
+                    self.file_credentials = dict()
+
+            credentials = self.file_credentials.get(role_arn)
+
+        # Only reuse credentials botocore would not refresh right away
+        if credentials is None or _seconds_until(credentials['expiry_time']) < CREDENTIALS_REFRESH_MARGIN:
+            return None
+
+        return credentials
+
+    def _write_file_credentials(self, role_arn, credentials):
+        if not self.cache_file:
+            return
+
+        with self.lock:
+            if self.file_credentials is None:
+                self.file_credentials = dict()
+            self.file_credentials[role_arn] = credentials
+
+            # Write to a private temporary file first so a crash never leaves a truncated cache
+            temp_file = '{}.tmp'.format(self.cache_file)
+            with os.fdopen(os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as cache:
+                json.dump(self.file_credentials, cache)
+            os.replace(temp_file, self.cache_file)
+
+
+def _seconds_until(timestamp):
+    return (parse_timestamp(timestamp) - datetime.datetime.now(tzutc())).total_seconds()
+
+
+def create_botocore_session():
+    """
+    Returns a new botocore session sharing the service model loader of every other session
+    created by this function, so service models are only loaded and parsed once per run
+    """
+
+    botocore_session = botocore.session.get_session()
+    botocore_session.register_component('data_loader', _shared_data_loader)
+    return botocore_session
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket allowing a number of requests per second. The rate is halved after
+    each throttled request and recovers additively with every successful one
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: requests per second allowed when no throttling is seen
+        :param burst: requests that can be sent at once, defaults to one second of requests
+        """
+
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.tokens = self.burst
+        self.timestamp = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a request can be sent
+        """
+
+        delay = self.try_acquire()
+        while delay:
+            time.sleep(delay)
+            delay = self.try_acquire()
+
+    def try_acquire(self):
+        """
+        Takes a token if one is available, without waiting
+        :return: 0 if a request can be sent now, otherwise the seconds to wait before trying again
+        """
+
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.timestamp) * self.rate)
+            self.timestamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def throttled(self):
+        """
+        Slows the bucket down after a throttled request
+        """
+
+        with self.lock:
+            self.rate = max(MIN_RATE_LIMIT, self.rate * RATE_LIMIT_BACKOFF)
+            self.tokens = min(self.tokens, 0)
+
+    def succeeded(self):
+        """
+        Gradually gives back the rate taken away by throttled requests
+        """
+
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_LIMIT_RECOVERY)
+
+
+class RateLimiter(object):
+    """
+    Per (operation, region) token buckets in front of every request sent by the clients registered
+    with it, shared by all the threads and sessions of a run
+    """
+
+    def __init__(self, default_rate=DEFAULT_RATE_LIMIT, operation_rates=None):
+        """
+        :param default_rate: requests per second allowed per operation and region
+        :param operation_rates: dict of operation name to requests per second, lowering default_rate for operations
+                                with a smaller quota, e.g. the OPERATION_RATE_LIMITS of the utils of a script
+        """
+
+        self.default_rate = default_rate
+        self.operation_rates = dict(operation_rates or {})
+        self.lock = threading.Lock()
+        self.buckets = dict()
+
+    def get_bucket(self, operation_name, region_name):
+        """
+        Returns the token bucket of an operation in a region, creating it on first use
+        """
+
+        key = (operation_name, region_name)
+        with self.lock:
+            if key not in self.buckets:
+                rate = min(self.default_rate, self.operation_rates.get(operation_name, self.default_rate))
+                self.buckets[key] = TokenBucket(rate)
+            return self.buckets[key]
+
+    def register(self, client):
+        """
+        Registers the rate limiting handlers on the event system of a client
+        :param client: boto3 client
+        """
+
+        region_name = client.meta.region_name
+
+        def before_send(event_name, **kwargs):
+            # Called for every attempt, including retries, so retries also spend tokens
+            self.get_bucket(event_name.rsplit('.', 1)[-1], region_name).acquire()
+
+        def needs_retry(response, operation, **kwargs):
+            self.record_response(operation.name, region_name, response)
+
+        client.meta.events.register('before-send', before_send)
+        client.meta.events.register('needs-retry', needs_retry)
+
+    def record_response(self, operation_name, region_name, response):
+        """
+        Adapts the bucket of an operation to the outcome of a request attempt
+        :param operation_name: API operation of the request
+        :param region_name: AWS Region of the request
+        :param response: (http_response, parsed) tuple of the attempt, None if it got no response
+        """
+
+        if response is None:
+            return
+        http_response, parsed = response
+        bucket = self.get_bucket(operation_name, region_name)
+        if http_response.status_code == 429 or parsed.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+            bucket.throttled()
+        elif http_response.status_code < 300:
+            bucket.succeeded()
+
+
+class CallMetrics(object):
+    """
+    Counts calls, retries, throttled attempts and errors and keeps a latency histogram per
+    (service, operation, region) for every client registered with it. Each call only updates a
+    few counters, so the metrics can stay on in production runs
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = dict()
+        self.started = time.time()
+
+    def _get_operation(self, key):
+        operation = self.operations.get(key)
+        if operation is None:
+            operation = self.operations[key] = {
+                'calls': 0,
+                'errors': 0,
+                'retries': 0,
+                'throttled': 0,
+                'latency_total': 0.0,
+                'latency_max': 0.0,
+                'histogram': [0] * (len(LATENCY_BUCKETS) + 1)
+            }
+        return operation
+
+    def record_call(self, key, latency, retries, failed):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, latency)
+        with self.lock:
+            operation = self._get_operation(key)
+            operation['calls'] += 1
+            operation['retries'] += retries
+            operation['latency_total'] += latency
+            operation['latency_max'] = max(operation['latency_max'], latency)
+            operation['histogram'][bucket] += 1
+            if failed:
+                operation['errors'] += 1
+
+    def record_throttle(self, key):
+        with self.lock:
+            self._get_operation(key)['throttled'] += 1
+
+    def register(self, client):
+        """
+        Registers the metrics handlers on the event system of a client
+        :param client: boto3 client
+        """
+
+        service_name = client.meta.service_model.service_name
+        region_name = client.meta.region_name
+
+        def before_call(context, **kwargs):
+            context['metrics_start'] = time.time()
+
+        def after_call(http_response, parsed, model, context, **kwargs):
+            latency = time.time() - context.get('metrics_start', time.time())
+            retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+            self.record_call((service_name, model.name, region_name), latency, retries, http_response.status_code >= 300)
+
+        def after_call_error(context, event_name, **kwargs):
+            latency = time.time() - context.get('metrics_start', time.time())
+            self.record_call((service_name, event_name.rsplit('.', 1)[-1], region_name), latency, 0, True)
+
+        def needs_retry(response, operation, **kwargs):
+            if response is None:
+                return
+            http_response, parsed = response
+            if http_response.status_code == 429 or parsed.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+                self.record_throttle((service_name, operation.name, region_name))
+
+        client.meta.events.register('before-call', before_call)
+        client.meta.events.register('after-call', after_call)
+        client.meta.events.register('after-call-error', after_call_error)
+        client.meta.events.register('needs-retry', needs_retry)
+
+    def summary(self):
+        """
+        :return: dict with the totals of the run and the metrics of every (service, operation, region)
+        """
+
+        with self.lock:
+            operations = []
+            for (service_name, operation_name, region_name), operation in sorted(self.operations.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] or '')):
+                operations.append({
+                    'service': service_name,
+                    'operation': operation_name,
+                    'region': region_name,
+                    'calls': operation['calls'],
+                    'errors': operation['errors'],
+                    'retries': operation['retries'],
+                    'throttled': operation['throttled'],
+                    'latency_avg': round(operation['latency_total'] / operation['calls'], 4) if operation['calls'] else None,
+                    'latency_p50': _histogram_percentile(operation, 0.5),
+                    'latency_p90': _histogram_percentile(operation, 0.9),
+                    'latency_p99': _histogram_percentile(operation, 0.99),
+                    'latency_max': round(operation['latency_max'], 4),
+                    'histogram': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['inf'], operation['histogram']))
+                })
+
+        return {
+            'elapsed': round(time.time() - self.started, 2),
+            'calls': sum(operation['calls'] for operation in operations),
+            'errors': sum(operation['errors'] for operation in operations),
+            'retries': sum(operation['retries'] for operation in operations),
+            'throttled': sum(operation['throttled'] for operation in operations),
+            'operations': operations
+        }
+
+    def write(self, metrics_file):
+        """
+        Writes the JSON summary of the metrics
+        :param metrics_file: path of the JSON file to write
+        """
+
+        with open(metrics_file, 'w') as output:
+            json.dump(self.summary(), output, indent=2)
+
+
+def _histogram_percentile(operation, percentile):
+    # Upper bound of the histogram bucket holding the percentile, capped by the slowest call
+    rank = percentile * sum(operation['histogram'])
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS, operation['histogram']):
+        seen += count
+        if count and seen >= rank:
+            return min(bound, round(operation['latency_max'], 4))
+    return round(operation['latency_max'], 4)
+
+
+class ClientPool(object):
+    """
+    Caches boto3 clients by session, service and region so each credential set reuses one
+    client and connection pool per service and region
+    """
+
+    def __init__(self, config=None, rate_limiter=None, metrics=None):
+        """
+        :param config: botocore Config applied to every client created by the pool
+        :param rate_limiter: optional RateLimiter of the SecurityHub, Config and STS clients
+        :param metrics: optional CallMetrics recording the calls of every client
+        """
+
+        self.config = config or create_client_config()
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.clients = dict()
+
+    def client(self, session, service_name, region_name=None):
+        """
+        Returns the pooled client of a session for a service and region, creating it on first use
+        :param session: boto3 Session to create the client from
+        :param service_name: AWS service name, e.g. securityhub
+        :param region_name: AWS Region for the client, not required for global services
+        :return: boto3 client
+        """
+
+        key = (session, service_name, region_name)
+        # boto3 sessions are not thread safe, so clients are created one at a time
+        with self.lock:
+            if key not in self.clients:
+                client = session.client(service_name, region_name=region_name, config=self.config)
+                if self.rate_limiter is not None and service_name in RATE_LIMITED_SERVICES:
+                    self.rate_limiter.register(client)
+                if self.metrics is not None:
+                    self.metrics.register(client)
+                self.clients[key] = client
+            return self.clients[key]
+
+
+class EventLog(object):
+    """
+    Structured progress events of a run, one JSON object per (account, region, step) outcome.
+    Workers only put events on a queue, a background thread writes them as JSON lines to the events
+    file and as readable lines to stdout, so concurrent workers never interleave or block on output
+    """
+
+    def __init__(self, stream=None):
+        """
+        :param stream: stream of the readable lines, sys.stdout if not set
+        """
+
+        self.stream = stream or sys.stdout
+        self.output = None
+        self.json_stdout = False
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def open(self, path):
+        """
+        Sends the events to a JSON lines file from now on
+        :param path: path of the file the events are appended to, '-' writes them to stdout in place of the readable lines
+        """
+
+        if path == '-':
+            self.json_stdout = True
+        elif path:
+            self.output = open(path, 'a')
+
+    def emit(self, step, status, account=None, region=None, message=None, duration=None, error=None, **details):
+        """
+        Queues an event without waiting for it to be written
+        :param step: name of the step, e.g. enable_security_hub
+        :param status: outcome of the step, e.g. started, succeeded, skipped or failed
+        :param account: AWS Account Number of the step
+        :param region: AWS Region of the step
+        :param message: readable line printed for the event
+        :param duration: seconds the step took
+        :param error: exception that failed the step, recorded as its error code
+        :param details: additional JSON serializable fields of the event
+        """
+
+        event = {
+            'time': datetime.datetime.now(tzutc()).isoformat(),
+            'account': account,
+            'region': region,
+            'step': step,
+            'status': status
+        }
+        if duration is not None:
+            event['duration'] = round(duration, 3)
+        if error is not None:
+            event['error_code'] = get_error_code(error)
+            event['error'] = str(error)
+        event.update(details)
+
+        self._start()
+        self.queue.put((event, message))
+
+    def _start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._write)
+                self.thread.daemon = True
+                self.thread.start()
+                atexit.register(self.close)
+
+    def _write(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._write_event(*item)
+                # Flush once the queue is drained rather than after every event
+                if self.queue.empty():
+                    self._flush_outputs()
+            finally:
+                self.queue.task_done()
+
+    def _write_event(self, event, message):
+        line = json.dumps(event, default=str) + '\n'
+        if self.output is not None:
+            self.output.write(line)
+        if self.json_stdout:
+            self.stream.write(line)
+        elif message is not None:
+            self.stream.write(message + '\n')
+
+    def _flush_outputs(self):
+        if self.output is not None:
+            self.output.flush()
+        self.stream.flush()
+
+    def flush(self):
+        """
+        Waits until every queued event is written, before printing anything else to stdout
+        """
+
+        with self.lock:
+            started = self.thread is not None
+        if started:
+            self.queue.join()
+
+    def close(self):
+        """
+        Writes the remaining events and closes the events file
+        """
+
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+
+
+def get_error_code(error):
+    """
+    :param error: exception raised by a step
+    :return: AWS error code of a ClientError, otherwise the exception class name
+    """
+
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict) and 'Error' in response:
+        return response['Error'].get('Code')
+    return type(error).__name__
+
+
+def get_eligible_regions(session, service_name='securityhub', cache_file=None, ttl=DEFAULT_REGIONS_CACHE_TTL, client_pool=None, enabled_only=True, events=None):
+    """
+    Returns the regions of a service that are enabled for the account of a session, listed with a
+    single paginated account.list_regions call instead of one get_region_opt_status call per region.
+    Falls back to every available region of the service if the regions cannot be listed. Only the opt-in
+    status of the account of the session is checked, not the one of the accounts the regions are used for
+    :param session: boto3 Session of the account
+    :param service_name: service whose available regions are filtered, e.g. securityhub
+    :param cache_file: optional path of a JSON file caching the enabled regions between runs
+    :param ttl: seconds before cached regions are listed again
+    :param client_pool: optional ClientPool creating the Account client
+    :param enabled_only: False to return every available region of the service without listing the enabled ones
+    :param events: optional EventLog of the script reporting a failure to list the regions
+    :return: list of region names, in the order of session.get_available_regions
+    """
+
+    available_regions = session.get_available_regions(service_name)
+    if not enabled_only:
+        return available_regions
+
+    # Cached regions are keyed by access key, so other principals and accounts never share them
+    cache_key = session.get_credentials().access_key
+    cache = dict()
+    if cache_file:
+        try:
+            with open(cache_file) as cache_input:
+                cache = json.load(cache_input)
+        except (IOError, ValueError):
+            cache = dict()
+
+    cached = cache.get(cache_key)
+    if cached is not None and time.time() - cached['listed_at'] < ttl:
+        enabled_regions = set(cached['regions'])
+    else:
+        account_client = (client_pool or ClientPool()).client(session, 'account')
+        try:
+            enabled_regions = set()
+            for page in account_client.get_paginator('list_regions').paginate(RegionOptStatusContains=list(ENABLED_REGION_STATUSES)):
+                enabled_regions.update(region['RegionName'] for region in page['Regions'])
+        except ClientError as e:
+            (events or EventLog()).emit('list_regions', 'failed', error=e,
+                                        message="Unable to list the enabled regions, using every available {} region: {}".format(service_name, repr(e)))
+            return available_regions
+
+        if cache_file:
+            cache[cache_key] = {'regions': sorted(enabled_regions), 'listed_at': time.time()}
+            temp_file = '{}.tmp'.format(cache_file)
+            with open(temp_file, 'w') as cache_output:
+                json.dump(cache, cache_output)
+            os.replace(temp_file, cache_file)
+
+    return [region for region in available_regions if region in enabled_regions]
+
+
+def add_client_arguments(parser):
+    """
+    Adds the options of the shared client configuration to the argument parser of a script
+    :param parser: argparse.ArgumentParser of the script
+    """
+
+    parser.add_argument('--client_config', type=str, required=False, help="Optional path of a JSON file setting any of retry_mode, max_attempts, connect_timeout, read_timeout, max_pool_connections and rate_limit")
+    parser.add_argument('--retry_mode', type=str, choices=['legacy', 'standard', 'adaptive'], help="botocore retry mode (default: adaptive)")
+    parser.add_argument('--max_attempts', type=int, help="Maximum attempts per request, including the first one (default: 5)")
+    parser.add_argument('--connect_timeout', type=float, help="Seconds to wait for a connection to an endpoint (default: 10). Each attempt waits this long, so with the default max_attempts a call to an unreachable endpoint fails after about 50 seconds")
+    parser.add_argument('--read_timeout', type=float, help="Seconds to wait for a response from an endpoint (default: 30)")
+    parser.add_argument('--max_pool_connections', type=int, help="Connections kept per client, defaults to the number of workers of the script")
+    parser.add_argument('--rate_limit', type=float, help="Requests per second allowed per API operation and region, lowered automatically after throttling (default: 10)")
+    parser.add_argument('--metrics_file', type=str, required=False, help="Optional path of a JSON file receiving per operation call, retry, throttle and latency metrics at exit")
+
+
+def add_event_arguments(parser):
+    """
+    Adds the options of the structured event stream to the argument parser of a script
+    :param parser: argparse.ArgumentParser of the script
+    """
+
+    parser.add_argument('--events_file', type=str, required=False, help="Optional path of a JSON lines file receiving one event per account, region and step, '-' prints the events to stdout instead of the progress messages")
+
+
+def add_region_arguments(parser):
+    """
+    Adds the options of the eligible region discovery to the argument parser of a script
+    :param parser: argparse.ArgumentParser of the script
+    """
+
+    parser.add_argument('--regions_cache', type=str, required=False, help="Optional path of a file caching the enabled regions of the account between runs")
+    parser.add_argument('--regions_cache_ttl', type=int, default=DEFAULT_REGIONS_CACHE_TTL, help="Seconds before the cached enabled regions are listed again (default: 86400)")
+    parser.add_argument('--all_available_regions', action='store_true', help="Use every region where Security Hub is available instead of only the regions the account running the script opted in to")
+
+
+def get_client_settings(args=None, **defaults):
+    """
+    Resolves the client settings from the defaults, the --client_config file and the command line,
+    in increasing order of precedence
+    :param args: parsed arguments of a parser set up with add_client_arguments
+    :param defaults: script specific defaults, e.g. max_pool_connections matching its workers
+    :return: dict of client settings
+    """
+
+    settings = dict(CLIENT_SETTINGS)
+    settings.update(defaults)
+
+    if args is not None and args.client_config:
+        with open(args.client_config) as config_file:
+            file_settings = json.load(config_file)
+        unknown = set(file_settings) - set(CLIENT_SETTINGS)
+        if unknown:
+            raise ValueError("Unknown client settings in {}: {}".format(args.client_config, ', '.join(sorted(unknown))))
+        settings.update(file_settings)
+
+    for name in CLIENT_SETTINGS:
+        value = getattr(args, name, None)
+        if value is not None:
+            settings[name] = value
+
+    if settings['retry_mode'] not in ('legacy', 'standard', 'adaptive'):
+        raise ValueError("retry_mode must be one of legacy, standard or adaptive")
+    for name in ('max_attempts', 'connect_timeout', 'read_timeout', 'max_pool_connections', 'rate_limit'):
+        if settings[name] <= 0:
+            raise ValueError("{} must be positive".format(name))
+
+    return settings
+
+
+def create_client_config(settings=None):
+    """
+    Builds the botocore Config of the pooled clients
+    :param settings: dict of client settings as returned by get_client_settings
+    :return: botocore Config
+    """
+
+    settings = settings or CLIENT_SETTINGS
+
+    return Config(
+        retries={'mode': settings['retry_mode'], 'total_max_attempts': settings['max_attempts']},
+        connect_timeout=settings['connect_timeout'],
+        read_timeout=settings['read_timeout'],
+        max_pool_connections=settings['max_pool_connections']
+    )
+
+
+def configure_clients(client_pool, args=None, **defaults):
+    """
+    Applies the resolved client settings to a ClientPool and its RateLimiter, before any client is created
+    :param client_pool: ClientPool of the script
+    :param args: parsed arguments of a parser set up with add_client_arguments
+    :param defaults: script specific defaults, e.g. max_pool_connections matching its workers
+    :return: dict of client settings
+    """
+
+    settings = get_client_settings(args, **defaults)
+    client_pool.config = create_client_config(settings)
+    if client_pool.rate_limiter is not None:
+        client_pool.rate_limiter.default_rate = settings['rate_limit']
+    if args is not None and getattr(args, 'metrics_file', None):
+        client_pool.metrics = CallMetrics()
+        atexit.register(client_pool.metrics.write, args.metrics_file)
+
+    return settings
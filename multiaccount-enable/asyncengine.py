@@ -0,0 +1,1092 @@
+"""
+asyncio engine of enablesecurityhub.py and disablesecurityhub.py, selected with --engine asyncio.
+
+Every account and region is processed by a coroutine using aiobotocore clients instead of a
+worker thread, so an account waiting for its standards or its membership only costs a suspended
+coroutine. A semaphore bounds the number of account/region units making API calls at the same
+time, and units release it while they wait, so tens of thousands of pending waits do not hold up
+the units that have work to do.
+
+aiobotocore is only needed by this engine and is imported lazily:
+
+    pip install aiobotocore
+"""
+
+import asyncio
+import json
+import random
+import string
+import time
+import utils
+
+from botocore.credentials import CredentialProvider
+from botocore.exceptions import BotoCoreError, ClientError
+from collections import Counter, OrderedDict
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.credentials import AioCredentialResolver, AioRefreshableCredentials
+    from aiobotocore.session import get_session as get_aio_session
+except ImportError:
+    get_aio_session = None
+
+# Default number of account/region units making API calls at the same time
+DEFAULT_MAX_CONCURRENCY = 500
+
+# Seconds a member account waits for its invitation to be accepted or its membership to be removed
+MEMBERSHIP_TIMEOUT = 300
+
+# Service model loader shared with the sessions of the threaded engine
+_shared_data_loader = utils.create_botocore_session().get_component('data_loader')
+
+
+def check_available():
+    """
+    Raises an ImportError explaining how to install aiobotocore if it is missing
+    """
+
+    if get_aio_session is None:
+        raise ImportError("The asyncio engine requires aiobotocore, install it with: pip install aiobotocore")
+
+
+def create_aio_session():
+    """
+    Returns a new aiobotocore session sharing the service model loader of the run
+    """
+
+    aio_session = get_aio_session()
+    aio_session.register_component('data_loader', _shared_data_loader)
+    return aio_session
+
+
+def register_rate_limiter(rate_limiter, client):
+    """
+    Registers the handlers of a utils.RateLimiter on an aiobotocore client, waiting for tokens with
+    asyncio.sleep so a rate limited request never blocks the event loop
+    :param rate_limiter: utils.RateLimiter shared by the run
+    :param client: aiobotocore client
+    """
+
+    region_name = client.meta.region_name
+
+    async def before_send(event_name, **kwargs):
+        bucket = rate_limiter.get_bucket(event_name.rsplit('.', 1)[-1], region_name)
+        delay = bucket.try_acquire()
+        while delay:
+            await asyncio.sleep(delay)
+            delay = bucket.try_acquire()
+
+    def needs_retry(response, operation, **kwargs):
+        rate_limiter.record_response(operation.name, region_name, response)
+
+    client.meta.events.register('before-send', before_send)
+    client.meta.events.register('needs-retry', needs_retry)
+
+
+class AsyncClientPool(object):
+    """
+    Caches aiobotocore clients by session, service and region like utils.ClientPool. Clients hold
+    their own connection pool, so the clients of a session are closed once its work is done
+    """
+
+    def __init__(self, settings, rate_limiter=None, metrics=None):
+        """
+        :param settings: dict of client settings as returned by utils.get_client_settings
+        :param rate_limiter: optional utils.RateLimiter of the SecurityHub, Config and STS clients
+        :param metrics: optional utils.CallMetrics recording the calls of every client
+        """
+
+        self.config = AioConfig(
+            retries={'mode': settings['retry_mode'], 'total_max_attempts': settings['max_attempts']},
+            connect_timeout=settings['connect_timeout'],
+            read_timeout=settings['read_timeout'],
+            max_pool_connections=settings['max_pool_connections']
+        )
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.lock = asyncio.Lock()
+        self.clients = dict()
+
+    async def client(self, session, service_name, region_name=None):
+        """
+        Returns the pooled client of a session for a service and region, creating it on first use
+        :param session: aiobotocore session to create the client from
+        :param service_name: AWS service name, e.g. securityhub
+        :param region_name: AWS Region for the client, not required for global services
+        :return: aiobotocore client
+        """
+
+        key = (session, service_name, region_name)
+        async with self.lock:
+            if key not in self.clients:
+                client = await session.create_client(service_name, region_name=region_name, config=self.config).__aenter__()
+                if self.rate_limiter is not None and service_name in utils.RATE_LIMITED_SERVICES:
+                    register_rate_limiter(self.rate_limiter, client)
+                if self.metrics is not None:
+                    self.metrics.register(client)
+                self.clients[key] = client
+            return self.clients[key]
+
+    async def release(self, session):
+        """
+        Closes the clients of a session, they are created again if the session is used later
+        :param session: aiobotocore session whose clients are closed
+        """
+
+        async with self.lock:
+            clients = [self.clients.pop(key) for key in list(self.clients) if key[0] is session]
+        for client in clients:
+            await client.close()
+
+    async def close(self):
+        """
+        Closes every pooled client
+        """
+
+        async with self.lock:
+            clients = list(self.clients.values())
+            self.clients.clear()
+        for client in clients:
+            await client.close()
+
+
+class AssumedRoleCredentialProvider(CredentialProvider):
+    """
+    Only credential provider of the aiobotocore session of an assumed role, handing out its refreshable credentials
+    """
+
+    METHOD = 'sts-assume-role'
+
+    def __init__(self, credentials):
+        """
+        :param credentials: AioRefreshableCredentials of the assumed role
+        """
+
+        self.credentials = credentials
+
+    async def load(self):
+        return self.credentials
+
+
+class AsyncCredentialCache(utils.CredentialCache):
+    """
+    utils.CredentialCache handing out aiobotocore sessions. Roles are assumed with a pooled
+    aiobotocore STS client and refreshed by aiobotocore, the optional credentials file is shared
+    with the threaded engine
+    """
+
+    def __init__(self, role_session_name, client_pool, cache_file=None):
+        """
+        :param role_session_name: RoleSessionName used for assume_role calls
+        :param client_pool: AsyncClientPool creating the STS client
+        :param cache_file: optional path of a JSON file persisting credentials between runs
+        """
+
+        super(AsyncCredentialCache, self).__init__(role_session_name, cache_file, client_pool)
+        self.default_session = create_aio_session()
+        self.partition_lock = asyncio.Lock()
+
+    async def get_session(self, aws_account_number, role_name):
+        """
+        Returns an aiobotocore session for the role in the target account, assuming it only if needed
+        :param aws_account_number: AWS Account Number
+        :param role_name: Role to assume in target account
+        :return: aiobotocore session with automatically refreshed credentials
+        """
+
+        role_arn = 'arn:{}:iam::{}:role/{}'.format(
+            await self.get_partition(),
+            aws_account_number,
+            role_name
+        )
+
+        role_lock = self.role_locks.setdefault(role_arn, asyncio.Lock())
+        async with role_lock:
+            if role_arn not in self.sessions:
+                credentials = AioRefreshableCredentials.create_from_metadata(
+                    metadata=await self._get_credentials(role_arn),
+                    refresh_using=lambda: self._get_credentials(role_arn, refresh=True),
+                    method='sts-assume-role'
+                )
+                aio_session = create_aio_session()
+                aio_session.register_component('credential_provider', AioCredentialResolver([AssumedRoleCredentialProvider(credentials)]))
+                self.sessions[role_arn] = aio_session
+
+            return self.sessions[role_arn]
+
+    async def get_partition(self):
+        """
+        Returns the partition of the caller, resolved once per run
+        """
+
+        async with self.partition_lock:
+            if self.partition is None:
+                sts_client = await self.client_pool.client(self.default_session, 'sts')
+                self.partition = (await sts_client.get_caller_identity())['Arn'].split(":")[1]
+            return self.partition
+
+    async def _get_credentials(self, role_arn, refresh=False):
+        if not refresh:
+            credentials = self._read_file_credentials(role_arn)
+            if credentials is not None:
+                return credentials
+
+        sts_client = await self.client_pool.client(self.default_session, 'sts')
+        response = await sts_client.assume_role(
+            RoleArn=role_arn,
+            RoleSessionName=self.role_session_name
+        )
+
+        credentials = {
+            'access_key': response['Credentials']['AccessKeyId'],
+            'secret_key': response['Credentials']['SecretAccessKey'],
+            'token': response['Credentials']['SessionToken'],
+            'expiry_time': response['Credentials']['Expiration'].isoformat()
+        }
+        self._write_file_credentials(role_arn, credentials)
+
+        return credentials
+
+
+class AsyncMembershipCache(utils.MembershipCache):
+    """
+    utils.MembershipCache filled by an aiobotocore client. The member list is only listed by
+    explicit load calls, lookups never make an API call
+    """
+
+    def get_members(self):
+        with self.lock:
+            return dict(self.members)
+
+    async def load(self):
+        """
+        Paginates the full member list of the administrator account
+        """
+
+        member_dict = dict()
+        paginator = self.sh_client.get_paginator('list_members')
+        async for page in paginator.paginate(OnlyAssociated=False):
+            for member in page['Members']:
+                member_dict[member['AccountId']] = member['MemberStatus']
+
+        with self.lock:
+            self.members = member_dict
+            self.loaded_at = time.time()
+
+    async def refresh(self, account_ids):
+        """
+        Refreshes specific accounts with get_members instead of listing every member
+        :param account_ids: list of AWS Account Numbers to refresh
+        :return: dict of AwsAccountId:RelationshipStatus for the refreshed accounts that are members
+        """
+
+        refreshed = dict()
+        not_members = []
+        for batch in utils.chunks(list(account_ids), utils.MEMBERS_BATCH_SIZE):
+            results = await self.sh_client.get_members(AccountIds=batch)
+            for member in results['Members']:
+                refreshed[member['AccountId']] = member['MemberStatus']
+            not_members.extend(unprocessed['AccountId'] for unprocessed in results.get('UnprocessedAccounts', []))
+
+        with self.lock:
+            self.members.update(refreshed)
+            for account in not_members:
+                self.members.pop(account, None)
+
+        return refreshed
+
+
+class AsyncMembershipReconciler(object):
+    """
+    Polls the membership of the SecurityHub master account in one region on behalf of every
+    account waiting on a membership change, like MembershipReconciler of enablesecurityhub.py.
+    A single polling task per region refreshes all waiting accounts at once
+    """
+
+    def __init__(self, engine, member_cache, aws_region, interval=utils.MEMBERS_POLL_INTERVAL):
+        """
+        :param engine: AsyncEngine of the run
+        :param member_cache: AsyncMembershipCache of the master account in the AWS Region
+        :param aws_region: AWS Region of the SecurityHub master account
+        :param interval: seconds between two polls of the waiting accounts
+        """
+
+        self.engine = engine
+        self.member_cache = member_cache
+        self.aws_region = aws_region
+        self.interval = interval
+        self.condition = asyncio.Condition()
+        self.generation = 0
+        self.waiting = Counter()
+        self.poller = None
+
+    def get_status(self, account):
+        """
+        Returns the last known relationship status of an account
+        :return: RelationshipStatus, or None if the account is not a member
+        """
+
+        return self.member_cache.get_status(account)
+
+    async def wait_for_refresh(self, account, timeout):
+        """
+        Waits until the next poll refreshing the account completes
+        :param account: AWS Account Number waiting on a membership change
+        :param timeout: maximum number of seconds to wait
+        :return: True if the account was refreshed before the timeout
+        """
+
+        async with self.condition:
+            generation = self.generation
+            self.waiting[account] += 1
+            if self.poller is None:
+                self.poller = asyncio.ensure_future(self._poll())
+            try:
+                await asyncio.wait_for(self.condition.wait_for(lambda: self.generation != generation), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting[account] -= 1
+                if not self.waiting[account]:
+                    del self.waiting[account]
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            async with self.condition:
+                if not self.waiting:
+                    self.poller = None
+                    return
+                accounts = list(self.waiting)
+
+            try:
+                async with self.engine.limit:
+                    await self.member_cache.refresh(accounts)
+            except (ClientError, BotoCoreError) as e:
+                self.engine.events.emit('refresh_members', 'failed', region=self.aws_region, error=e,
+                                        message="Error refreshing members in region {}: {}".format(self.aws_region, repr(e)))
+
+            async with self.condition:
+                self.generation += 1
+                self.condition.notify_all()
+
+
+class AsyncConfigBootstrap(object):
+    """
+    Account wide prerequisites of AWS Config, like ConfigBootstrap of enablesecurityhub.py: the
+    IAM service-linked role and the S3 bucket of the delivery channel, checked once per account
+    """
+
+    def __init__(self, engine, session, account, s3_bucket_name):
+        """
+        :param engine: AsyncEngine of the run
+        :param session: aiobotocore session of the account
+        :param account: AWS Account Number
+        :param s3_bucket_name: fallback bucket name for the Config delivery channel
+        """
+
+        self.engine = engine
+        self.session = session
+        self.account = account
+        self.s3_bucket_name = s3_bucket_name
+        self.service_linked_role = False
+        self.default_bucket_avail = False
+        self.default_bucket_exists = False
+        self.bucket_ready = None
+        self.lock = asyncio.Lock()
+
+    async def prepare(self):
+        """
+        Creates the AWS Config service-linked role and checks if the default delivery bucket
+        exists or is available
+        """
+
+        iam = await self.engine.pool.client(self.session, 'iam')
+        s3 = await self.engine.pool.client(self.session, 's3', 'us-east-1')
+
+        try:
+            await iam.create_service_linked_role(AWSServiceName='config.amazonaws.com', Description='A service-linked role required for AWS Config')
+            self.service_linked_role = True
+        except ClientError as e:
+            if e.response['ResponseMetadata']['HTTPStatusCode'] == 400:
+                self.service_linked_role = True # SLR already exists
+            else:
+                self.engine.events.emit('create_service_linked_role', 'failed', account=self.account, error=e, message=str(e))
+        # Check if default bucket name is available.
+        try:
+            await s3.list_objects(Bucket='config-bucket-{}'.format(self.account), MaxKeys=1)
+            self.default_bucket_exists = True
+            self.s3_bucket_name = 'config-bucket-{}'.format(self.account)
+        except ClientError as e:
+            if e.response['ResponseMetadata']['HTTPStatusCode'] == 404:
+                self.default_bucket_avail = True
+                self.s3_bucket_name = 'config-bucket-{}'.format(self.account)
+
+    async def ensure_bucket(self):
+        """
+        Creates the default delivery bucket and its policy if it is available, at most once per account
+        :return: True if the delivery bucket can be used
+        """
+
+        async with self.lock:
+            if self.bucket_ready is None:
+                self.bucket_ready = await self._create_bucket()
+            return self.bucket_ready
+
+    async def _create_bucket(self):
+        if not self.default_bucket_avail or self.default_bucket_exists:
+            return True
+        s3 = await self.engine.pool.client(self.session, 's3', 'us-east-1')
+        try:
+            await s3.create_bucket(Bucket=self.s3_bucket_name)
+            await s3.put_bucket_policy(Bucket=self.s3_bucket_name, Policy=json.dumps(utils.get_config_bucket_policy(self.s3_bucket_name, self.account)))
+            self.default_bucket_exists = True
+        except ClientError as e:
+            self.engine.events.emit('create_config_bucket', 'failed', account=self.account, error=e,
+                                    message="Error {} checking bucket for Config delivery in account {}".format(repr(e), self.account))
+            return False
+        return True
+
+
+async def get_config_snapshot(config):
+    """
+    Fetches the configuration recorders, their status and the delivery channels concurrently
+    :param config: aiobotocore AWS Config client of the account and region
+    :return: utils.ConfigSnapshot
+    """
+
+    recorders, recorder_status, delivery_channels = await asyncio.gather(
+        config.describe_configuration_recorders(),
+        config.describe_configuration_recorder_status(),
+        config.describe_delivery_channels()
+    )
+
+    return utils.ConfigSnapshot(
+        recorders=recorders['ConfigurationRecorders'],
+        recorder_status=recorder_status['ConfigurationRecordersStatus'],
+        delivery_channels=delivery_channels['DeliveryChannels']
+    )
+
+
+class AsyncEngine(object):
+    """
+    Runs the enable and disable flows of the multiaccount scripts as coroutines. The pool, the
+    credentials and the semaphore are bound to the event loop, so they are created by run
+    """
+
+    def __init__(self, role_session_name, events, client_settings, rate_limiter=None, metrics=None,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, credentials_cache=None, journal=None):
+        """
+        :param role_session_name: RoleSessionName used for assume_role calls
+        :param events: utils.EventLog of the script
+        :param client_settings: dict of client settings as returned by utils.get_client_settings
+        :param rate_limiter: optional utils.RateLimiter shared by every client
+        :param metrics: optional utils.CallMetrics recording the calls of every client
+        :param max_concurrency: number of account/region units making API calls at the same time
+        :param credentials_cache: optional path of a file caching assumed role credentials between runs
+        :param journal: optional utils.Journal of the completed steps
+        """
+
+        check_available()
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        self.role_session_name = role_session_name
+        self.events = events
+        self.client_settings = client_settings
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.max_concurrency = max_concurrency
+        self.credentials_cache = credentials_cache
+        self.journal = journal or utils.Journal()
+        self.pool = None
+        self.credential_cache = None
+        self.limit = None
+
+    def run(self, coroutine):
+        """
+        Runs a coroutine of the engine in a new event loop and closes every client afterwards
+        :param coroutine: e.g. engine.enable(...)
+        :return: result of the coroutine
+        """
+
+        return asyncio.run(self._run(coroutine))
+
+    async def _run(self, coroutine):
+        self.pool = AsyncClientPool(self.client_settings, self.rate_limiter, self.metrics)
+        self.credential_cache = AsyncCredentialCache(self.role_session_name, self.pool, self.credentials_cache)
+        self.limit = asyncio.Semaphore(self.max_concurrency)
+        try:
+            return await coroutine
+        finally:
+            await self.pool.close()
+
+    async def assume_role(self, aws_account_number, role_name):
+        """
+        Returns the aiobotocore session of the role in an account
+        :param aws_account_number: AWS Account Number
+        :param role_name: Role to assume in target account
+        :return: aiobotocore session
+        """
+
+        start_time = time.time()
+        session = await self.credential_cache.get_session(aws_account_number, role_name)
+
+        self.events.emit('assume_role', 'succeeded', account=aws_account_number, duration=time.time() - start_time,
+                         message="Assumed session for {}.".format(aws_account_number))
+
+        return session
+
+    async def wait_for_standards_ready(self, sh_client, subscription_arns, timeout=utils.STANDARDS_WAIT_TIMEOUT, initial_delay=1, max_delay=20):
+        """
+        Polls the enabled standards until every subscription is READY, with the decisions of
+        utils.StandardsPoll like utils.wait_for_standards_ready. The semaphore is only held while polling
+        :return: utils.StandardsWait
+        """
+
+        poll = utils.StandardsPoll(subscription_arns, timeout, initial_delay, max_delay)
+        while True:
+            async with self.limit:
+                responses = [await sh_client.get_enabled_standards(StandardsSubscriptionArns=batch) for batch in poll.batches()]
+            standards_wait = poll.record(responses)
+            if standards_wait is not None:
+                return standards_wait
+            await asyncio.sleep(poll.next_delay())
+
+    async def enable_standards(self, sh_client, account, aws_region, standards_arns):
+        """
+        Enables standards in an account and region and waits for them to become READY
+        :return: utils.StandardsWait outcome of the wait
+        """
+
+        regional_standards_arns = utils.get_regional_standards_arns(aws_region, standards_arns)
+        async with self.limit:
+            response = await sh_client.batch_enable_standards(StandardsSubscriptionRequests=[{'StandardsArn': standard_arn} for standard_arn in regional_standards_arns])
+
+        subscription_arns = [subscription['StandardsSubscriptionArn'] for subscription in response['StandardsSubscriptions']]
+        standards_wait = await self.wait_for_standards_ready(sh_client, subscription_arns)
+        utils.report_standards_wait(self.events, account, aws_region, regional_standards_arns, standards_wait)
+
+        return standards_wait
+
+    async def check_config(self, session, account, region, bootstrap):
+        """
+        Gets AWS Config recording in an account and region
+        :return: True if Config is recording
+        """
+
+        config = await self.pool.client(session, 'config', region)
+
+        if not bootstrap.service_linked_role:
+            return False
+
+        snapshot = await get_config_snapshot(config)
+        for action in utils.plan_config_actions(account, snapshot, bootstrap.s3_bucket_name):
+            if action.name == 'ensure_bucket':
+                if not await bootstrap.ensure_bucket():
+                    return False
+                continue
+            try:
+                await getattr(config, action.name)(**action.params)
+            except ClientError as e:
+                if action.name == 'put_configuration_recorder':
+                    raise
+                self.events.emit('enable_config', 'failed', account=account, region=region, error=e,
+                                 message="Error {} enabling Config on account {} in region {}".format(repr(e), account, region))
+                return False
+        return True
+
+    async def prepare_account(self, account, role_name, bootstrap_config=True):
+        """
+        Assumes the provided role in a member account and runs the account wide AWS Config prerequisites
+        :return: tuple of (aiobotocore session, AsyncConfigBootstrap of the account)
+        """
+
+        async with self.limit:
+            session = await self.assume_role(account, role_name)
+            # Generate unique bucket name for Config delivery channel if default is not avaialable.
+            s3_bucket_name = 'config-bucket-{}-{}'.format(''.join(random.SystemRandom().choice(string.ascii_lowercase + string.digits) for _ in range(5)), account)
+            bootstrap = AsyncConfigBootstrap(self, session, account, s3_bucket_name)
+            if bootstrap_config:
+                await bootstrap.prepare()
+
+        return session, bootstrap
+
+    async def enable_account_region(self, account, aws_region, session, bootstrap, standards_arns):
+        """
+        Enables AWS Config, SecurityHub and the requested standards in a single member account and region
+        :return: tuple of (list of {AwsAccountId: message} failures, True if the account can be linked in the region,
+                 True if every requested standard is READY)
+        """
+
+        failed_accounts = []
+        standards_ready = True
+        start_time = time.time()
+
+        try:
+            async with self.limit:
+                self.events.emit('enable', 'started', account=account, region=aws_region,
+                                 message='Beginning {account} in {region}'.format(account=account, region=aws_region))
+
+                sh_client = await self.pool.client(session, 'securityhub', aws_region)
+                #Ensure AWS Config is enabled for the account/region and enable if it not already enabled.
+                config_result = await self.check_config(session, account, aws_region, bootstrap)
+                if not config_result:
+                    failed_accounts.append({account: "Error validating or enabling AWS Config for account {} in {} - requested standards not enabled".format(account, aws_region)})
+                else:
+                    try:
+                        await sh_client.enable_security_hub()
+                    except ClientError as e:
+                        if e.response['Error']['Code'] != 'ResourceConflictException':
+                            raise
+
+            if config_result and standards_arns:
+                standards_wait = await self.enable_standards(sh_client, account, aws_region, standards_arns)
+                standards_ready = standards_wait.ready
+                if standards_wait.outcome == 'FAILED':
+                    failed_accounts.append({account: "Standards FAILED for account {} in {}: {}".format(account, aws_region, standards_wait.status)})
+
+        except (ClientError, BotoCoreError) as e:
+            self.events.emit('enable', 'failed', account=account, region=aws_region, duration=time.time() - start_time, error=e,
+                             message="Error Processing Account {} in region {}".format(account, aws_region))
+            failed_accounts.append({
+                account: repr(e)
+            })
+            return failed_accounts, False, False
+
+        self.events.emit('enable', 'failed' if failed_accounts else 'succeeded', account=account, region=aws_region, duration=time.time() - start_time)
+        return failed_accounts, True, standards_ready
+
+    async def add_region_members(self, reconciler, accounts, aws_account_dict, master_account):
+        """
+        Adds and invites the member accounts of a region in batches of utils.MEMBERS_BATCH_SIZE accounts
+        :return: OrderedDict of AwsAccountId:message for accounts that could not be added or invited
+        """
+
+        member_cache = reconciler.member_cache
+        master_client = member_cache.sh_client
+        aws_region = reconciler.aws_region
+        failures = OrderedDict()
+
+        accounts_to_create, members = utils.get_accounts_to_create(accounts, reconciler.get_status)
+        for account in members:
+            self.events.emit('add_member', 'skipped', account=account, region=aws_region,
+                             message='Account {monitored} is already a member of {master} in region {region}'.format(
+                                 monitored=account,
+                                 master=master_account,
+                                 region=aws_region
+                             ))
+
+        for batch in utils.chunks(accounts_to_create, utils.MEMBERS_BATCH_SIZE):
+            start_time = time.time()
+            try:
+                async with self.limit:
+                    response = await master_client.create_members(
+                        AccountDetails=[{
+                            "AccountId": account,
+                            "Email": aws_account_dict[account]
+                        } for account in batch]
+                    )
+            except (ClientError, BotoCoreError) as e:
+                self.events.emit('create_members', 'failed', account=master_account, region=aws_region, duration=time.time() - start_time, error=e, accounts=len(batch),
+                                 message="Error adding {} accounts to member list in region {}".format(len(batch), aws_region))
+                for account in batch:
+                    failures[account] = repr(e)
+                continue
+
+            failures.update(utils.get_unprocessed_accounts(response, 'add account {} as member', aws_region))
+            member_cache.set_status([account for account in batch if account not in failures], 'Created')
+
+            self.events.emit('create_members', 'succeeded', account=master_account, region=aws_region, duration=time.time() - start_time, accounts=len(batch),
+                             message='Added {count} accounts to member list in SecurityHub master account {master} for region {region}'.format(
+                                 count=len(batch),
+                                 master=master_account,
+                                 region=aws_region
+                             ))
+
+        # Members created in the SecurityHub master account but not invited yet
+        accounts_to_invite = utils.get_accounts_to_invite(accounts, reconciler.get_status, failures)
+        for batch in utils.chunks(accounts_to_invite, utils.MEMBERS_BATCH_SIZE):
+            start_time = time.time()
+            try:
+                async with self.limit:
+                    response = await master_client.invite_members(
+                        AccountIds=batch
+                    )
+            except (ClientError, BotoCoreError) as e:
+                self.events.emit('invite_members', 'failed', account=master_account, region=aws_region, duration=time.time() - start_time, error=e, accounts=len(batch),
+                                 message="Error inviting {} accounts in region {}".format(len(batch), aws_region))
+                for account in batch:
+                    failures[account] = repr(e)
+                continue
+
+            failures.update(utils.get_unprocessed_accounts(response, 'invite account {}', aws_region))
+            member_cache.set_status([account for account in batch if account not in failures], 'Invited')
+
+            self.events.emit('invite_members', 'succeeded', account=master_account, region=aws_region, duration=time.time() - start_time, accounts=len(batch),
+                             message='Invited {count} accounts to SecurityHub master account {master} in region {region}'.format(
+                                 count=len(batch),
+                                 master=master_account,
+                                 region=aws_region
+                             ))
+
+        return failures
+
+    async def link_account_region(self, account, session, master_account, reconciler):
+        """
+        Accepts the master account invitation in a single member account and region
+        :return: list of {AwsAccountId: message} failures for the account and region
+        """
+
+        aws_region = reconciler.aws_region
+        failed_accounts = []
+        start_time = time.time()
+
+        try:
+            member_status = reconciler.get_status(account)
+            if member_status is None:
+                self.events.emit('link', 'skipped', account=account, region=aws_region,
+                                 message="Account {} could not be joined, skipping".format(account))
+                return failed_accounts
+
+            if member_status in utils.LINKED_MEMBER_STATUSES:
+                # Member is enabled and already being monitored
+                self.events.emit('link', 'skipped', account=account, region=aws_region, member_status=member_status,
+                                 message='Account {account} is already enabled'.format(account=account))
+                return failed_accounts
+
+            accepted = False
+            while member_status not in utils.LINKED_MEMBER_STATUSES:
+                if (time.time() - start_time) > MEMBERSHIP_TIMEOUT:
+                    self.events.emit('link', 'timeout', account=account, region=aws_region, duration=time.time() - start_time, member_status=member_status,
+                                     message="Invitation did not show up for account {}, skipping".format(account))
+                    failed_accounts.append({
+                        account: "Membership did not show up for account {} in {}".format(
+                            account,
+                            aws_region
+                        )
+                    })
+                    return failed_accounts
+
+                if member_status == 'Invited' and not accepted:
+                    # member has been invited so accept the invite
+                    async with self.limit:
+                        sh_client = await self.pool.client(session, 'securityhub', aws_region)
+                        invitation_id = utils.get_invitation_id(await sh_client.list_invitations())
+                        if invitation_id is not None:
+                            await sh_client.accept_invitation(
+                                InvitationId=invitation_id,
+                                MasterId=str(master_account)
+                            )
+                            accepted = True
+                            self.events.emit('accept_invitation', 'succeeded', account=account, region=aws_region,
+                                             message='Accepting Account {monitored} to SecurityHub master account {master} in region {region}'.format(
+                                                 monitored=account,
+                                                 master=master_account,
+                                                 region=aws_region
+                                             ))
+
+                # Wait for the region's next refresh of the member dictionary
+                await reconciler.wait_for_refresh(account, MEMBERSHIP_TIMEOUT)
+                member_status = reconciler.get_status(account)
+
+            self.events.emit('link', 'succeeded', account=account, region=aws_region, duration=time.time() - start_time,
+                             message='Finished {account} in {region}'.format(account=account, region=aws_region))
+
+        except (ClientError, BotoCoreError) as e:
+            self.events.emit('link', 'failed', account=account, region=aws_region, duration=time.time() - start_time, error=e,
+                             message="Error Processing Account {} in region {}".format(account, aws_region))
+            failed_accounts.append({
+                account: repr(e)
+            })
+
+        return failed_accounts
+
+    async def load_master(self, master_session, master_account, aws_region, standards_arns, members_cache_ttl, enable=True):
+        """
+        Enables SecurityHub and the standards for the master account in a region and lists its members
+        :return: AsyncMembershipCache of the region, or None if SecurityHub could not be enabled
+        """
+
+        async with self.limit:
+            master_client = await self.pool.client(master_session, 'securityhub', aws_region)
+            member_cache = AsyncMembershipCache(master_client, members_cache_ttl)
+            if enable and not self.journal.is_done(master_account, aws_region, 'master'):
+                try:
+                    await master_client.enable_security_hub()
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'ResourceConflictException':
+                        self.events.emit('master', 'failed', account=master_account, region=aws_region, error=e,
+                                         message="Error: Unable to enable Security Hub on Master account in region {}".format(aws_region))
+                        return None
+
+        if enable and not self.journal.is_done(master_account, aws_region, 'master'):
+            master_ready = True
+            if standards_arns:
+                try:
+                    master_ready = (await self.enable_standards(master_client, master_account, aws_region, standards_arns)).ready
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'ResourceConflictException':
+                        self.events.emit('master', 'failed', account=master_account, region=aws_region, error=e,
+                                         message="Error: Unable to enable Security Hub on Master account in region {}".format(aws_region))
+                        return None
+            # Standards still PENDING are enabled again by a resumed run
+            if master_ready:
+                self.journal.record(master_account, aws_region, 'master')
+
+        async with self.limit:
+            await member_cache.load()
+        return member_cache
+
+    async def enable(self, master_account, aws_account_dict, aws_regions, standards_arns, role_name, members_cache_ttl=utils.DEFAULT_MEMBERS_CACHE_TTL):
+        """
+        Enables SecurityHub in the master account and links the member accounts, like the threaded
+        flow of enablesecurityhub.py
+        :param master_account: AWS Account Number of the master account
+        :param aws_account_dict: OrderedDict of AwsAccountId:Email of the member accounts
+        :param aws_regions: list of AWS Regions to process
+        :param standards_arns: list of standards ARN resources to enable
+        :param role_name: Role to assume in every account
+        :param members_cache_ttl: seconds before the cached member list of the master account is listed again
+        :return: list of {AwsAccountId: message} failures
+        """
+
+        master_session = await self.assume_role(master_account, role_name)
+        member_caches = OrderedDict(zip(aws_regions, await asyncio.gather(*[
+            self.load_master(master_session, master_account, aws_region, standards_arns, members_cache_ttl) for aws_region in aws_regions
+        ])))
+        if any(member_cache is None for member_cache in member_caches.values()):
+            raise SystemExit(0)
+        reconcilers = dict((aws_region, AsyncMembershipReconciler(self, member_caches[aws_region], aws_region)) for aws_region in aws_regions)
+
+        failed_accounts = []
+        accounts = []
+        for account in aws_account_dict.keys():
+            if account == master_account:
+                self.events.emit('link', 'skipped', account=account, message="Won't try to link master account %s to itself" % account)
+
+            if all(self.journal.is_done(account, aws_region, 'link') for aws_region in aws_regions):
+                self.events.emit('resume', 'skipped', account=account, message="Skipping account {}, all regions completed in journal".format(account))
+                continue
+            accounts.append(account)
+
+        # Failures of each account and region, in input order so the report does not depend on scheduling
+        unit_failures = OrderedDict(((account, aws_region), []) for account in accounts for aws_region in aws_regions
+                                    if not self.journal.is_done(account, aws_region, 'link'))
+        linkable_accounts = dict((aws_region, []) for aws_region in aws_regions)
+        account_sessions = OrderedDict()
+
+        async def enable_account(account):
+            try:
+                bootstrap_config = not all(self.journal.is_done(account, aws_region, 'enable') for aws_region in aws_regions)
+                account_sessions[account] = await self.prepare_account(account, role_name, bootstrap_config)
+            except (ClientError, BotoCoreError) as e:
+                self.events.emit('assume_role', 'failed', account=account, error=e, message="Error Processing Account {}".format(account))
+                failed_accounts.append({account: repr(e)})
+                for aws_region in aws_regions:
+                    unit_failures.pop((account, aws_region), None)
+                return
+
+            session, bootstrap = account_sessions[account]
+
+            async def enable_region(aws_region):
+                if self.journal.is_done(account, aws_region, 'enable'):
+                    return True
+                unit_failures[(account, aws_region)], linkable, standards_ready = await self.enable_account_region(account, aws_region, session, bootstrap, standards_arns)
+                if linkable and not unit_failures[(account, aws_region)] and standards_ready:
+                    self.journal.record(account, aws_region, 'enable')
+                return linkable
+
+            regions = [aws_region for aws_region in aws_regions if (account, aws_region) in unit_failures]
+            for aws_region, linkable in zip(regions, await asyncio.gather(*[enable_region(aws_region) for aws_region in regions])):
+                if linkable:
+                    linkable_accounts[aws_region].append(account)
+            await self.pool.release(session)
+
+        await asyncio.gather(*[enable_account(account) for account in accounts])
+
+        # Add and invite the members of each region in batches from the master account, in input order
+        for aws_region in aws_regions:
+            linkable_accounts[aws_region] = [account for account in accounts if account in linkable_accounts[aws_region]]
+        membership_failures = await asyncio.gather(*[
+            self.add_region_members(reconcilers[aws_region], linkable_accounts[aws_region], aws_account_dict, master_account) for aws_region in aws_regions
+        ])
+        for aws_region, failures in zip(aws_regions, membership_failures):
+            for account, message in failures.items():
+                unit_failures[(account, aws_region)].append({account: message})
+            linkable_accounts[aws_region] = [account for account in linkable_accounts[aws_region] if account not in failures]
+
+        async def link_account(account):
+            session = account_sessions[account][0]
+
+            async def link_region(aws_region):
+                unit_failures[(account, aws_region)].extend(await self.link_account_region(account, session, master_account, reconcilers[aws_region]))
+                if not unit_failures[(account, aws_region)] and reconcilers[aws_region].get_status(account) in utils.LINKED_MEMBER_STATUSES:
+                    self.journal.record(account, aws_region, 'link')
+
+            await asyncio.gather(*[link_region(aws_region) for aws_region in aws_regions if account in linkable_accounts[aws_region]])
+            await self.pool.release(session)
+
+        await asyncio.gather(*[link_account(account) for account in account_sessions])
+
+        for failures in unit_failures.values():
+            failed_accounts.extend(failures)
+        return failed_accounts
+
+    async def disable_account_region(self, account, aws_region, session, master_account, master_client, reconciler, standards_arns=None):
+        """
+        Disables the standards, or removes the membership and disables SecurityHub, of a single
+        member account and region, like the loop of disablesecurityhub.py
+        :return: list of {AwsAccountId: message} failures for the account and region
+        """
+
+        failed_accounts = []
+        start_time = time.time()
+
+        try:
+            async with self.limit:
+                self.events.emit('disable', 'started', account=account, region=aws_region,
+                                 message='Beginning {account} in {region}'.format(account=account, region=aws_region))
+
+                sh_client = await self.pool.client(session, 'securityhub', aws_region)
+                if standards_arns:
+                    for standard in utils.get_regional_standards_arns(aws_region, standards_arns):
+                        try:
+                            subscription_arn = utils.get_standards_subscription_arn(account, aws_region, standard)
+                            await sh_client.batch_disable_standards(StandardsSubscriptionArns=[subscription_arn])
+                            self.events.emit('disable_standards', 'succeeded', account=account, region=aws_region, standard=standard,
+                                             message="Finished disabling standard {} on account {} for region {}".format(standard, account, aws_region))
+                        except ClientError as e:
+                            self.events.emit('disable_standards', 'failed', account=account, region=aws_region, standard=standard, error=e,
+                                             message="Error disabling standards for account {}".format(account))
+                            failed_accounts.append({account: repr(e)})
+                    return failed_accounts
+
+                is_member = reconciler.get_status(account) is not None
+                if is_member:
+                    if (await sh_client.get_master_account()).get('Master'):
+                        try:
+                            await sh_client.disassociate_from_master_account()
+                        except ClientError as e:
+                            self.events.emit('disassociate', 'failed', account=account, region=aws_region, error=e,
+                                             message="Error Processing Account {}".format(account))
+                            failed_accounts.append({
+                                account: repr(e)
+                            })
+
+                    await master_client.disassociate_members(
+                        AccountIds=[account]
+                    )
+                    reconciler.member_cache.set_status([account], 'Removed')
+
+            if is_member:
+                await asyncio.sleep(2)
+
+                async with self.limit:
+                    response = await master_client.delete_members(
+                        AccountIds=[account]
+                    )
+                if not response.get('UnprocessedAccounts'):
+                    reconciler.member_cache.remove([account])
+
+                self.events.emit('remove_member', 'succeeded', account=account, region=aws_region,
+                                 message='Removed Account {monitored} from member list in SecurityHub master account {master} for region {region}'.format(
+                                     monitored=account,
+                                     master=master_account,
+                                     region=aws_region
+                                 ))
+
+                while reconciler.get_status(account) is not None:
+                    if (time.time() - start_time) > MEMBERSHIP_TIMEOUT:
+                        self.events.emit('remove_member', 'timeout', account=account, region=aws_region, duration=time.time() - start_time,
+                                         message="Membership did not show up for account {}, skipping".format(account))
+                        failed_accounts.append({
+                            account: "Membership did not show up for account {} in {}".format(
+                                account,
+                                aws_region
+                            )
+                        })
+                        break
+
+                    await reconciler.wait_for_refresh(account, MEMBERSHIP_TIMEOUT)
+
+            else:
+                self.events.emit('remove_member', 'skipped', account=account, region=aws_region,
+                                 message='Account {monitored} is not a member of {master} in region {region}'.format(
+                                     monitored=account,
+                                     master=master_account,
+                                     region=aws_region
+                                 ))
+
+            async with self.limit:
+                await sh_client.disable_security_hub()
+
+            self.events.emit('disable', 'succeeded', account=account, region=aws_region, duration=time.time() - start_time,
+                             message='Finished {account} in {region}'.format(account=account, region=aws_region))
+
+        except (ClientError, BotoCoreError) as e:
+            self.events.emit('disable', 'failed', account=account, region=aws_region, duration=time.time() - start_time, error=e,
+                             message="Error Processing Account {}".format(account))
+            failed_accounts.append({
+                account: repr(e)
+            })
+
+        return failed_accounts
+
+    async def disable(self, master_account, aws_account_dict, aws_regions, role_name, standards_arns=None, delete_master=False, members_cache_ttl=utils.DEFAULT_MEMBERS_CACHE_TTL):
+        """
+        Disables SecurityHub or standards in the member accounts and unlinks them, like the
+        threaded flow of disablesecurityhub.py
+        :param master_account: AWS Account Number of the master account
+        :param aws_account_dict: OrderedDict of AwsAccountId:Email of the member accounts
+        :param aws_regions: list of AWS Regions to process
+        :param role_name: Role to assume in every account
+        :param standards_arns: list of standards ARNs to disable instead of SecurityHub
+        :param delete_master: also disable SecurityHub, or the standards, in the master account
+        :param members_cache_ttl: seconds before the cached member list of the master account is listed again
+        :return: list of {AwsAccountId: message} failures
+        """
+
+        master_session = await self.assume_role(master_account, role_name)
+        master_clients = OrderedDict()
+        member_caches = OrderedDict()
+        for aws_region in aws_regions:
+            master_clients[aws_region] = await self.pool.client(master_session, 'securityhub', aws_region)
+            member_caches[aws_region] = AsyncMembershipCache(master_clients[aws_region], members_cache_ttl)
+        async with self.limit:
+            await asyncio.gather(*[member_cache.load() for member_cache in member_caches.values()])
+        reconcilers = dict((aws_region, AsyncMembershipReconciler(self, member_caches[aws_region], aws_region)) for aws_region in aws_regions)
+
+        account_failures = OrderedDict((account, []) for account in aws_account_dict.keys())
+
+        async def disable_account(account):
+            try:
+                async with self.limit:
+                    session = await self.assume_role(account, role_name)
+            except (ClientError, BotoCoreError) as e:
+                self.events.emit('disable', 'failed', account=account, error=e, message="Error Processing Account {}".format(account))
+                account_failures[account].append({account: repr(e)})
+                return
+
+            region_failures = await asyncio.gather(*[
+                self.disable_account_region(account, aws_region, session, master_account, master_clients[aws_region], reconcilers[aws_region], standards_arns)
+                for aws_region in aws_regions
+            ])
+            for failures in region_failures:
+                account_failures[account].extend(failures)
+            await self.pool.release(session)
+
+        await asyncio.gather(*[disable_account(account) for account in aws_account_dict.keys()])
+
+        failed_accounts = [failure for failures in account_failures.values() for failure in failures]
+        if delete_master and len(failed_accounts) == 0 and not standards_arns:
+            for aws_region in aws_regions:
+                await master_clients[aws_region].disable_security_hub()
+        if delete_master and len(failed_accounts) == 0 and standards_arns:
+            for aws_region in aws_regions:
+                await master_clients[aws_region].batch_disable_standards(StandardsSubscriptionArns=[
+                    utils.get_standards_subscription_arn(master_account, aws_region, standard) for standard in utils.get_regional_standards_arns(aws_region, standards_arns)
+                ])
+
+        return failed_accounts
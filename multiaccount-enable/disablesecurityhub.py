@@ -21,38 +21,20 @@ import re
 import argparse
 import time
 import utils
+import asyncengine
 
 from collections import OrderedDict
 from botocore.exceptions import ClientError
 
+# Clients shared by every account and region of the run
+client_pool = utils.ClientPool(rate_limiter=utils.RateLimiter(operation_rates=utils.OPERATION_RATE_LIMITS))
 
-def get_master_members(sh_client, aws_region):
-    """
-    Returns a list of current members of the SecurityHub master account
-    :param aws_region: AWS Region of the SecurityHub master account
-    :param detector_id: DetectorId of the SecurityHub master account in the AWS Region
-    :return: dict of AwsAccountId:RelationshipStatus
-    """
+# Credentials of the assumed roles, shared by every assume_role call of the run
+credential_cache = utils.CredentialCache('EnableSecurityHub', client_pool=client_pool)
 
-    member_dict = dict()
+# Progress events of the run, written by a background thread
+events = utils.EventLog()
 
-    results = sh_client.list_members(
-        OnlyAssociated=False
-    )
-    
-    for member in results['Members']:
-        member_dict.update({member['AccountId']: member['MemberStatus']})
-        
-    while results.get("NextToken"):
-        results = sh_client.list_members(
-            OnlyAssociated=False,
-            NextToken=results['NextToken']
-        )
-        
-        for member in results['Members']:
-            member_dict.update({member['AccountId']: member['MemberStatus']})
-            
-    return member_dict
 
 def assume_role(aws_account_number, role_name):
     """
@@ -63,34 +45,31 @@ def assume_role(aws_account_number, role_name):
     :return: SecurityHub client in the specified AWS Account and Region
     """
 
-    # Beginning the assume role process for account
-    sts_client = boto3.client('sts')
-    
-    # Get the current partition
-    partition = sts_client.get_caller_identity()['Arn'].split(":")[1]
-    
-    response = sts_client.assume_role(
-        RoleArn='arn:{}:iam::{}:role/{}'.format(
-            partition,
-            aws_account_number,
-            role_name
-        ),
-        RoleSessionName='EnableSecurityHub'
-    )
-    
-    # Storing STS credentials
-    session = boto3.Session(
-        aws_access_key_id=response['Credentials']['AccessKeyId'],
-        aws_secret_access_key=response['Credentials']['SecretAccessKey'],
-        aws_session_token=response['Credentials']['SessionToken']
-    )
+    # Sessions are cached by role ARN and refresh their credentials before they expire
+    start_time = time.time()
+    session = credential_cache.get_session(aws_account_number, role_name)
 
-    print("Assumed session for {}.".format(
-        aws_account_number
-    ))
+    events.emit('assume_role', 'succeeded', account=aws_account_number, duration=time.time() - start_time,
+                message="Assumed session for {}.".format(aws_account_number))
 
     return session
 
+
+def print_failed_accounts(failed_accounts):
+    """
+    Prints the accounts that could not be processed with the reason of each failure
+    :param failed_accounts: list of {AwsAccountId: message}
+    """
+
+    if len(failed_accounts) > 0:
+        print("---------------------------------------------------------------")
+        print("Failed Accounts")
+        print("---------------------------------------------------------------")
+        for account in failed_accounts:
+            for account_id, message in account.items():
+                print("{}: \n\t{}".format(account_id, message))
+            print("---------------------------------------------------------------")
+
 if __name__ == '__main__':
     
     # Setup command line arguments
@@ -101,7 +80,20 @@ if __name__ == '__main__':
     parser.add_argument('--delete_master', action='store_true', default=False, help="Disable SecurityHub in Master")
     parser.add_argument('--enabled_regions', type=str, help="comma separated list of regions to remove SecurityHub. If not specified, all available regions disabled")
     parser.add_argument('--disable_standards_only', type=str, required=False,help="comma separated list of standards ARNs to disable (ie. arn:aws:securityhub:::ruleset/cis-aws-foundations-benchmark/v/1.2.0 )")
+    parser.add_argument('--members_cache_ttl', type=int, default=utils.DEFAULT_MEMBERS_CACHE_TTL, help="Seconds before the cached member list of the master account is listed again (default: 300)")
+    parser.add_argument('--credentials_cache', type=str, required=False, help="Optional path of a file caching assumed role credentials between runs")
+    parser.add_argument('--engine', type=str, choices=['threads', 'asyncio'], default='threads', help="Process accounts one after the other, or concurrently as asyncio coroutines (requires aiobotocore) (default: threads)")
+    parser.add_argument('--max_concurrency', type=int, default=asyncengine.DEFAULT_MAX_CONCURRENCY, help="Number of account/region pairs making API calls at the same time with --engine asyncio (default: 500)")
+    utils.add_client_arguments(parser)
+    utils.add_event_arguments(parser)
+    utils.add_region_arguments(parser)
     args = parser.parse_args()
+
+    credential_cache.cache_file = args.credentials_cache
+    events.open(args.events_file)
+    client_settings = utils.configure_clients(client_pool, args)
+    if args.engine == 'asyncio':
+        asyncengine.check_available()
     
     # Validate master accountId
     if not re.match(r'[0-9]{12}',args.master_account):
@@ -132,7 +124,7 @@ if __name__ == '__main__':
             securityhub_regions = [str(item) for item in args.enabled_regions.split(',')]
             print("Disabling standards: {} in these regions: {}".format(args.disable_standards_only, securityhub_regions))
         else:
-            securityhub_regions = session.get_available_regions('securityhub')
+            securityhub_regions = utils.get_eligible_regions(session, 'securityhub', args.regions_cache, args.regions_cache_ttl, client_pool, not args.all_available_regions, events)
             print("Disabling standards: {} in all available SecurityHub regions {}".format(args.disable_standards_only,securityhub_regions))
     
     else:
@@ -140,49 +132,74 @@ if __name__ == '__main__':
             securityhub_regions = [str(item) for item in args.enabled_regions.split(',')]
             print("Disabling members in these regions: {}".format(securityhub_regions))
         else:
-            securityhub_regions = session.get_available_regions('securityhub')
+            securityhub_regions = utils.get_eligible_regions(session, 'securityhub', args.regions_cache, args.regions_cache_ttl, client_pool, not args.all_available_regions, events)
             print("Disabling members in all available SecurityHub regions {}".format(securityhub_regions))
     
+    if args.engine == 'asyncio':
+        engine = asyncengine.AsyncEngine(
+            'EnableSecurityHub',
+            events,
+            client_settings,
+            client_pool.rate_limiter,
+            client_pool.metrics,
+            args.max_concurrency,
+            args.credentials_cache
+        )
+        failed_accounts = engine.run(engine.disable(
+            args.master_account,
+            aws_account_dict,
+            securityhub_regions,
+            args.assume_role,
+            standards_arns if args.disable_standards_only else None,
+            args.delete_master,
+            args.members_cache_ttl
+        ))
+        events.flush()
+        print_failed_accounts(failed_accounts)
+        raise SystemExit(0)
+
     master_session = assume_role(args.master_account, args.assume_role)
     #master_session = boto3.Session()
     master_clients = {}
-    members = {}
+    member_caches = {}
     for aws_region in securityhub_regions:
-        master_clients[aws_region] = master_session.client('securityhub', region_name=aws_region)
-        members[aws_region] = get_master_members(master_clients[aws_region], aws_region)
+        master_clients[aws_region] = client_pool.client(master_session, 'securityhub', aws_region)
+        member_caches[aws_region] = utils.MembershipCache(master_clients[aws_region], args.members_cache_ttl)
+        member_caches[aws_region].load()
 
     # Processing accounts to be linked
     failed_accounts = []
     for account in aws_account_dict.keys():
+        account_start_time = time.time()
         try:
             session = assume_role(account, args.assume_role)
             
             for aws_region in securityhub_regions:
-                print('Beginning {account} in {region}'.format(
-                    account=account,
-                    region=aws_region
-                ))
+                events.emit('disable', 'started', account=account, region=aws_region,
+                            message='Beginning {account} in {region}'.format(account=account, region=aws_region))
                 
-                sh_client = session.client('securityhub', region_name=aws_region)
+                sh_client = client_pool.client(session, 'securityhub', aws_region)
                 if args.disable_standards_only:
-                    regional_standards_arns = [utils.get_standard_arn_for_region_and_resource(aws_region, standard) for standard in standards_arns]
-                    for standard in regional_standards_arns:
+                    for standard in utils.get_regional_standards_arns(aws_region, standards_arns):
                         try:
-                            subscription_arn = 'arn:aws:securityhub:{}:{}:subscription/{}'.format(aws_region, account,standard.split(':')[-1].split('/',1)[1])
+                            subscription_arn = utils.get_standards_subscription_arn(account, aws_region, standard)
                             sh_client.batch_disable_standards(StandardsSubscriptionArns=[subscription_arn])
-                            print("Finished disabling standard {} on account {} for region {}".format(standard,account, aws_region))
+                            events.emit('disable_standards', 'succeeded', account=account, region=aws_region, standard=standard,
+                                        message="Finished disabling standard {} on account {} for region {}".format(standard,account, aws_region))
                         except ClientError as e:
-                            print("Error disabling standards for account {}".format(account))
+                            events.emit('disable_standards', 'failed', account=account, region=aws_region, standard=standard, error=e,
+                                        message="Error disabling standards for account {}".format(account))
                             failed_accounts.append({ account : repr(e)})
                 else:
-                    if account in members[aws_region]:
+                    if member_caches[aws_region].get_status(account) is not None:
                     
                         if sh_client.get_master_account().get('Master'):
                             try:
                                 response = sh_client.disassociate_from_master_account()
                 
                             except ClientError as e:
-                                print("Error Processing Account {}".format(account))
+                                events.emit('disassociate', 'failed', account=account, region=aws_region, error=e,
+                                            message="Error Processing Account {}".format(account))
                                 failed_accounts.append({
                                     account: repr(e)
                                 })
@@ -190,23 +207,28 @@ if __name__ == '__main__':
                         master_clients[aws_region].disassociate_members(
                             AccountIds=[account]
                         )
+                        member_caches[aws_region].set_status([account], 'Removed')
                         
                         time.sleep(2)
                         
-                        master_clients[aws_region].delete_members(
+                        response = master_clients[aws_region].delete_members(
                             AccountIds=[account]
                         )
+                        if not response.get('UnprocessedAccounts'):
+                            member_caches[aws_region].remove([account])
                     
-                        print('Removed Account {monitored} from member list in SecurityHub master account {master} for region {region}'.format(
-                            monitored=account,
-                            master=args.master_account,
-                            region=aws_region
-                        ))
+                        events.emit('remove_member', 'succeeded', account=account, region=aws_region,
+                                    message='Removed Account {monitored} from member list in SecurityHub master account {master} for region {region}'.format(
+                                        monitored=account,
+                                        master=args.master_account,
+                                        region=aws_region
+                                    ))
                                     
                         start_time = int(time.time())
-                        while account in members[aws_region]:
+                        while member_caches[aws_region].get_status(account) is not None:
                             if (int(time.time()) - start_time) > 300:
-                                print("Membership did not show up for account {}, skipping".format(account))
+                                events.emit('remove_member', 'timeout', account=account, region=aws_region, duration=time.time() - start_time,
+                                            message="Membership did not show up for account {}, skipping".format(account))
                                 failed_accounts.append({
                                     account: "Membership did not show up for account {} in {}".format(
                                         account,
@@ -216,24 +238,24 @@ if __name__ == '__main__':
                                 break
                             
                             time.sleep(5)
-                            members[aws_region] = get_master_members(master_clients[aws_region], aws_region)
+                            member_caches[aws_region].refresh([account])
 
                     else:
-                        print('Account {monitored} is not a member of {master} in region {region}'.format(
-                            monitored=account,
-                            master=args.master_account,
-                            region=aws_region
-                        ))
+                        events.emit('remove_member', 'skipped', account=account, region=aws_region,
+                                    message='Account {monitored} is not a member of {master} in region {region}'.format(
+                                        monitored=account,
+                                        master=args.master_account,
+                                        region=aws_region
+                                    ))
                     
                     sh_client.disable_security_hub()
 
-            # Refresh the member dictionary
-            members[aws_region] = get_master_members(master_clients[aws_region], aws_region)
-                    
-            print('Finished {account} in {region}'.format(account=account, region=aws_region))
+            events.emit('disable', 'succeeded', account=account, duration=time.time() - account_start_time,
+                        message='Finished {account} in {region}'.format(account=account, region=aws_region))
                     
         except ClientError as e:
-            print("Error Processing Account {}".format(account))
+            events.emit('disable', 'failed', account=account, duration=time.time() - account_start_time, error=e,
+                        message="Error Processing Account {}".format(account))
             failed_accounts.append({
                 account: repr(e)
             })
@@ -243,14 +265,8 @@ if __name__ == '__main__':
             master_clients[aws_region].disable_security_hub()
     if args.delete_master and len(failed_accounts) == 0 and  args.disable_standards_only:
         for aws_region in securityhub_regions:
-            master_clients[aws_region].batch_disable_standards(StandardsSubscriptionArns = [ args.disable_standards_only])
-    if len(failed_accounts) > 0:
-        print("---------------------------------------------------------------")
-        print("Failed Accounts")
-        print("---------------------------------------------------------------")
-        for account in failed_accounts:
-            print("{}: \n\t{}".format(
-                account.keys()[0],
-                account[account.keys()[0]]
-            ))
-            print("---------------------------------------------------------------")
+            master_clients[aws_region].batch_disable_standards(StandardsSubscriptionArns=[
+                utils.get_standards_subscription_arn(args.master_account, aws_region, standard) for standard in utils.get_regional_standards_arns(aws_region, standards_arns)
+            ])
+    events.flush()
+    print_failed_accounts(failed_accounts)
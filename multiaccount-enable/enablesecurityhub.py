@@ -24,11 +24,27 @@ import re
 import json
 import random
 import string
+import threading
 import utils
+import asyncengine
 
-from collections import OrderedDict
-from botocore.exceptions import ClientError
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError
 from six.moves import input as raw_input
+
+# Clients shared by every worker, keyed by session, service and region
+client_pool = utils.ClientPool(rate_limiter=utils.RateLimiter(operation_rates=utils.OPERATION_RATE_LIMITS))
+
+# Credentials of the assumed roles, shared by every assume_role call of the run
+credential_cache = utils.CredentialCache('EnableSecurityHub', client_pool=client_pool)
+
+# Progress events of every worker, written by a background thread
+events = utils.EventLog()
+
+# Executor shared by every get_config_snapshot call, started with the workers
+snapshot_executor = None
+
 def assume_role(aws_account_number, role_name):
     """
     Assumes the provided role in each account and returns a SecurityHub client
@@ -38,142 +54,545 @@ def assume_role(aws_account_number, role_name):
     :return: SecurityHub client in the specified AWS Account and Region
     """
 
-    # Beginning the assume role process for account
-    sts_client = boto3.client('sts')
+    # Sessions are cached by role ARN and refresh their credentials before they expire
+    start_time = time.time()
+    session = credential_cache.get_session(aws_account_number, role_name)
 
-    # Get the current partition
-    partition = sts_client.get_caller_identity()['Arn'].split(":")[1]
+    events.emit('assume_role', 'succeeded', account=aws_account_number, duration=time.time() - start_time,
+                message="Assumed session for {}.".format(aws_account_number))
 
-    response = sts_client.assume_role(
-        RoleArn='arn:{}:iam::{}:role/{}'.format(
-            partition,
-            aws_account_number,
-            role_name
-        ),
-        RoleSessionName='EnableSecurityHub'
-    )
+    return session
 
-    # Storing STS credentials
-    session = boto3.Session(
-        aws_access_key_id=response['Credentials']['AccessKeyId'],
-        aws_secret_access_key=response['Credentials']['SecretAccessKey'],
-        aws_session_token=response['Credentials']['SessionToken']
-    )
+class ConfigBootstrap(object):
+    """
+    Account wide prerequisites of AWS Config: the IAM service-linked role and the S3 bucket for
+    the delivery channel. Both are global to the account, so they are checked once per account and
+    the result is shared by the Config work of every region
+    """
 
-    print("Assumed session for {}.".format(
-        aws_account_number
-    ))
+    def __init__(self, session, account, s3_bucket_name):
+        """
+        :param session: boto3 Session of the account
+        :param account: AWS Account Number
+        :param s3_bucket_name: fallback bucket name for the Config delivery channel
+        """
+
+        self.session = session
+        self.account = account
+        self.s3_bucket_name = s3_bucket_name
+        self.service_linked_role = False
+        self.default_bucket_avail = False
+        self.default_bucket_exists = False
+        self.bucket_ready = None
+        self.lock = threading.Lock()
+
+    def prepare(self):
+        """
+        Creates the AWS Config service-linked role and checks if the default delivery bucket
+        exists or is available
+        """
+
+        iam = client_pool.client(self.session, 'iam')
+        s3 = client_pool.client(self.session, 's3', 'us-east-1')
+
+        try:
+            iam.create_service_linked_role(AWSServiceName='config.amazonaws.com', Description='A service-linked role required for AWS Config')
+            self.service_linked_role = True
+        except ClientError as e:
+            if e.response['ResponseMetadata']['HTTPStatusCode'] == 400:
+                self.service_linked_role = True # SLR already exists
+            else:
+                events.emit('create_service_linked_role', 'failed', account=self.account, error=e, message=str(e))
+        # Check if default bucket name is available.
+        try:
+            s3.list_objects(Bucket='config-bucket-{}'.format(self.account), MaxKeys=1)
+            self.default_bucket_exists = True
+            self.s3_bucket_name = 'config-bucket-{}'.format(self.account)
+        except ClientError as e:
+            if e.response['ResponseMetadata']['HTTPStatusCode'] == 404:
+                self.default_bucket_avail = True
+                self.s3_bucket_name = 'config-bucket-{}'.format(self.account)
+
+    def ensure_bucket(self):
+        """
+        Creates the default delivery bucket and its policy if it is available, at most once per account
+        :return: True if the delivery bucket can be used
+        """
+
+        with self.lock:
+            if self.bucket_ready is None:
+                self.bucket_ready = self._create_bucket()
+            return self.bucket_ready
+
+    def _create_bucket(self):
+        if not self.default_bucket_avail or self.default_bucket_exists:
+            return True
+        s3 = client_pool.client(self.session, 's3', 'us-east-1')
+        try:
+            s3.create_bucket(Bucket=self.s3_bucket_name)
+            bucket_policy = json.dumps(utils.get_config_bucket_policy(self.s3_bucket_name, self.account))
+            s3.put_bucket_policy(Bucket=self.s3_bucket_name, Policy=bucket_policy)
+            self.default_bucket_exists = True
+        except ClientError as e:
+            events.emit('create_config_bucket', 'failed', account=self.account, error=e,
+                        message="Error {} checking bucket for Config delivery in account {}".format(repr(e), self.account))
+            return False
+        return True
 
-    return session
 
-def get_master_members(sh_client, aws_region):
+def get_config_snapshot(config):
     """
-    Returns a list of current members of the SecurityHub master account
-    :param aws_region: AWS Region of the SecurityHub master account
-    :param detector_id: DetectorId of the SecurityHub master account in the AWS Region
-    :return: dict of AwsAccountId:RelationshipStatus
+    Fetches the configuration recorders, their status and the delivery channels in one parallel round,
+    the recorders in the calling worker and the other two on the shared snapshot_executor
+    :param config: AWS Config client of the account and region
+    :return: utils.ConfigSnapshot
     """
 
-    member_dict = dict()
+    recorder_status = snapshot_executor.submit(config.describe_configuration_recorder_status)
+    delivery_channels = snapshot_executor.submit(config.describe_delivery_channels)
+    recorders = config.describe_configuration_recorders()
 
-    results = sh_client.list_members(
-        OnlyAssociated=False
+    return utils.ConfigSnapshot(
+        recorders=recorders['ConfigurationRecorders'],
+        recorder_status=recorder_status.result()['ConfigurationRecordersStatus'],
+        delivery_channels=delivery_channels.result()['DeliveryChannels']
     )
 
-    for member in results['Members']:
-        member_dict.update({member['AccountId']: member['MemberStatus']})
 
-    while results.get("NextToken"):
-        results = sh_client.list_members(
-            OnlyAssociated=False,
-            NextToken=results['NextToken']
-        )
+def check_config(session, account, region, bootstrap):
+    config = client_pool.client(session, 'config', region)
+
+    if not bootstrap.service_linked_role:
+        return False
 
-        for member in results['Members']:
-            member_dict.update({member['AccountId']: member['MemberStatus']})
+    snapshot = get_config_snapshot(config)
+    for action in utils.plan_config_actions(account, snapshot, bootstrap.s3_bucket_name):
+        if action.name == 'ensure_bucket':
+            if not bootstrap.ensure_bucket():
+                return False
+            continue
+        try:
+            getattr(config, action.name)(**action.params)
+        except ClientError as e:
+            if action.name == 'put_configuration_recorder':
+                raise
+            events.emit('enable_config', 'failed', account=account, region=region, error=e,
+                        message="Error {} enabling Config on account {} in region {}".format(repr(e), account, region))
+            return False
+    return True
+
+
+def prepare_account(account, role_name, bootstrap_config=True):
+    """
+    Assumes the provided role in a member account and runs the account wide AWS Config prerequisites
+    :param account: AWS Account Number
+    :param role_name: Role to assume in target account
+    :param bootstrap_config: False to skip the AWS Config prerequisites when no region needs them
+    :return: tuple of (boto3 Session, ConfigBootstrap of the account)
+    """
+
+    session = assume_role(account, role_name)
+    # Generate unique bucket name for Config delivery channel if default is not avaialable.
+    s3_bucket_name = 'config-bucket-{}-{}'.format(''.join(random.SystemRandom().choice(string.ascii_lowercase + string.digits) for _ in range(5)), account)
+    bootstrap = ConfigBootstrap(session, account, s3_bucket_name)
+    if bootstrap_config:
+        bootstrap.prepare()
+
+    return session, bootstrap
+
+
+class MembershipReconciler(object):
+    """
+    Polls the membership of the SecurityHub master account in one region on behalf of every
+    account waiting on a membership change. Each poll refreshes all waiting accounts at once
+    with targeted get_members calls, so the number of polling calls per interval does not grow
+    with the number of waiting accounts
+    """
+
+    def __init__(self, member_cache, aws_region, interval=utils.MEMBERS_POLL_INTERVAL):
+        """
+        :param member_cache: utils.MembershipCache of the master account in the AWS Region
+        :param aws_region: AWS Region of the SecurityHub master account
+        :param interval: seconds between two polls of the waiting accounts
+        """
+
+        self.member_cache = member_cache
+        self.aws_region = aws_region
+        self.interval = interval
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.waiting = Counter()
+        self.polling = False
+
+    def get_status(self, account):
+        """
+        Returns the last known relationship status of an account
+        :return: RelationshipStatus, or None if the account is not a member
+        """
+
+        return self.member_cache.get_status(account)
+
+    def wait_for_refresh(self, account, timeout):
+        """
+        Blocks until the next poll refreshing the account completes
+        :param account: AWS Account Number waiting on a membership change
+        :param timeout: maximum number of seconds to wait
+        :return: True if the account was refreshed before the timeout
+        """
+
+        deadline = time.time() + timeout
+        with self.condition:
+            generation = self.generation
+            self.waiting[account] += 1
+            if not self.polling:
+                self.polling = True
+                poller = threading.Thread(target=self._poll)
+                poller.daemon = True
+                poller.start()
+            try:
+                while self.generation == generation:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self.condition.wait(remaining)
+                return True
+            finally:
+                self.waiting[account] -= 1
+                if not self.waiting[account]:
+                    del self.waiting[account]
+
+    def _poll(self):
+        while True:
+            time.sleep(self.interval)
+            with self.condition:
+                if not self.waiting:
+                    self.polling = False
+                    return
+                accounts = list(self.waiting)
+
+            try:
+                self.member_cache.refresh(accounts)
+            except (ClientError, BotoCoreError) as e:
+                events.emit('refresh_members', 'failed', region=self.aws_region, error=e,
+                            message="Error refreshing members in region {}: {}".format(self.aws_region, repr(e)))
+
+            with self.condition:
+                self.generation += 1
+                self.condition.notify_all()
+
+
+def enable_standards(sh_client, account, aws_region, standards_arns):
+    """
+    Enables standards in an account and region and waits for them to become READY
+    :param sh_client: SecurityHub client in the account and region
+    :param account: AWS Account Number
+    :param aws_region: AWS Region
+    :param standards_arns: list of standards ARN resources to enable
+    :return: utils.StandardsWait outcome of the wait
+    """
 
-    return member_dict
+    regional_standards_arns = utils.get_regional_standards_arns(aws_region, standards_arns)
+    batch_enable_standards_input = [{'StandardsArn': standard_arn} for standard_arn in regional_standards_arns]
+    response = sh_client.batch_enable_standards(StandardsSubscriptionRequests=batch_enable_standards_input)
 
+    # Verify standards get enabled
+    subscription_arns = [subscription['StandardsSubscriptionArn'] for subscription in response['StandardsSubscriptions']]
+    standards_wait = utils.wait_for_standards_ready(sh_client, subscription_arns)
+    utils.report_standards_wait(events, account, aws_region, regional_standards_arns, standards_wait)
 
-def check_config(session,account, region, s3_bucket_name):
-    config = session.client('config', region_name=region)
-    iam = session.client('iam')
-    s3 = session.client('s3', region_name='us-east-1')
+    return standards_wait
+
+
+def get_hub_inventory(sh_client):
+    """
+    Reads whether SecurityHub is enabled and which standards are subscribed, without changing anything
+    :param sh_client: SecurityHub client in the account and region
+    :return: tuple of (True if SecurityHub is enabled, list of enabled standards ARNs)
+    """
 
-    default_bucket_avail = False
-    default_bucket_exists = False
     try:
-        iam.create_service_linked_role(AWSServiceName='config.amazonaws.com', Description='A service-linked role required for AWS Config')
+        sh_client.describe_hub()
     except ClientError as e:
-        if e.response['ResponseMetadata']['HTTPStatusCode'] == 400:
-            pass # SLR already exists
-        else:
-            print(e)
-            return False
-    # Check if default bucket name is available.
+        if e.response['Error']['Code'] in ('InvalidAccessException', 'ResourceNotFoundException'):
+            return False, []
+        raise
+
+    enabled_standards = []
+    for page in sh_client.get_paginator('get_enabled_standards').paginate():
+        for subscription in page['StandardsSubscriptions']:
+            if subscription['StandardsStatus'] in ('PENDING', 'READY', 'INCOMPLETE'):
+                enabled_standards.append(subscription['StandardsArn'])
+
+    return True, enabled_standards
+
+
+def inventory_account_region(account, aws_region, session, bootstrap, reconciler):
+    """
+    Takes the read-only inventory of a single member account and region
+    :param account: AWS Account Number of the member account
+    :param aws_region: AWS Region to inventory
+    :param session: boto3 Session of the member account
+    :param bootstrap: ConfigBootstrap of the member account
+    :param reconciler: MembershipReconciler of the AWS Region
+    :return: utils.UnitInventory
+    """
+
+    hub_enabled, enabled_standards = get_hub_inventory(client_pool.client(session, 'securityhub', aws_region))
+    snapshot = get_config_snapshot(client_pool.client(session, 'config', aws_region))
+    config_actions = [action.name for action in utils.plan_config_actions(account, snapshot, bootstrap.s3_bucket_name)]
+
+    return utils.UnitInventory(hub_enabled, enabled_standards, config_actions, reconciler.get_status(account))
+
+
+def print_plan(plan):
+    """
+    Prints the planned actions of every account and region that needs a change
+    :param plan: OrderedDict of (account, region) to planned actions
+    """
+
+    print("---------------------------------------------------------------")
+    print("Plan")
+    print("---------------------------------------------------------------")
+    for (account, aws_region), actions in plan.items():
+        if actions:
+            print("{} {}: \n\t{}".format(account, aws_region, json.dumps(actions)))
+    print("{} of {} account/region pairs need changes".format(len([actions for actions in plan.values() if actions]), len(plan)))
+    print("---------------------------------------------------------------")
+
+
+def export_plan(plan, plan_file):
+    """
+    Writes the plan as a JSON list so it can be reviewed before it is applied
+    :param plan: OrderedDict of (account, region) to planned actions
+    :param plan_file: path of the JSON file to write
+    """
+
+    with open(plan_file, 'w') as output:
+        json.dump([{'account': account, 'region': aws_region, 'actions': actions} for (account, aws_region), actions in plan.items()], output, indent=2)
+
+
+def enable_account_region(account, aws_region, session, bootstrap, standards_arns, actions=None):
+    """
+    Enables AWS Config, SecurityHub and the requested standards in a single member account and region
+    :param account: AWS Account Number of the member account
+    :param aws_region: AWS Region to process
+    :param session: boto3 Session of the member account
+    :param bootstrap: ConfigBootstrap of the member account
+    :param standards_arns: list of standards ARN resources to enable
+    :param actions: planned actions of the account and region, every step is run if not set
+    :return: tuple of (list of {AwsAccountId: message} failures, True if the account can be linked in the region,
+             True if every requested standard is READY)
+    """
+
+    failed_accounts = []
+    standards_ready = True
+    if actions is None:
+        actions = {'enable_config': True, 'enable_security_hub': True, 'enable_standards': standards_arns}
+
+    start_time = time.time()
     try:
-        s3.list_objects(Bucket='config-bucket-{}'.format(account), MaxKeys=1)
-        default_bucket_exists = True
-        s3_bucket_name = 'config-bucket-{}'.format(account)
-    except ClientError as e:
-        if e.response['ResponseMetadata']['HTTPStatusCode'] == 404:
-            default_bucket_avail = True
-            s3_bucket_name = 'config-bucket-{}'.format(account)
-        pass
-    if not len(config.describe_configuration_recorders()['ConfigurationRecorders']):
-        config.put_configuration_recorder( ConfigurationRecorder={'name':'default','roleARN': 'arn:aws:iam::%s:role/aws-service-role/config.amazonaws.com/AWSServiceRoleForConfig' % account,'recordingGroup': {'allSupported' : True, 'includeGlobalResourceTypes': True}})
-
-    if config.describe_configuration_recorder_status()['ConfigurationRecordersStatus'][0]['recording']:
-        return True #config is configured and enabled nothing to do here.
-    if len(config.describe_delivery_channels()['DeliveryChannels']):
+        events.emit('enable', 'started', account=account, region=aws_region,
+                    message='Beginning {account} in {region}'.format(account=account, region=aws_region))
+
+        sh_client = client_pool.client(session, 'securityhub', aws_region)
+        #Ensure AWS Config is enabled for the account/region and enable if it not already enabled.
+        config_result = not actions.get('enable_config') or check_config(session, account, aws_region, bootstrap)
+        if not config_result:
+            failed_accounts.append({account: "Error validating or enabling AWS Config for account {} in {} - requested standards not enabled".format(account,aws_region)})
+        else:
+            if actions.get('enable_security_hub'):
+                try:
+                    sh_client.enable_security_hub()
+                except ClientError as e:
+                    if e.response['Error']['Code'] == 'ResourceConflictException':
+                        pass
+
+            if actions.get('enable_standards'):
+                standards_wait = enable_standards(sh_client, account, aws_region, actions['enable_standards'])
+                standards_ready = standards_wait.ready
+                if standards_wait.outcome == 'FAILED':
+                    failed_accounts.append({account: "Standards FAILED for account {} in {}: {}".format(account, aws_region, standards_wait.status)})
+
+    except (ClientError, BotoCoreError) as e:
+        events.emit('enable', 'failed', account=account, region=aws_region, duration=time.time() - start_time, error=e,
+                    message="Error Processing Account {} in region {}".format(account, aws_region))
+        failed_accounts.append({
+            account: repr(e)
+        })
+        return failed_accounts, False, False
+
+    events.emit('enable', 'failed' if failed_accounts else 'succeeded', account=account, region=aws_region, duration=time.time() - start_time)
+    return failed_accounts, True, standards_ready
+
+
+def add_region_members(reconciler, accounts, aws_account_dict, master_account):
+    """
+    Adds and invites the member accounts of a region in batches of utils.MEMBERS_BATCH_SIZE accounts
+    :param reconciler: MembershipReconciler of the AWS Region
+    :param accounts: list of AWS Account Numbers to link in the AWS Region
+    :param aws_account_dict: dict of AwsAccountId:Email
+    :param master_account: AWS Account Number of the master account
+    :return: OrderedDict of AwsAccountId:message for accounts that could not be added or invited
+    """
+
+    member_cache = reconciler.member_cache
+    master_client = member_cache.sh_client
+    aws_region = reconciler.aws_region
+    failures = OrderedDict()
+
+    accounts_to_create, members = utils.get_accounts_to_create(accounts, reconciler.get_status)
+    for account in members:
+        events.emit('add_member', 'skipped', account=account, region=aws_region,
+                    message='Account {monitored} is already a member of {master} in region {region}'.format(
+                        monitored=account,
+                        master=master_account,
+                        region=aws_region
+                    ))
+
+    for batch in utils.chunks(accounts_to_create, utils.MEMBERS_BATCH_SIZE):
+        start_time = time.time()
         try:
-            config.start_configuration_recorder(ConfigurationRecorderName=config.describe_configuration_recorder_status()['ConfigurationRecordersStatus'][0]['name'])
-            return True
-        except ClientError as e:
-            print("Error {} starting configuration recorder for account {} in region {}".format(repr(e), account, region))
-            return False
-    ## Ensure S3 bucket for AWS Config delivery exists
-    if default_bucket_avail and not default_bucket_exists:
+            response = master_client.create_members(
+                AccountDetails=[{
+                    "AccountId": account,
+                    "Email": aws_account_dict[account]
+                } for account in batch]
+            )
+        except (ClientError, BotoCoreError) as e:
+            events.emit('create_members', 'failed', account=master_account, region=aws_region, duration=time.time() - start_time, error=e, accounts=len(batch),
+                        message="Error adding {} accounts to member list in region {}".format(len(batch), aws_region))
+            for account in batch:
+                failures[account] = repr(e)
+            continue
+
+        failures.update(utils.get_unprocessed_accounts(response, 'add account {} as member', aws_region))
+        member_cache.set_status([account for account in batch if account not in failures], 'Created')
+
+        events.emit('create_members', 'succeeded', account=master_account, region=aws_region, duration=time.time() - start_time, accounts=len(batch),
+                    message='Added {count} accounts to member list in SecurityHub master account {master} for region {region}'.format(
+                        count=len(batch),
+                        master=master_account,
+                        region=aws_region
+                    ))
+
+    # Members created in the SecurityHub master account but not invited yet
+    accounts_to_invite = utils.get_accounts_to_invite(accounts, reconciler.get_status, failures)
+    for batch in utils.chunks(accounts_to_invite, utils.MEMBERS_BATCH_SIZE):
+        start_time = time.time()
         try:
-            s3.create_bucket(Bucket=s3_bucket_name)
-            bucket_policy = {
-                "Version": "2012-10-17",
-                "Statement": [
-                    {
-                        "Sid": "AWSConfigBucketPermissionsCheck",
-                        "Effect": "Allow",
-                        "Principal": {"Service": ["config.amazonaws.com"]},
-                        "Action": "s3:GetBucketAcl",
-                        "Resource": "arn:aws:s3:::%s" % s3_bucket_name},
-                    {
-                        "Sid": " AWSConfigBucketDelivery",
-                        "Effect": "Allow",
-                        "Principal": {"Service": ["config.amazonaws.com"]},
-                        "Action": "s3:PutObject",
-                        "Resource": "arn:aws:s3:::%s/AWSLogs/%s/Config/*" % (s3_bucket_name, account),
-                        "Condition": { "StringEquals": { "s3:x-amz-acl": "bucket-owner-full-control" }}
-                    }]
-            }
-            bucket_policy = json.dumps(bucket_policy)
-            s3.put_bucket_policy(Bucket=s3_bucket_name, Policy=bucket_policy)
-        except ClientError as e:
-            print("Error {} checking bucket for Config delivery in account {}".format(repr(e), account))
-            return False
+            response = master_client.invite_members(
+                AccountIds=batch
+            )
+        except (ClientError, BotoCoreError) as e:
+            events.emit('invite_members', 'failed', account=master_account, region=aws_region, duration=time.time() - start_time, error=e, accounts=len(batch),
+                        message="Error inviting {} accounts in region {}".format(len(batch), aws_region))
+            for account in batch:
+                failures[account] = repr(e)
+            continue
+
+        failures.update(utils.get_unprocessed_accounts(response, 'invite account {}', aws_region))
+        member_cache.set_status([account for account in batch if account not in failures], 'Invited')
+
+        events.emit('invite_members', 'succeeded', account=master_account, region=aws_region, duration=time.time() - start_time, accounts=len(batch),
+                    message='Invited {count} accounts to SecurityHub master account {master} in region {region}'.format(
+                        count=len(batch),
+                        master=master_account,
+                        region=aws_region
+                    ))
+
+    return failures
+
+
+def print_failed_accounts(failed_accounts):
+    """
+    Prints the accounts that could not be processed with the reason of each failure
+    :param failed_accounts: list of {AwsAccountId: message}
+    """
+
+    if len(failed_accounts) > 0:
+        print("---------------------------------------------------------------")
+        print("Failed Accounts")
+        print("---------------------------------------------------------------")
+        for account in failed_accounts:
+            for account_id, message in account.items():
+                print("{}: \n\t{}".format(account_id, message))
+        print("---------------------------------------------------------------")
+
+
+def link_account_region(account, session, master_account, reconciler):
+    """
+    Accepts the master account invitation in a single member account and region
+    :param account: AWS Account Number of the member account
+    :param session: boto3 Session of the member account
+    :param master_account: AWS Account Number of the master account
+    :param reconciler: MembershipReconciler of the AWS Region
+    :return: list of {AwsAccountId: message} failures for the account and region
+    """
+
+    aws_region = reconciler.aws_region
+    failed_accounts = []
+    start_time = time.time()
+
     try:
-        config.put_delivery_channel(DeliveryChannel={
-            'name': 'config-s3-delivery',
-            's3BucketName': s3_bucket_name,
-            'configSnapshotDeliveryProperties': {'deliveryFrequency': 'TwentyFour_Hours' }
-            })
-        config.start_configuration_recorder(ConfigurationRecorderName=config.describe_configuration_recorder_status()['ConfigurationRecordersStatus'][0]['name'])
-        return True
-    except ClientError as e:
-        print("Error {} enabling Config on account {}".format(repr(e), account))
-        return False
-    return False
+        member_status = reconciler.get_status(account)
+        if member_status is None:
+            events.emit('link', 'skipped', account=account, region=aws_region,
+                        message="Account {} could not be joined, skipping".format(account))
+            return failed_accounts
 
+        if member_status in utils.LINKED_MEMBER_STATUSES:
+            # Member is enabled and already being monitored
+            events.emit('link', 'skipped', account=account, region=aws_region, member_status=member_status,
+                        message='Account {account} is already enabled'.format(account=account))
 
+        else:
+            sh_client = client_pool.client(session, 'securityhub', aws_region)
+            accepted = False
+            while member_status not in utils.LINKED_MEMBER_STATUSES:
+                if (time.time() - start_time) > 300:
+                    events.emit('link', 'timeout', account=account, region=aws_region, duration=time.time() - start_time, member_status=member_status,
+                                message="Invitation did not show up for account {}, skipping".format(account))
+                    failed_accounts.append({
+                        account: "Membership did not show up for account {} in {}".format(
+                            account,
+                            aws_region
+                        )
+                    })
+                    break
 
+                if member_status == 'Invited' and not accepted:
+                    # member has been invited so accept the invite
+
+                    invitation_id = utils.get_invitation_id(sh_client.list_invitations())
+                    if invitation_id is not None:
+                        sh_client.accept_invitation(
+                            InvitationId=invitation_id,
+                            MasterId=str(master_account)
+                        )
+                        accepted = True
+                        events.emit('accept_invitation', 'succeeded', account=account, region=aws_region,
+                                    message='Accepting Account {monitored} to SecurityHub master account {master} in region {region}'.format(
+                                        monitored=account,
+                                        master=master_account,
+                                        region=aws_region
+                                    ))
+
+                # Wait for the region's next refresh of the member dictionary
+                reconciler.wait_for_refresh(account, 300)
+                member_status = reconciler.get_status(account)
+
+            if not failed_accounts:
+                events.emit('link', 'succeeded', account=account, region=aws_region, duration=time.time() - start_time,
+                            message='Finished {account} in {region}'.format(account=account, region=aws_region))
+
+    except (ClientError, BotoCoreError) as e:
+        events.emit('link', 'failed', account=account, region=aws_region, duration=time.time() - start_time, error=e,
+                    message="Error Processing Account {} in region {}".format(account, aws_region))
+        failed_accounts.append({
+            account: repr(e)
+        })
+
+    return failed_accounts
 
 
 if __name__ == '__main__':
@@ -185,17 +604,48 @@ if __name__ == '__main__':
     parser.add_argument('--assume_role', type=str, required=True, help="Role Name to assume in each account")
     parser.add_argument('--enabled_regions', type=str, help="comma separated list of regions to enable SecurityHub. If not specified, all available regions enabled")
     parser.add_argument('--enable_standards', type=str, required=False,help="comma separated list of standards ARN resources to enable ( i.e. ruleset/cis-aws-foundations-benchmark/v/1.2.0 )")
+    parser.add_argument('--max_workers', type=int, default=10, help="Number of account/region pairs to process concurrently (default: 10)")
+    parser.add_argument('--members_cache_ttl', type=int, default=utils.DEFAULT_MEMBERS_CACHE_TTL, help="Seconds before the cached member list of the master account is listed again (default: 300)")
+    parser.add_argument('--credentials_cache', type=str, required=False, help="Optional path of a file caching assumed role credentials between runs")
+    parser.add_argument('--journal', type=str, required=False, help="Optional path of a file recording each completed account/region step")
+    parser.add_argument('--resume', action='store_true', help="Skip the steps already completed in the --journal file of a previous run")
+    parser.add_argument('--plan', action='store_true', help="Take a read-only inventory first and only make the changes it finds missing")
+    parser.add_argument('--plan_file', type=str, required=False, help="Optional path of a JSON file the plan is exported to, implies --plan")
+    parser.add_argument('--dry_run', action='store_true', help="Print the plan and exit without making any change, implies --plan")
+    parser.add_argument('--engine', type=str, choices=['threads', 'asyncio'], default='threads', help="Run accounts on a pool of --max_workers threads, or as asyncio coroutines (requires aiobotocore) (default: threads)")
+    parser.add_argument('--max_concurrency', type=int, default=asyncengine.DEFAULT_MAX_CONCURRENCY, help="Number of account/region pairs making API calls at the same time with --engine asyncio (default: 500)")
+    utils.add_client_arguments(parser)
+    utils.add_event_arguments(parser)
+    utils.add_region_arguments(parser)
     args = parser.parse_args()
 
+    credential_cache.cache_file = args.credentials_cache
+    events.open(args.events_file)
+
     # Validate master accountId
     if not re.match(r'[0-9]{12}',args.master_account):
         raise ValueError("Master AccountId is not valid")
 
+    if args.max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+
+    if args.resume and not args.journal:
+        raise ValueError("--resume requires --journal")
+    plan_mode = args.plan or args.dry_run or bool(args.plan_file)
+
+    if args.engine == 'asyncio':
+        asyncengine.check_available()
+        if plan_mode:
+            raise ValueError("--plan, --plan_file and --dry_run are not supported by the asyncio engine")
+
+    # Apply retries, timeouts and rate limits, with connection pools sized so every worker can share a client
+    client_settings = utils.configure_clients(client_pool, args, max_pool_connections=args.max_workers)
+
     # Generate dict with account & email information
     aws_account_dict = OrderedDict()
 
     # Notify on Config dependency if standards are enabled
-    if args.enable_standards:
+    if args.enable_standards and not args.dry_run:
         print(
         '''
         *****************************************************************************************************************************************************************************************
@@ -240,7 +690,7 @@ if __name__ == '__main__':
         securityhub_regions = [str(item) for item in args.enabled_regions.split(',')]
         print("Enabling members in these regions: {}".format(securityhub_regions))
     else:
-        securityhub_regions = session.get_available_regions('securityhub')
+        securityhub_regions = utils.get_eligible_regions(session, 'securityhub', args.regions_cache, args.regions_cache_ttl, client_pool, not args.all_available_regions, events)
         print("Enabling members in all available SecurityHub regions {}".format(securityhub_regions))
 
     # Check if enable Standards
@@ -249,211 +699,224 @@ if __name__ == '__main__':
         standards_arns = [str(item) for item in args.enable_standards.split(',')]
         print("Enabling the following Security Hub Standards for enabled account(s) and region(s): {}".format(standards_arns))
 
+    # Steps completed with other standards must be run again, so the journal is only resumed with the same ones.
+    # A dry run only reads the journal of the run it previews
+    journal_parameters = {'standards': sorted(standards_arns)}
+    journal = utils.Journal(args.journal if args.resume or not args.dry_run else None, args.resume, journal_parameters)
+
+    if args.engine == 'asyncio':
+        engine = asyncengine.AsyncEngine(
+            'EnableSecurityHub',
+            events,
+            client_settings,
+            client_pool.rate_limiter,
+            client_pool.metrics,
+            args.max_concurrency,
+            args.credentials_cache,
+            journal
+        )
+        failed_accounts = engine.run(engine.enable(
+            args.master_account,
+            aws_account_dict,
+            securityhub_regions,
+            standards_arns,
+            args.assume_role,
+            args.members_cache_ttl
+        ))
+        events.flush()
+        print_failed_accounts(failed_accounts)
+        raise SystemExit(0)
 
     # Processing Master account
     master_session = assume_role(args.master_account, args.assume_role)
     #master_session = boto3.Session()
     master_clients = {}
-    members = {}
+    member_caches = {}
+    plan = OrderedDict()
     for aws_region in securityhub_regions:
-        master_clients[aws_region] = master_session.client('securityhub', region_name=aws_region)
-        try:
-            # Enable Security Hub for the Master Account
-            master_clients[aws_region].enable_security_hub()
-
-            # Enable compliance Standards for Master account
-            compliance_standards_arns = [utils.get_standard_arn_for_region_and_resource(aws_region, standard) for standard in standards_arns]
-            batch_enable_standards_input = [{'StandardsArn': standard_arn} for standard_arn in compliance_standards_arns]
-            master_clients[aws_region].batch_enable_standards(StandardsSubscriptionRequests=batch_enable_standards_input)
-
-            # Verify standards get enabled in the Master Account
-            standards_to_verify = compliance_standards_arns[:]
-            standards_status = {}
-            start_time = int(time.time())
-            while len(standards_to_verify) > 0:
-                if (int(time.time()) - start_time) > 100:
-                    print("Timeout waiting for READY state enabling standards {standards} in region {region} for account {account}, last state: {status}"
-                          .format(standards=compliance_standards_arns, region=aws_region, account=args.master_account, status=standards_status))
-                    break
-                enabled_standards = master_clients[aws_region].get_enabled_standards()
-                for enabled_standard in enabled_standards['StandardsSubscriptions']:
-                    enabled_standard_arn = enabled_standard['StandardsArn']
-                    enabled_standard_status = enabled_standard['StandardsStatus']
-                    standards_status[enabled_standard_arn] = enabled_standard_status
-                    if enabled_standard_arn in standards_to_verify and enabled_standard_status == 'READY':
-                        print("Finished enabling stanard {} on account {} for region {}".format(enabled_standard_arn, args.master_account, aws_region))
-                        standards_to_verify.remove(enabled_standard_arn)
-
-
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'ResourceConflictException':
-                pass
-            else:
-                print("Error: Unable to enable Security Hub on Master account in region {}".format(aws_region))
-                raise SystemExit(0)
+        master_clients[aws_region] = client_pool.client(master_session, 'securityhub', aws_region)
+        member_caches[aws_region] = utils.MembershipCache(master_clients[aws_region], args.members_cache_ttl)
+        master_actions = None
+        if plan_mode:
+            hub_enabled, enabled_standards = get_hub_inventory(master_clients[aws_region])
+            master_actions = utils.plan_account_region(utils.UnitInventory(hub_enabled, enabled_standards, [], None), aws_region, standards_arns, member=False)
+            plan[(args.master_account, aws_region)] = master_actions
+            if args.dry_run:
+                if not hub_enabled:
+                    # Nothing to list before SecurityHub is enabled for the master account
+                    member_caches[aws_region].clear()
+                continue
+        if not journal.is_done(args.master_account, aws_region, 'master'):
+            if master_actions is None:
+                master_actions = {'enable_security_hub': True, 'enable_standards': standards_arns}
+            master_ready = True
+            try:
+                # Enable Security Hub for the Master Account
+                if master_actions.get('enable_security_hub'):
+                    master_clients[aws_region].enable_security_hub()
+
+                # Enable compliance Standards for Master account
+                if master_actions.get('enable_standards'):
+                    master_ready = enable_standards(master_clients[aws_region], args.master_account, aws_region, master_actions['enable_standards']).ready
+
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ResourceConflictException':
+                    pass
+                else:
+                    events.emit('master', 'failed', account=args.master_account, region=aws_region, error=e,
+                                message="Error: Unable to enable Security Hub on Master account in region {}".format(aws_region))
+                    raise SystemExit(0)
+            # Standards still PENDING are enabled again by a resumed run
+            if master_ready:
+                journal.record(args.master_account, aws_region, 'master')
 
-        members[aws_region] = get_master_members(master_clients[aws_region], aws_region)
+        member_caches[aws_region].load()
 
     # Processing accounts to be linked
+    account_sessions = OrderedDict()
     failed_accounts = []
-    for account in aws_account_dict.keys():
-        if account == args.master_account:
-            print("Won't try to link master account %s to itself" % account)
-
-        try:
-
-            session = assume_role(account, args.assume_role)
-            # Generate unique bucket name for Config delivery channel if default is not avaialable.
-            s3_bucket_name = 'config-bucket-{}-{}'.format(''.join(random.SystemRandom().choice(string.ascii_lowercase + string.digits) for _ in range(5)), account)
+    # Every worker has at most two snapshot calls in flight
+    with ThreadPoolExecutor(max_workers=2 * args.max_workers) as snapshot_executor, ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+        # Assume the role once per account before fanning out over its regions
+        account_futures = OrderedDict()
+        for account in aws_account_dict.keys():
+            if account == args.master_account:
+                events.emit('link', 'skipped', account=account, message="Won't try to link master account %s to itself" % account)
+
+            if all(journal.is_done(account, aws_region, 'link') for aws_region in securityhub_regions):
+                events.emit('resume', 'skipped', account=account, message="Skipping account {}, all regions completed in journal".format(account))
+                continue
+
+            # In plan mode the Config prerequisites only run once the inventory shows they are needed
+            bootstrap_config = not plan_mode and not all(journal.is_done(account, aws_region, 'enable') for aws_region in securityhub_regions)
+            account_futures[account] = executor.submit(prepare_account, account, args.assume_role, bootstrap_config)
+
+        for account, future in account_futures.items():
+            try:
+                account_sessions[account] = future.result()
+            except (ClientError, BotoCoreError) as e:
+                events.emit('assume_role', 'failed', account=account, error=e, message="Error Processing Account {}".format(account))
+                failed_accounts.append({
+                    account: repr(e)
+                })
+
+        reconcilers = dict((aws_region, MembershipReconciler(member_caches[aws_region], aws_region)) for aws_region in securityhub_regions)
+        unit_failures = OrderedDict()
+
+        if plan_mode:
+            # Take the read-only inventory of every account and region in parallel
+            inventory_futures = OrderedDict()
+            for account, (session, bootstrap) in account_sessions.items():
+                for aws_region in securityhub_regions:
+                    if not journal.is_done(account, aws_region, 'link'):
+                        inventory_futures[(account, aws_region)] = executor.submit(
+                            inventory_account_region,
+                            account,
+                            aws_region,
+                            session,
+                            bootstrap,
+                            reconcilers[aws_region]
+                        )
+
+            for (account, aws_region), future in inventory_futures.items():
+                try:
+                    plan[(account, aws_region)] = utils.plan_account_region(future.result(), aws_region, standards_arns)
+                except (ClientError, BotoCoreError) as e:
+                    events.emit('inventory', 'failed', account=account, region=aws_region, error=e,
+                                message="Error taking inventory of account {} in region {}".format(account, aws_region))
+                    unit_failures[(account, aws_region)] = [{account: repr(e)}]
+
+            events.flush()
+            print_plan(plan)
+            if args.plan_file:
+                export_plan(plan, args.plan_file)
+                print("Plan exported to {}".format(args.plan_file))
+            if args.dry_run:
+                raise SystemExit(0)
 
+            # Run the account wide Config prerequisites only for accounts that need Config changes
+            bootstrap_futures = OrderedDict((account, executor.submit(bootstrap.prepare)) for account, (session, bootstrap) in account_sessions.items()
+                                            if any(plan.get((account, aws_region), {}).get('enable_config') for aws_region in securityhub_regions))
+            for account, future in bootstrap_futures.items():
+                try:
+                    future.result()
+                except (ClientError, BotoCoreError) as e:
+                    events.emit('bootstrap_config', 'failed', account=account, error=e,
+                                message="Error preparing AWS Config for account {}".format(account))
+                    for aws_region in securityhub_regions:
+                        if (account, aws_region) in plan and (account, aws_region) not in unit_failures:
+                            unit_failures[(account, aws_region)] = [{account: repr(e)}]
+
+        unit_futures = OrderedDict()
+        linkable_accounts = dict((aws_region, []) for aws_region in securityhub_regions)
+        for account, (session, bootstrap) in account_sessions.items():
             for aws_region in securityhub_regions:
-                print('Beginning {account} in {region}'.format(
-                    account=account,
-                    region=aws_region
-                ))
-
-                sh_client = session.client('securityhub', region_name=aws_region)
-                #Ensure AWS Config is enabled for the account/region and enable if it not already enabled.
-                config_result = check_config(session, account, aws_region, s3_bucket_name)
-                if not config_result:
-                    failed_accounts.append({account: "Error validating or enabling AWS Config for account {} in {} - requested standards not enabled".format(account,aws_region)})
-                else:
-                    try:
-                        sh_client.enable_security_hub()
-                    except ClientError as e:
-                        if e.response['Error']['Code'] == 'ResourceConflictException':
-                            pass
-
-                    if args.enable_standards:
-                        regional_standards_arns = [utils.get_standard_arn_for_region_and_resource(aws_region, standard) for standard in standards_arns]
-                        batch_enable_standards_input = [{'StandardsArn': standard_arn} for standard_arn in regional_standards_arns]
-                        sh_client.batch_enable_standards(StandardsSubscriptionRequests=batch_enable_standards_input)
-
-                        # Verify standards get enabled
-                        standards_to_verify = regional_standards_arns[:]
-                        standards_status = {}
-                        start_time = int(time.time())
-                        while len(standards_to_verify) > 0:
-                            if (int(time.time()) - start_time) > 100:
-                                print("Timeout waiting for READY state enabling standards {standards} in region {region} for account {account}, last state: {status}"
-                                      .format(standards=regional_standards_arns, region=aws_region, account=account, status=standards_status))
-                                break
-                            enabled_standards = sh_client.get_enabled_standards()
-                            for enabled_standard in enabled_standards['StandardsSubscriptions']:
-                                enabled_standard_arn = enabled_standard['StandardsArn']
-                                enabled_standard_status = enabled_standard['StandardsStatus']
-                                standards_status[enabled_standard_arn] = enabled_standard_status
-                                if enabled_standard_arn in standards_to_verify and enabled_standard_status == 'READY':
-                                    print("Finished enabling stanard {} on account {} for region {}".format(enabled_standard_arn,account, aws_region))
-                                    standards_to_verify.remove(enabled_standard_arn)
-
-
-                if account in members[aws_region]:
-                    print('Account {monitored} is already a member of {master} in region {region}'.format(
-                        monitored=account,
-                        master=args.master_account,
-                        region=aws_region
-                    ))
-                else:
-                    master_clients[aws_region].create_members(
-                        AccountDetails=[{
-                            "AccountId": account,
-                            "Email": aws_account_dict[account]
-                        }]
-                    )
-
-                    print('Added Account {monitored} to member list in SecurityHub master account {master} for region {region}'.format(
-                        monitored=account,
-                        master=args.master_account,
-                        region=aws_region
-                    ))
-
-                    start_time = int(time.time())
-                    while account not in members[aws_region]:
-                        if (int(time.time()) - start_time) > 300:
-                            print("Membership did not show up for account {}, skipping".format(account))
-                            failed_accounts.append({
-                                account: "Membership did not show up for account {} in {}".format(
-                                    account,
-                                    aws_region
-                                )
-                            })
-                            break
-
-                        time.sleep(5)
-                        members[aws_region] = get_master_members(master_clients[aws_region], aws_region)
-
-                if account not in members[aws_region]:
-                    print("Account {} could not be joined, skipping".format(account))
+                if journal.is_done(account, aws_region, 'link') or (account, aws_region) in unit_failures:
                     continue
-
-                if members[aws_region][account] == 'Associated' or members[aws_region][account] == 'Enabled':
-                    # Member is enabled and already being monitored
-                    print('Account {account} is already enabled'.format(account=account))
-
-                else:
-                    start_time = int(time.time())
-                    while members[aws_region][account] != 'Associated' and members[aws_region][account] != 'Enabled':
-                        if (int(time.time()) - start_time) > 300:
-                            print("Invitation did not show up for account {}, skipping".format(account))
-                            failed_accounts.append({
-                                account: "Membership did not show up for account {} in {}".format(
-                                    account,
-                                    aws_region
-                                )
-                            })
-                            break
-
-                        if members[aws_region][account] == 'Created':
-                            # Member has been created in the SecurityHub master account but not invited yet
-                            master_clients[aws_region].invite_members(
-                                AccountIds=[account]
-                            )
-
-                            print('Invited Account {monitored} to SecurityHub master account {master} in region {region}'.format(
-                                monitored=account,
-                                master=args.master_account,
-                                region=aws_region
-                            ))
-
-                        if members[aws_region][account] == 'Invited':
-                            # member has been invited so accept the invite
-
-                            response = sh_client.list_invitations()
-
-                            invitation_dict = dict()
-
-                            invitation_id = None
-                            for invitation in response['Invitations']:
-                                invitation_id = invitation['InvitationId']
-
-                            if invitation_id is not None:
-                                sh_client.accept_invitation(
-                                    InvitationId=invitation_id,
-                                    MasterId=str(args.master_account)
-                                )
-                                print('Accepting Account {monitored} to SecurityHub master account {master} in region {region}'.format(
-                                    monitored=account,
-                                    master=args.master_account,
-                                    region=aws_region
-                                ))
-
-                        # Refresh the member dictionary
-                        members[aws_region] = get_master_members(master_clients[aws_region], aws_region)
-
-                    print('Finished {account} in {region}'.format(account=account, region=aws_region))
-
-        except ClientError as e:
-            print("Error Processing Account {}".format(account))
-            failed_accounts.append({
-                account: repr(e)
-            })
-
-    if len(failed_accounts) > 0:
-        print("---------------------------------------------------------------")
-        print("Failed Accounts")
-        print("---------------------------------------------------------------")
-        for account in failed_accounts:
-            for account_id, message in account.items():
-                print("{}: \n\t{}".format(account_id, message))
-        print("---------------------------------------------------------------")
+                actions = plan.get((account, aws_region))
+                if journal.is_done(account, aws_region, 'enable') or (plan_mode and not
+                        any(step in actions for step in ('enable_config', 'enable_security_hub', 'enable_standards'))):
+                    unit_failures[(account, aws_region)] = []
+                    linkable_accounts[aws_region].append(account)
+                    continue
+                unit_futures[(account, aws_region)] = executor.submit(
+                    enable_account_region,
+                    account,
+                    aws_region,
+                    session,
+                    bootstrap,
+                    standards_arns,
+                    actions
+                )
+
+        for (account, aws_region), future in unit_futures.items():
+            unit_failures[(account, aws_region)], linkable, standards_ready = future.result()
+            if linkable:
+                linkable_accounts[aws_region].append(account)
+                if not unit_failures[(account, aws_region)] and standards_ready:
+                    journal.record(account, aws_region, 'enable')
+
+        # Add and invite the members of each region in batches from the master account
+        region_futures = OrderedDict()
+        for aws_region in securityhub_regions:
+            region_futures[aws_region] = executor.submit(
+                add_region_members,
+                reconcilers[aws_region],
+                linkable_accounts[aws_region],
+                aws_account_dict,
+                args.master_account
+            )
+
+        for aws_region, future in region_futures.items():
+            try:
+                membership_failures = future.result()
+            except (ClientError, BotoCoreError) as e:
+                events.emit('add_members', 'failed', account=args.master_account, region=aws_region, error=e,
+                            message="Error adding members in region {}".format(aws_region))
+                membership_failures = OrderedDict((account, repr(e)) for account in linkable_accounts[aws_region])
+            for account, message in membership_failures.items():
+                unit_failures[(account, aws_region)].append({account: message})
+            linkable_accounts[aws_region] = [account for account in linkable_accounts[aws_region] if account not in membership_failures]
+
+        unit_futures = OrderedDict()
+        for aws_region in securityhub_regions:
+            for account in linkable_accounts[aws_region]:
+                unit_futures[(account, aws_region)] = executor.submit(
+                    link_account_region,
+                    account,
+                    account_sessions[account][0],
+                    args.master_account,
+                    reconcilers[aws_region]
+                )
+
+        for (account, aws_region), future in unit_futures.items():
+            unit_failures[(account, aws_region)].extend(future.result())
+            if not unit_failures[(account, aws_region)] and reconcilers[aws_region].get_status(account) in utils.LINKED_MEMBER_STATUSES:
+                journal.record(account, aws_region, 'link')
+
+    # Collect failures in input order so the report does not depend on scheduling
+    for failures in unit_failures.values():
+        failed_accounts.extend(failures)
+
+    events.flush()
+    print_failed_accounts(failed_accounts)
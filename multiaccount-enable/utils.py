@@ -1,8 +1,437 @@
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+from collections import OrderedDict, namedtuple
+from dateutil.tz import tzutc
+
+# The client, credential, rate limiting, metrics, event, region and standards helpers shared by every script
+# directory live in the common directory of the repository
+COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
+
+from sharedutils import (STANDARDS_WAIT_TIMEOUT, RATE_LIMITED_SERVICES, StandardsPoll, StandardsWait, CallMetrics,
+                         ClientPool, CredentialCache, EventLog, RateLimiter, TokenBucket, add_client_arguments,
+                         add_event_arguments, add_region_arguments, chunks, configure_clients, create_botocore_session,
+                         get_client_settings, get_eligible_regions, wait_for_standards_ready)
+
 CIS_STANDARD_RESOURCE = 'ruleset/cis-aws-foundations-benchmark/v/1.2.0'
 CIS_STANDARD_ARN = 'arn:aws:securityhub:::ruleset/cis-aws-foundations-benchmark/v/1.2.0'
+
+# Maximum number of accounts accepted by a single SecurityHub member management call
+MEMBERS_BATCH_SIZE = 50
+
+# Seconds before a cached member list is paginated again
+DEFAULT_MEMBERS_CACHE_TTL = 300
+
+# Seconds between two polls of the master account member list in a region
+MEMBERS_POLL_INTERVAL = 5
+
+# Relationship statuses of member accounts linked to the master account
+LINKED_MEMBER_STATUSES = ('Associated', 'Enabled')
+
+# Lower rates of the operations called by the scripts of this directory that have a smaller SecurityHub quota,
+# passed to RateLimiter
+OPERATION_RATE_LIMITS = {
+    'BatchEnableStandards': 1
+}
+
+# Current AWS Config setup of an account in a region
+ConfigSnapshot = namedtuple('ConfigSnapshot', ['recorders', 'recorder_status', 'delivery_channels'])
+
+# AWS Config API call planned by plan_config_actions, or the ensure_bucket step of ConfigBootstrap
+ConfigAction = namedtuple('ConfigAction', ['name', 'params'])
+
+# Read-only state of an account in a region, taken by --plan before any change is made
+UnitInventory = namedtuple('UnitInventory', ['hub_enabled', 'enabled_standards', 'config_actions', 'member_status'])
+
 "arn:aws:securityhub:us-west-2::standards/pci-dss/v/3.2.1"
 def get_standard_arn_for_region_and_resource(region, standard_resource):
     if standard_resource == CIS_STANDARD_ARN or standard_resource == CIS_STANDARD_RESOURCE:
         return CIS_STANDARD_ARN
     else:
         return 'arn:{partition}:securityhub:{region}::{resource}'.format(partition='aws', region=region, resource=standard_resource)
+
+
+def get_regional_standards_arns(region, standards_arns):
+    """
+    :param region: AWS Region of the standards
+    :param standards_arns: list of standards ARN resources, or of standards ARNs
+    :return: list of the ARNs of the standards in the region
+    """
+
+    return [get_standard_arn_for_region_and_resource(region, standard) for standard in standards_arns]
+
+
+def get_standards_subscription_arn(account, region, standard_arn):
+    """
+    :param account: AWS Account Number subscribed to the standard
+    :param region: AWS Region of the subscription
+    :param standard_arn: ARN of the standard in the region, see get_standard_arn_for_region_and_resource
+    :return: StandardsSubscriptionArn of the standard for the account and region
+    """
+
+    return 'arn:aws:securityhub:{}:{}:subscription/{}'.format(region, account, standard_arn.split(':')[-1].split('/', 1)[1])
+
+
+def report_standards_wait(events, account, aws_region, regional_standards_arns, standards_wait):
+    """
+    Emits the enable_standards event of a wait for standards to become READY
+    :param events: EventLog of the run
+    :param account: AWS Account Number
+    :param aws_region: AWS Region
+    :param regional_standards_arns: ARNs of the enabled standards in the region
+    :param standards_wait: StandardsWait outcome of the wait
+    """
+
+    if standards_wait.ready:
+        events.emit('enable_standards', 'succeeded', account=account, region=aws_region, duration=standards_wait.elapsed, polls=standards_wait.polls,
+                    message="Finished enabling standards {} on account {} for region {} after {} polls in {:.1f}s".format(
+                        regional_standards_arns, account, aws_region, standards_wait.polls, standards_wait.elapsed))
+        return
+
+    if standards_wait.outcome == 'FAILED':
+        status, description = 'failed', 'FAILED state'
+    else:
+        status, description = 'timeout', 'Timeout waiting for READY state'
+    events.emit('enable_standards', status, account=account, region=aws_region, duration=standards_wait.elapsed, polls=standards_wait.polls,
+                standards_status=standards_wait.status,
+                message="{description} enabling standards {standards} in region {region} for account {account} after {polls} polls in {elapsed:.1f}s, last state: {status}"
+                .format(description=description, standards=regional_standards_arns, region=aws_region, account=account, polls=standards_wait.polls,
+                        elapsed=standards_wait.elapsed, status=standards_wait.status))
+
+
+def get_accounts_to_create(accounts, get_status):
+    """
+    :param accounts: list of AWS Account Numbers to link
+    :param get_status: function returning the last known RelationshipStatus of an account, None if it is not a member
+    :return: tuple of (accounts that are not members yet, accounts that already are)
+    """
+
+    statuses = [(account, get_status(account)) for account in accounts]
+    return [account for account, status in statuses if status is None], [account for account, status in statuses if status is not None]
+
+
+def get_accounts_to_invite(accounts, get_status, failures):
+    """
+    :param accounts: list of AWS Account Numbers to link
+    :param get_status: function returning the last known RelationshipStatus of an account, None if it is not a member
+    :param failures: dict of AwsAccountId:message of the accounts that could not be added
+    :return: the members created in the master account but not invited yet
+    """
+
+    return [account for account in accounts if account not in failures and get_status(account) == 'Created']
+
+
+def get_unprocessed_accounts(response, description, aws_region):
+    """
+    :param response: create_members or invite_members response
+    :param description: action of the call in the failure messages, e.g. 'add account {} as member'
+    :param aws_region: AWS Region of the call
+    :return: OrderedDict of AwsAccountId:message of the accounts the call did not process
+    """
+
+    return OrderedDict((unprocessed['AccountId'], "Unable to {} in {}: {}".format(
+        description.format(unprocessed['AccountId']),
+        aws_region,
+        unprocessed.get('ProcessingResult')
+    )) for unprocessed in response.get('UnprocessedAccounts', []))
+
+
+def get_invitation_id(response):
+    """
+    :param response: list_invitations response of a member account
+    :return: InvitationId of the last invitation, or None if the account has no invitation
+    """
+
+    invitation_id = None
+    for invitation in response['Invitations']:
+        invitation_id = invitation['InvitationId']
+    return invitation_id
+
+
+def plan_config_actions(account, snapshot, s3_bucket_name):
+    """
+    Computes the minimal list of actions that gets AWS Config recording in a region
+    :param account: AWS Account Number
+    :param snapshot: ConfigSnapshot of the account and region
+    :param s3_bucket_name: bucket name for the Config delivery channel
+    :return: list of ConfigAction, empty if Config is already recording
+    """
+
+    actions = []
+    if snapshot.recorders:
+        recorder_name = snapshot.recorder_status[0]['name']
+        if snapshot.recorder_status[0]['recording']:
+            return actions #config is configured and enabled nothing to do here.
+    else:
+        recorder_name = 'default'
+        actions.append(ConfigAction('put_configuration_recorder', {'ConfigurationRecorder': {'name': recorder_name,'roleARN': 'arn:aws:iam::%s:role/aws-service-role/config.amazonaws.com/AWSServiceRoleForConfig' % account,'recordingGroup': {'allSupported' : True, 'includeGlobalResourceTypes': True}}}))
+
+    if not snapshot.delivery_channels:
+        ## Ensure S3 bucket for AWS Config delivery exists
+        actions.append(ConfigAction('ensure_bucket', {}))
+        actions.append(ConfigAction('put_delivery_channel', {'DeliveryChannel': {
+            'name': 'config-s3-delivery',
+            's3BucketName': s3_bucket_name,
+            'configSnapshotDeliveryProperties': {'deliveryFrequency': 'TwentyFour_Hours' }
+            }}))
+    actions.append(ConfigAction('start_configuration_recorder', {'ConfigurationRecorderName': recorder_name}))
+
+    return actions
+
+
+def plan_account_region(inventory, aws_region, standards_arns, member=True):
+    """
+    Computes the actions needed to bring an account and region to the desired state
+    :param inventory: UnitInventory of the account and region
+    :param aws_region: AWS Region of the inventory
+    :param standards_arns: list of standards ARN resources that must be enabled
+    :param member: False for the master account, which is neither checked for Config nor linked
+    :return: OrderedDict of action name to action details, empty if nothing needs to change
+    """
+
+    actions = OrderedDict()
+    if member and inventory.config_actions:
+        actions['enable_config'] = inventory.config_actions
+    if not inventory.hub_enabled:
+        actions['enable_security_hub'] = True
+    missing_standards = [standard for standard in standards_arns
+                         if get_standard_arn_for_region_and_resource(aws_region, standard) not in inventory.enabled_standards]
+    if missing_standards:
+        actions['enable_standards'] = missing_standards
+    if member and inventory.member_status is None:
+        actions['add_member'] = True
+    if member and inventory.member_status not in LINKED_MEMBER_STATUSES:
+        actions['accept_invitation'] = True
+
+    return actions
+
+
+def get_config_bucket_policy(s3_bucket_name, account):
+    """
+    Returns the bucket policy letting AWS Config deliver the configuration of an account
+    :param s3_bucket_name: bucket of the Config delivery channel
+    :param account: AWS Account Number delivering to the bucket
+    :return: bucket policy document
+    """
+
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Sid": "AWSConfigBucketPermissionsCheck",
+                "Effect": "Allow",
+                "Principal": {"Service": ["config.amazonaws.com"]},
+                "Action": "s3:GetBucketAcl",
+                "Resource": "arn:aws:s3:::%s" % s3_bucket_name},
+            {
+                "Sid": " AWSConfigBucketDelivery",
+                "Effect": "Allow",
+                "Principal": {"Service": ["config.amazonaws.com"]},
+                "Action": "s3:PutObject",
+                "Resource": "arn:aws:s3:::%s/AWSLogs/%s/Config/*" % (s3_bucket_name, account),
+                "Condition": { "StringEquals": { "s3:x-amz-acl": "bucket-owner-full-control" }}
+            }]
+    }
+
+
+class MembershipCache(object):
+    """
+    Per-region cache of the member accounts of a SecurityHub administrator account. The full
+    member list is only paginated when the cache is older than its TTL, the script's own
+    membership changes are applied directly and individual accounts are refreshed with
+    targeted get_members calls.
+    """
+
+    def __init__(self, sh_client, ttl=DEFAULT_MEMBERS_CACHE_TTL):
+        """
+        :param sh_client: SecurityHub client of the administrator account in the AWS Region
+        :param ttl: seconds before the full member list is paginated again
+        """
+
+        self.sh_client = sh_client
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.members = dict()
+        self.loaded_at = None
+
+    def get_members(self):
+        """
+        Returns the current members, paginating the full member list if the cache expired
+        :return: dict of AwsAccountId:RelationshipStatus
+        """
+
+        with self.lock:
+            if self.loaded_at is None or time.time() - self.loaded_at > self.ttl:
+                self.load()
+            return dict(self.members)
+
+    def get_status(self, account):
+        """
+        Returns the relationship status of a single account
+        :return: RelationshipStatus, or None if the account is not a member
+        """
+
+        with self.lock:
+            return self.get_members().get(account)
+
+    def load(self):
+        """
+        Paginates the full member list of the administrator account
+        """
+
+        member_dict = dict()
+
+        results = self.sh_client.list_members(
+            OnlyAssociated=False
+        )
+
+        for member in results['Members']:
+            member_dict.update({member['AccountId']: member['MemberStatus']})
+
+        while results.get("NextToken"):
+            results = self.sh_client.list_members(
+                OnlyAssociated=False,
+                NextToken=results['NextToken']
+            )
+
+            for member in results['Members']:
+                member_dict.update({member['AccountId']: member['MemberStatus']})
+
+        with self.lock:
+            self.members = member_dict
+            self.loaded_at = time.time()
+
+    def clear(self):
+        """
+        Records an empty member list without listing it, e.g. before SecurityHub is enabled for the
+        administrator account
+        """
+
+        with self.lock:
+            self.members = dict()
+            self.loaded_at = time.time()
+
+    def refresh(self, account_ids):
+        """
+        Refreshes specific accounts with get_members instead of listing every member
+        :param account_ids: list of AWS Account Numbers to refresh
+        :return: dict of AwsAccountId:RelationshipStatus for the refreshed accounts that are members
+        """
+
+        refreshed = dict()
+        not_members = []
+        for batch in chunks(list(account_ids), MEMBERS_BATCH_SIZE):
+            results = self.sh_client.get_members(AccountIds=batch)
+            for member in results['Members']:
+                refreshed[member['AccountId']] = member['MemberStatus']
+            not_members.extend(unprocessed['AccountId'] for unprocessed in results.get('UnprocessedAccounts', []))
+
+        with self.lock:
+            self.members.update(refreshed)
+            for account in not_members:
+                self.members.pop(account, None)
+
+        return refreshed
+
+    def set_status(self, account_ids, status):
+        """
+        Records the relationship status resulting from a membership call made by the script
+        """
+
+        with self.lock:
+            for account in account_ids:
+                self.members[account] = status
+
+    def remove(self, account_ids):
+        """
+        Records accounts deleted from the member list by the script
+        """
+
+        with self.lock:
+            for account in account_ids:
+                self.members.pop(account, None)
+
+
+class Journal(object):
+    """
+    Append-only JSON lines journal of the (account, region, step) units completed by a run, so an
+    interrupted run can be resumed without repeating them. The first line is a header recording the
+    parameters the steps were completed with, e.g. the requested standards, and a resumed run must use
+    the same parameters
+    """
+
+    def __init__(self, path=None, resume=False, parameters=None):
+        """
+        :param path: path of the journal file, nothing is recorded if not set
+        :param resume: load the steps already completed in the journal file, otherwise the file is truncated
+        :param parameters: JSON serializable dict of the parameters of the run the completed steps depend on
+        """
+
+        self.path = path
+        self.parameters = parameters
+        self.lock = threading.Lock()
+        self.completed = set()
+        if path and not (resume and self._load()):
+            with open(path, 'w') as journal:
+                journal.write(json.dumps({'parameters': parameters}) + '\n')
+
+    def _load(self):
+        """
+        :return: True if the journal file had a header, False if it is missing or empty
+        """
+
+        try:
+            with open(self.path) as journal:
+                lines = journal.readlines()
+        except IOError:
+            return False
+
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # The last line may be truncated if the previous run was killed mid-write
+                continue
+        if not entries:
+            return False
+
+        parameters = entries[0].get('parameters')
+        if parameters != self.parameters:
+            raise ValueError("Journal {} was written with {}, not {}: run without --resume to start over".format(self.path, parameters, self.parameters))
+        self.completed.update((entry['account'], entry['region'], entry['step']) for entry in entries[1:])
+        return True
+
+    def is_done(self, account, region, step):
+        """
+        :return: True if the step was completed for the account and region
+        """
+
+        with self.lock:
+            return (account, region, step) in self.completed
+
+    def record(self, account, region, step):
+        """
+        Appends a completed step to the journal file
+        :param account: AWS Account Number
+        :param region: AWS Region of the step
+        :param step: name of the completed step
+        """
+
+        with self.lock:
+            self.completed.add((account, region, step))
+            if not self.path:
+                return
+            with open(self.path, 'a') as journal:
+                journal.write(json.dumps({
+                    'account': account,
+                    'region': region,
+                    'step': step,
+                    'time': datetime.datetime.now(tzutc()).isoformat()
+                }) + '\n')
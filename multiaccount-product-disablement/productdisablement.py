@@ -20,10 +20,20 @@ import boto3
 import re
 import argparse
 import time
+import utils
 
 from collections import OrderedDict
 from botocore.exceptions import ClientError
 
+# Clients shared by every account and region of the run
+client_pool = utils.ClientPool(rate_limiter=utils.RateLimiter())
+
+# Credentials of the assumed roles, shared by every assume_role call of the run
+credential_cache = utils.CredentialCache('DisableSecurityHubCSPMProducts', client_pool=client_pool)
+
+# Progress events of the run, written by a background thread
+events = utils.EventLog()
+
 
 def assume_role(aws_account_id, role_name):
     """
@@ -33,28 +43,12 @@ def assume_role(aws_account_id, role_name):
     :return: boto3 Session object
     """
     
-    sts_client = boto3.client('sts')
-    
-    # Get the current partition
-    partition = sts_client.get_caller_identity()['Arn'].split(":")[1]
-    
-    response = sts_client.assume_role(
-        RoleArn='arn:{}:iam::{}:role/{}'.format(
-            partition,
-            aws_account_id,
-            role_name
-        ),
-        RoleSessionName='DisableSecurityHubCSPMProducts'
-    )
-    
-    # Storing STS credentials
-    session = boto3.Session(
-        aws_access_key_id=response['Credentials']['AccessKeyId'],
-        aws_secret_access_key=response['Credentials']['SecretAccessKey'],
-        aws_session_token=response['Credentials']['SessionToken']
-    )
+    # Sessions are cached by role ARN and refresh their credentials before they expire
+    start_time = time.time()
+    session = credential_cache.get_session(aws_account_id, role_name)
 
-    print("Assumed session for {}.".format(aws_account_id))
+    events.emit('assume_role', 'succeeded', account=aws_account_id, duration=time.time() - start_time,
+                message="Assumed session for {}.".format(aws_account_id))
 
     return session
 
@@ -69,20 +63,8 @@ def get_admin_members(sh_client, aws_region):
     
     member_dict = dict()
     
-    results = sh_client.list_members(
-        OnlyAssociated=False
-    )
-    
-    for member in results['Members']:
-        member_dict.update({member['AccountId']: member['MemberStatus']})
-        
-    while results.get("NextToken"):
-        results = sh_client.list_members(
-            OnlyAssociated=False,
-            NextToken=results['NextToken']
-        )
-        
-        for member in results['Members']:
+    for page in sh_client.get_paginator('list_members').paginate(OnlyAssociated=False):
+        for member in page['Members']:
             member_dict.update({member['AccountId']: member['MemberStatus']})
             
     return member_dict
@@ -96,7 +78,15 @@ if __name__ == '__main__':
     parser.add_argument('--assume_role_name', type=str, required=True, help="Role Name to assume in each account")
     parser.add_argument('--regions-to-disable', type=str, required=True, help="Comma separated list of regions to disable products, or 'ALL' for all available regions (format: us-east-1, eu-west-1, etc.)")
     parser.add_argument('--products', type=str, required=True, help="Comma separated list of product identifiers to disable (e.g., 'aws/guardduty,aws/macie' or product ARNs)")
+    parser.add_argument('--credentials_cache', type=str, required=False, help="Optional path of a file caching assumed role credentials between runs")
+    utils.add_client_arguments(parser)
+    utils.add_event_arguments(parser)
+    utils.add_region_arguments(parser)
     args = parser.parse_args()
+
+    credential_cache.cache_file = args.credentials_cache
+    events.open(args.events_file)
+    utils.configure_clients(client_pool, args)
     
     # Parse product list
     product_identifiers = [str(item).strip() for item in args.products.split(',')]
@@ -107,7 +97,7 @@ if __name__ == '__main__':
     
     securityhub_regions = []
     if args.regions_to_disable.upper() == 'ALL':
-        securityhub_regions = session.get_available_regions('securityhub')
+        securityhub_regions = utils.get_eligible_regions(session, 'securityhub', args.regions_cache, args.regions_cache_ttl, client_pool, not args.all_available_regions, events)
         print("Will check for members in all available Security Hub CSPM regions: {}".format(securityhub_regions))
     else:
         securityhub_regions = [str(item).strip() for item in args.regions_to_disable.split(',')]
@@ -125,7 +115,7 @@ if __name__ == '__main__':
         print("Will check for members in these regions: {}".format(securityhub_regions))
     
     # Get the DA account ID (needed for both CSV and non-CSV modes)
-    sts_client = session.client('sts')
+    sts_client = client_pool.client(session, 'sts')
     da_account_id = sts_client.get_caller_identity()['Account']
     
     # Initialize members dict for all regions
@@ -167,13 +157,11 @@ if __name__ == '__main__':
         print("No CSV file provided - will fetch all Security Hub member accounts")
         
         # Get Security Hub member accounts from all regions (only when needed)
-        admin_clients = {}
         all_member_accounts = set()
         
         for aws_region in securityhub_regions:
-            admin_clients[aws_region] = session.client('securityhub', region_name=aws_region)
             try:
-                members[aws_region] = get_admin_members(admin_clients[aws_region], aws_region)
+                members[aws_region] = get_admin_members(client_pool.client(session, 'securityhub', aws_region), aws_region)
                 all_member_accounts.update(members[aws_region].keys())
                 print("Found {} member accounts in region {}".format(len(members[aws_region]), aws_region))
             except ClientError as e:
@@ -204,7 +192,7 @@ if __name__ == '__main__':
         try:
             # For DA account, use current session; for others, assume role
             if account == da_account_id:
-                print("Using current session for DA account {}.".format(account))
+                events.emit('assume_role', 'skipped', account=account, message="Using current session for DA account {}.".format(account))
                 account_session = boto3.session.Session()
             else:
                 account_session = assume_role(account, args.assume_role_name)
@@ -212,26 +200,28 @@ if __name__ == '__main__':
             for aws_region in securityhub_regions:
                 # Check if account is a member in this specific region
                 if account not in members[aws_region]:
-                    print('Account {account} is not a Security Hub CSPM member in region {region} - skipping'.format(
-                        account=account,
-                        region=aws_region
-                    ))
+                    events.emit('disable_products', 'skipped', account=account, region=aws_region,
+                                message='Account {account} is not a Security Hub CSPM member in region {region} - skipping'.format(
+                                    account=account,
+                                    region=aws_region
+                                ))
                     continue
                 
-                print('Beginning {account} in {region}'.format(
-                    account=account,
-                    region=aws_region
-                ))
+                start_time = time.time()
+                events.emit('disable_products', 'started', account=account, region=aws_region,
+                            message='Beginning {account} in {region}'.format(account=account, region=aws_region))
                 
                 try:
-                    sh_client = account_session.client('securityhub', region_name=aws_region)
+                    sh_client = client_pool.client(account_session, 'securityhub', aws_region)
                 except ClientError as e:
                     error_code = e.response['Error']['Code']
                     if error_code == 'UnrecognizedClientException':
-                        print('  [SKIP] Region not enabled for account: {}'.format(aws_region))
+                        events.emit('disable_products', 'skipped', account=account, region=aws_region, error=e,
+                                    message='  [SKIP] Region not enabled for account: {}'.format(aws_region))
                         continue
                     else:
-                        print('  [FAIL] {}'.format(repr(e)))
+                        events.emit('disable_products', 'failed', account=account, region=aws_region, error=e,
+                                    message='  [FAIL] {}'.format(repr(e)))
                         failed_accounts.append({
                             account: "Failed to create client in {}".format(aws_region)
                         })
@@ -251,11 +241,12 @@ if __name__ == '__main__':
                         sh_client.disable_import_findings_for_product(
                             ProductSubscriptionArn=product_arn
                         )
-                        print('  Disabled product {product} in account {account} region {region}'.format(
-                            product=product_identifier,
-                            account=account,
-                            region=aws_region
-                        ))
+                        events.emit('disable_product', 'succeeded', account=account, region=aws_region, product=product_identifier,
+                                    message='  Disabled product {product} in account {account} region {region}'.format(
+                                        product=product_identifier,
+                                        account=account,
+                                        region=aws_region
+                                    ))
                         
                     except ClientError as e:
                         error_code = e.response['Error']['Code']
@@ -263,28 +254,34 @@ if __name__ == '__main__':
                         
                         # Skip expected cases
                         if error_code == 'ResourceNotFoundException':
-                            print('  [SKIP] Product not enabled: {}'.format(product_identifier))
+                            events.emit('disable_product', 'skipped', account=account, region=aws_region, product=product_identifier, error=e,
+                                        message='  [SKIP] Product not enabled: {}'.format(product_identifier))
                         elif error_code == 'InvalidAccessException' and ('not subscribed to AWS Security Hub' in error_message or 'SecurityHub is not enabled' in error_message.lower()):
-                            print('  [SKIP] Security Hub not enabled')
+                            events.emit('disable_product', 'skipped', account=account, region=aws_region, product=product_identifier, error=e,
+                                        message='  [SKIP] Security Hub not enabled')
                         elif error_code == 'UnrecognizedClientException':
-                            print('  [SKIP] Region not enabled for account: {}'.format(aws_region))
+                            events.emit('disable_product', 'skipped', account=account, region=aws_region, product=product_identifier, error=e,
+                                        message='  [SKIP] Region not enabled for account: {}'.format(aws_region))
                             break  # Skip remaining products for this region
                         else:
                             # Everything else - print the raw error
-                            print('  [FAIL] {}'.format(repr(e)))
+                            events.emit('disable_product', 'failed', account=account, region=aws_region, product=product_identifier, error=e,
+                                        message='  [FAIL] {}'.format(repr(e)))
                             failed_accounts.append({
                                 account: "{} in {}".format(product_identifier, aws_region)
                             })
                 
-                print('Finished {account} in {region}'.format(account=account, region=aws_region))
+                events.emit('disable_products', 'succeeded', account=account, region=aws_region, duration=time.time() - start_time,
+                            message='Finished {account} in {region}'.format(account=account, region=aws_region))
                     
         except ClientError as e:
             error_msg = e.response.get('Error', {}).get('Message', str(e))
-            print("[FAIL] Account {}: {}".format(account, error_msg))
+            events.emit('disable_products', 'failed', account=account, error=e, message="[FAIL] Account {}: {}".format(account, error_msg))
             failed_accounts.append({
                 account: error_msg
             })
 
+    events.flush()
     if len(failed_accounts) > 0:
         print("---------------------------------------------------------------")
         print("Failed Accounts")
@@ -27,6 +27,15 @@ import time
 
 from botocore.exceptions import ClientError
 
+# Clients shared by every account and region of the run
+client_pool = utils.ClientPool(rate_limiter=utils.RateLimiter(operation_rates=utils.OPERATION_RATE_LIMITS))
+
+# Credentials of the assumed roles, shared by every assume_role call of the run
+credential_cache = utils.CredentialCache('DisableSecurityHubNIST80053', client_pool=client_pool)
+
+# Progress events of the run, written by a background thread
+events = utils.EventLog()
+
 NIST80053_ARN_BASE = 'subscription/nist-800-53/v/5.0.0'
 
 def assume_role(aws_account_number, role_name):
@@ -38,31 +47,12 @@ def assume_role(aws_account_number, role_name):
     :return: SecurityHub client in the specified AWS Account and Region
     """
 
-    # Beginning the assume role process for account
-    sts_client = boto3.client('sts')
-
-    # Get the current partition
-    partition = sts_client.get_caller_identity()['Arn'].split(":")[1]
+    # Sessions are cached by role ARN and refresh their credentials before they expire
+    start_time = time.time()
+    session = credential_cache.get_session(aws_account_number, role_name)
 
-    response = sts_client.assume_role(
-        RoleArn='arn:{}:iam::{}:role/{}'.format(
-            partition,
-            aws_account_number,
-            role_name
-        ),
-        RoleSessionName='DisableSecurityHubNIST80053'
-    )
-
-    # Storing STS credentials
-    session = boto3.Session(
-        aws_access_key_id=response['Credentials']['AccessKeyId'],
-        aws_secret_access_key=response['Credentials']['SecretAccessKey'],
-        aws_session_token=response['Credentials']['SessionToken']
-    )
-
-    print("Assumed session for {}.".format(
-        aws_account_number
-    ))
+    events.emit('assume_role', 'succeeded', account=aws_account_number, duration=time.time() - start_time,
+                message="Assumed session for {}.".format(aws_account_number))
 
     return session
 
@@ -72,10 +62,18 @@ if __name__ == '__main__':
     # Setup command line arguments
     parser = argparse.ArgumentParser(description='Disable NIST 800-53 security standard in Security Hub accounts')
     parser.add_argument('--assume_role', type=str, required=True, help="Role Name to assume in each account.")
-    parser.add_argument('--disable_regions', type=str, required=True, help="Comma separated list of regions to disable NIST 800-53. If not specified, all available regions disabled.")
+    parser.add_argument('--disable_regions', type=str, required=False, help="Comma separated list of regions to disable NIST 800-53. If not specified, the regions enabled for the account running the script.")
     parser.add_argument('--input_file', type=argparse.FileType('r'), help='Path to txt file containing the list of account IDs.')
+    parser.add_argument('--credentials_cache', type=str, required=False, help="Optional path of a file caching assumed role credentials between runs")
+    utils.add_client_arguments(parser)
+    utils.add_event_arguments(parser)
+    utils.add_region_arguments(parser)
     args = parser.parse_args()
 
+    credential_cache.cache_file = args.credentials_cache
+    events.open(args.events_file)
+    utils.configure_clients(client_pool, args)
+
     # Generate account list
     aws_account_list = []
 
@@ -94,7 +92,7 @@ if __name__ == '__main__':
         securityhub_regions = [str(item) for item in args.disable_regions.split(',')]
         print("Disabling members in these regions: {}".format(securityhub_regions))
     else:
-        securityhub_regions = session.get_available_regions('securityhub')
+        securityhub_regions = utils.get_eligible_regions(session, 'securityhub', args.regions_cache, args.regions_cache_ttl, client_pool, not args.all_available_regions, events)
         print("Disabling NIST 800-53 in all available SecurityHub regions {}".format(securityhub_regions))
 
 
@@ -103,34 +101,33 @@ if __name__ == '__main__':
     for account in aws_account_list:
         try:
 
-            print('***********Account Loop***************')
             session = assume_role(account, args.assume_role)
             
             for aws_region in securityhub_regions:
-                print('-----------Region Loop--------------')
-                print('Beginning {account} in {region}'.format(
-                    account=account,
-                    region=aws_region
-                ))
+                start_time = time.time()
+                events.emit('disable_nist80053', 'started', account=account, region=aws_region,
+                            message='Beginning {account} in {region}'.format(account=account, region=aws_region))
 
-                sh_client = session.client('securityhub', region_name=aws_region)
+                sh_client = client_pool.client(session, 'securityhub', aws_region)
                 try:
                 
-                    print('Disabling NIST 800-53')
                     NIST80053_ARN = 'arn:aws:securityhub:{}:{}:{}'.format(aws_region, account, NIST80053_ARN_BASE)
                     sh_client.batch_disable_standards(StandardsSubscriptionArns=[NIST80053_ARN])
-                    print("Finished disabling NIST800-53 on account {} for region {}".format(account, aws_region))
+                    events.emit('disable_nist80053', 'succeeded', account=account, region=aws_region, duration=time.time() - start_time,
+                                message="Finished disabling NIST800-53 on account {} for region {}".format(account, aws_region))
                 except ClientError as e:
-                    print("Error disabling NIST800-53 for account {}".format(account))
+                    events.emit('disable_nist80053', 'failed', account=account, region=aws_region, duration=time.time() - start_time, error=e,
+                                message="Error disabling NIST800-53 for account {}".format(account))
                     failed_accounts.append({ account : repr(e)})
 
     
         except ClientError as e:
-            print("Error Processing Account {}".format(account))
+            events.emit('disable_nist80053', 'failed', account=account, error=e, message="Error Processing Account {}".format(account))
             failed_accounts.append({
                 account: repr(e)
             })
 
+    events.flush()
     if len(failed_accounts) > 0:
         print("---------------------------------------------------------------")
         print("Failed Accounts")
@@ -27,6 +27,15 @@ import time
 
 from botocore.exceptions import ClientError
 
+# Clients shared by every account and region of the run
+client_pool = utils.ClientPool(rate_limiter=utils.RateLimiter(operation_rates=utils.OPERATION_RATE_LIMITS))
+
+# Credentials of the assumed roles, shared by every assume_role call of the run
+credential_cache = utils.CredentialCache('EnableSecurityHubNIST80053', client_pool=client_pool)
+
+# Progress events of the run, written by a background thread
+events = utils.EventLog()
+
 NIST80053_ARN_BASE = 'standards/nist-800-53/v/5.0.0'
 
 def assume_role(aws_account_number, role_name):
@@ -38,31 +47,12 @@ def assume_role(aws_account_number, role_name):
     :return: SecurityHub client in the specified AWS Account and Region
     """
 
-    # Beginning the assume role process for account
-    sts_client = boto3.client('sts')
-
-    # Get the current partition
-    partition = sts_client.get_caller_identity()['Arn'].split(":")[1]
+    # Sessions are cached by role ARN and refresh their credentials before they expire
+    start_time = time.time()
+    session = credential_cache.get_session(aws_account_number, role_name)
 
-    response = sts_client.assume_role(
-        RoleArn='arn:{}:iam::{}:role/{}'.format(
-            partition,
-            aws_account_number,
-            role_name
-        ),
-        RoleSessionName='EnableSecurityHubNIST80053'
-    )
-
-    # Storing STS credentials
-    session = boto3.Session(
-        aws_access_key_id=response['Credentials']['AccessKeyId'],
-        aws_secret_access_key=response['Credentials']['SecretAccessKey'],
-        aws_session_token=response['Credentials']['SessionToken']
-    )
-
-    print("Assumed session for {}.".format(
-        aws_account_number
-    ))
+    events.emit('assume_role', 'succeeded', account=aws_account_number, duration=time.time() - start_time,
+                message="Assumed session for {}.".format(aws_account_number))
 
     return session
 
@@ -72,10 +62,18 @@ if __name__ == '__main__':
     # Setup command line arguments
     parser = argparse.ArgumentParser(description='Enable NIST 800-53 security standard in Security Hub accounts')
     parser.add_argument('--assume_role', type=str, required=True, help="Role Name to assume in each account.")
-    parser.add_argument('--enabled_regions', type=str, required=True, help="Comma separated list of regions to enable NIST 800-53. If not specified, all available regions enabled.")
+    parser.add_argument('--enabled_regions', type=str, required=False, help="Comma separated list of regions to enable NIST 800-53. If not specified, the regions enabled for the account running the script.")
     parser.add_argument('--input_file', type=argparse.FileType('r'), help='Path to txt file containing the list of account IDs.')
+    parser.add_argument('--credentials_cache', type=str, required=False, help="Optional path of a file caching assumed role credentials between runs")
+    utils.add_client_arguments(parser)
+    utils.add_event_arguments(parser)
+    utils.add_region_arguments(parser)
     args = parser.parse_args()
 
+    credential_cache.cache_file = args.credentials_cache
+    events.open(args.events_file)
+    utils.configure_clients(client_pool, args)
+
     # Generate account list
     aws_account_list = []
 
@@ -94,7 +92,7 @@ if __name__ == '__main__':
         securityhub_regions = [str(item) for item in args.enabled_regions.split(',')]
         print("Enabling members in these regions: {}".format(securityhub_regions))
     else:
-        securityhub_regions = session.get_available_regions('securityhub')
+        securityhub_regions = utils.get_eligible_regions(session, 'securityhub', args.regions_cache, args.regions_cache_ttl, client_pool, not args.all_available_regions, events)
         print("Enabling NIST 800-53 in all available SecurityHub regions {}".format(securityhub_regions))
 
 
@@ -103,51 +101,45 @@ if __name__ == '__main__':
     for account in aws_account_list:
         try:
 
-            print('***********Account Loop***************')
             session = assume_role(account, args.assume_role)
             
             for aws_region in securityhub_regions:
-                print('-----------Region Loop--------------')
-                print('Beginning {account} in {region}'.format(
-                    account=account,
-                    region=aws_region
-                ))
+                start_time = time.time()
+                events.emit('enable_nist80053', 'started', account=account, region=aws_region,
+                            message='Beginning {account} in {region}'.format(account=account, region=aws_region))
 
-                sh_client = session.client('securityhub', region_name=aws_region)
+                sh_client = client_pool.client(session, 'securityhub', aws_region)
                 
-                print('Enabling NIST 800-53')
                 NIST80053_ARN = 'arn:aws:securityhub:{}::{}'.format(aws_region, NIST80053_ARN_BASE)
-                sh_client.batch_enable_standards(StandardsSubscriptionRequests=[{'StandardsArn': NIST80053_ARN}])
+                response = sh_client.batch_enable_standards(StandardsSubscriptionRequests=[{'StandardsArn': NIST80053_ARN}])
 
-                print('Verifying the standard is enabled')
                 # Verify standards get enabled
-                standards_status = {}
-                start_time = int(time.time())
-                standard_enabled = False
-                while standard_enabled == False:
-                    
-                    if (int(time.time()) - start_time) > 100:
-                        print("Timeout waiting for READY state enabling NIST 800-53 in region {region} for account {account}, last state: {status}"
-                              .format(region=aws_region, account=account, status=standards_status))
-                        break
-                    
-                    enabled_standards = sh_client.get_enabled_standards()
-                    
-                    for enabled_standard in enabled_standards['StandardsSubscriptions']:
-                        enabled_standard_arn = enabled_standard['StandardsArn']
-                        enabled_standard_status = enabled_standard['StandardsStatus']
-                        standards_status[enabled_standard_arn] = enabled_standard_status
-                        
-                        if enabled_standard_arn == NIST80053_ARN and enabled_standard_status == 'READY':
-                            print("Finished enabling standard NIST 800-53 on account {} for region {}".format(account, aws_region))
-                            standard_enabled = True
+                subscription_arns = [subscription['StandardsSubscriptionArn'] for subscription in response['StandardsSubscriptions']]
+                standards_wait = utils.wait_for_standards_ready(sh_client, subscription_arns)
+                if standards_wait.ready:
+                    events.emit('enable_nist80053', 'succeeded', account=account, region=aws_region, duration=time.time() - start_time, polls=standards_wait.polls,
+                                message="Finished enabling standard NIST 800-53 on account {} for region {} after {} polls in {:.1f}s".format(account, aws_region, standards_wait.polls, standards_wait.elapsed))
+                elif standards_wait.outcome == 'FAILED':
+                    events.emit('enable_nist80053', 'failed', account=account, region=aws_region, duration=time.time() - start_time, polls=standards_wait.polls,
+                                standards_status=standards_wait.status,
+                                message="FAILED state enabling NIST 800-53 in region {region} for account {account} after {polls} polls in {elapsed:.1f}s, last state: {status}"
+                                .format(region=aws_region, account=account, polls=standards_wait.polls, elapsed=standards_wait.elapsed, status=standards_wait.status))
+                    failed_accounts.append({
+                        account: "NIST 800-53 FAILED in {}: {}".format(aws_region, standards_wait.status)
+                    })
+                else:
+                    events.emit('enable_nist80053', 'timeout', account=account, region=aws_region, duration=time.time() - start_time, polls=standards_wait.polls,
+                                standards_status=standards_wait.status,
+                                message="Timeout waiting for READY state enabling NIST 800-53 in region {region} for account {account} after {polls} polls in {elapsed:.1f}s, last state: {status}"
+                                .format(region=aws_region, account=account, polls=standards_wait.polls, elapsed=standards_wait.elapsed, status=standards_wait.status))
     
         except ClientError as e:
-            print("Error Processing Account {}".format(account))
+            events.emit('enable_nist80053', 'failed', account=account, error=e, message="Error Processing Account {}".format(account))
             failed_accounts.append({
                 account: repr(e)
             })
 
+    events.flush()
     if len(failed_accounts) > 0:
         print("---------------------------------------------------------------")
         print("Failed Accounts")
@@ -0,0 +1,18 @@
+import os
+import sys
+
+# The client, credential, rate limiting, metrics, event, region and standards helpers shared by every script
+# directory live in the common directory of the repository
+COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'common'))
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
+
+from sharedutils import (StandardsWait, ClientPool, CredentialCache, EventLog, RateLimiter, add_client_arguments,
+                         add_event_arguments, add_region_arguments, configure_clients, get_eligible_regions,
+                         wait_for_standards_ready)
+
+# Lower rates of the operations called by the scripts of this directory that have a smaller SecurityHub quota,
+# passed to RateLimiter
+OPERATION_RATE_LIMITS = {
+    'BatchEnableStandards': 1
+}
@@ -0,0 +1,88 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import importlib
+import importlib.util
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(directory, module_name):
+    """
+    Loads a module of a directory of the repository. Every script directory has its own utils.py,
+    so each module is loaded under a name prefixed with its directory
+    :param directory: directory relative to the repository root, e.g. multiaccount-enable
+    :param module_name: name of the module file without its .py extension, e.g. utils
+    :return: the loaded module
+    """
+
+    name = '{}_{}'.format(directory.replace('-', '_'), module_name.replace('-', '_'))
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_DIR, directory, '{}.py'.format(module_name)))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_utils(directory):
+    """
+    Loads the utils.py module of a script directory
+    :param directory: script directory relative to the repository root, e.g. multiaccount-enable
+    :return: the loaded module
+    """
+
+    return load_module(directory, 'utils')
+
+
+def load_shared():
+    """
+    Imports the sharedutils module of the common directory under the name the utils modules import it with
+    :return: the sharedutils module
+    """
+
+    common_dir = os.path.join(REPO_DIR, 'common')
+    if common_dir not in sys.path:
+        sys.path.append(common_dir)
+    return importlib.import_module('sharedutils')
+
+
+def load_script(directory, module_name):
+    """
+    Loads a script of a directory of the repository. Scripts import utils and their other modules by
+    their plain name, so those names resolve to the modules of the script directory while it is loaded
+    :param directory: script directory relative to the repository root, e.g. multiaccount-enable
+    :param module_name: name of the script file without its .py extension, e.g. enablesecurityhub
+    :return: the loaded module
+    """
+
+    script_dir = os.path.join(REPO_DIR, directory)
+    local_names = [os.path.splitext(file_name)[0] for file_name in os.listdir(script_dir) if file_name.endswith('.py')]
+    saved = dict((name, sys.modules.pop(name)) for name in local_names if name in sys.modules)
+    sys.modules['utils'] = load_utils(directory)
+    sys.path.insert(0, script_dir)
+    try:
+        return load_module(directory, module_name)
+    finally:
+        sys.path.remove(script_dir)
+        for name in local_names:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
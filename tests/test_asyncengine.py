@@ -0,0 +1,147 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import asyncio
+import unittest
+
+from botocore.exceptions import EndpointConnectionError
+from loader import load_script
+from unittest import mock
+
+asyncengine = load_script('multiaccount-enable', 'asyncengine')
+
+MASTER = '999999999999'
+REGIONS = ['us-east-1', 'eu-west-1']
+
+
+def unreachable(region):
+    return EndpointConnectionError(endpoint_url='https://securityhub.{}.amazonaws.com/'.format(region))
+
+
+class FakePaginator(object):
+
+    async def paginate(self, **params):
+        yield {'Members': []}
+
+
+class FakeSecurityHub(object):
+    """
+    aiobotocore SecurityHub client of an account and region, whose endpoint can be unreachable
+    """
+
+    def __init__(self, fleet, account, region):
+        self.fleet = fleet
+        self.account = account
+        self.region = region
+
+    def get_paginator(self, operation):
+        return FakePaginator()
+
+    async def disable_security_hub(self):
+        if (self.account, self.region) in self.fleet.unreachable:
+            raise unreachable(self.region)
+        self.fleet.disabled.append((self.account, self.region))
+
+
+class FakeFleet(object):
+    """
+    Client pool and credential cache of the engine, sessions being the account numbers
+    """
+
+    def __init__(self, unreachable=(), unreachable_sts=()):
+        self.unreachable = unreachable
+        self.unreachable_sts = unreachable_sts
+        self.disabled = []
+
+    async def client(self, session, service_name, region_name=None):
+        return FakeSecurityHub(self, session, region_name)
+
+    async def release(self, session):
+        pass
+
+    async def get_session(self, account, role_name):
+        if account in self.unreachable_sts:
+            raise EndpointConnectionError(endpoint_url='https://sts.amazonaws.com/')
+        return account
+
+
+class FakeEventLog(object):
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, step, status, account=None, region=None, **fields):
+        self.events.append((step, status, account, region))
+
+
+class FakeMemberCache(object):
+
+    def __init__(self):
+        self.refreshes = 0
+
+    async def refresh(self, account_ids):
+        self.refreshes += 1
+        raise unreachable('eu-west-1')
+
+
+def create_engine(events):
+    with mock.patch.object(asyncengine, 'check_available'):
+        return asyncengine.AsyncEngine('DisableSecurityHub', events, client_settings=None)
+
+
+async def bind(engine, fleet):
+    engine.pool = fleet
+    engine.credential_cache = fleet
+    engine.limit = asyncio.Semaphore(10)
+
+
+class BotoCoreErrorTest(unittest.TestCase):
+
+    def test_unreachable_unit_only_fails_itself(self):
+        events = FakeEventLog()
+        engine = create_engine(events)
+        fleet = FakeFleet(unreachable=[('111111111111', 'eu-west-1')], unreachable_sts=['333333333333'])
+        accounts = dict((account, '{}@example.com'.format(account)) for account in ('111111111111', '222222222222', '333333333333'))
+
+        async def disable():
+            await bind(engine, fleet)
+            return await engine.disable(MASTER, accounts, REGIONS, 'ManageSecurityHub')
+
+        failed_accounts = asyncio.run(disable())
+        self.assertEqual([list(failure) for failure in failed_accounts], [['111111111111'], ['333333333333']])
+        self.assertIn('EndpointConnectionError', failed_accounts[0]['111111111111'])
+        self.assertEqual(sorted(fleet.disabled), [('111111111111', 'us-east-1'), ('222222222222', 'eu-west-1'), ('222222222222', 'us-east-1')])
+        self.assertIn(('disable', 'failed', '111111111111', 'eu-west-1'), events.events)
+        self.assertIn(('disable', 'failed', '333333333333', None), events.events)
+
+    def test_unreachable_refresh_releases_waiters(self):
+        events = FakeEventLog()
+        engine = create_engine(events)
+        member_cache = FakeMemberCache()
+
+        async def wait():
+            await bind(engine, FakeFleet())
+            reconciler = asyncengine.AsyncMembershipReconciler(engine, member_cache, 'eu-west-1', interval=0.01)
+            return await asyncio.gather(reconciler.wait_for_refresh('1', 5), reconciler.wait_for_refresh('2', 5))
+
+        self.assertEqual(asyncio.run(wait()), [True, True])
+        self.assertEqual(member_cache.refreshes, 1)
+        self.assertEqual(events.events, [('refresh_members', 'failed', None, 'eu-west-1')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import datetime
+import unittest
+
+from dateutil.tz import tzutc
+from loader import load_utils
+
+utils = load_utils('automation_rules')
+
+RULE = {
+    'RuleName': 'suppress-low',
+    'RuleStatus': 'ENABLED',
+    'RuleOrder': 1,
+    'Description': 'Suppress low severity findings',
+    'Criteria': {
+        'SeverityLabel': [{'Value': 'LOW', 'Comparison': 'EQUALS'}],
+        'CreatedAt': [{'Start': '2026-01-01T00:00:00Z', 'End': '2026-06-01T02:00:00+02:00'}]
+    },
+    'Actions': [{'Type': 'FINDING_FIELDS_UPDATE', 'FindingFieldsUpdate': {'Workflow': {'Status': 'SUPPRESSED'}}}]
+}
+
+
+def deployed(**changes):
+    """
+    :return: the AutomationRulesConfig SecurityHub returns for RULE, with changed fields
+    """
+
+    rule = {
+        'RuleArn': 'arn:aws:securityhub:eu-west-1:111122223333:automation-rule/1',
+        'RuleName': RULE['RuleName'],
+        'RuleStatus': 'ENABLED',
+        'RuleOrder': 1.0,
+        'Description': RULE['Description'],
+        'IsTerminal': None,
+        'Criteria': {
+            'SeverityLabel': [{'Value': 'LOW', 'Comparison': 'EQUALS'}],
+            'CreatedAt': [{'Start': datetime.datetime(2026, 1, 1, tzinfo=tzutc()), 'End': datetime.datetime(2026, 6, 1, tzinfo=tzutc()), 'DateRange': None}],
+            'ResourceType': []
+        },
+        'Actions': [{'Type': 'FINDING_FIELDS_UPDATE', 'FindingFieldsUpdate': {'Workflow': {'Status': 'SUPPRESSED'}, 'Note': {}}}]
+    }
+    rule.update(changes)
+    return rule
+
+
+class NormalizeRuleValueTest(unittest.TestCase):
+
+    def test_timestamps(self):
+        self.assertEqual(utils.normalize_rule_value('2026-06-01T02:00:00+02:00', 'End'), datetime.datetime(2026, 6, 1, tzinfo=tzutc()))
+        self.assertEqual(utils.normalize_rule_value(datetime.datetime(2026, 6, 1), 'Start'), datetime.datetime(2026, 6, 1, tzinfo=tzutc()))
+        self.assertEqual(utils.normalize_rule_value('2026-06-01T02:00:00+02:00', 'Value'), '2026-06-01T02:00:00+02:00')
+
+    def test_numbers(self):
+        self.assertEqual(utils.normalize_rule_value(1.0), 1)
+        self.assertEqual(utils.normalize_rule_value(1.5), 1.5)
+
+    def test_empty_values(self):
+        self.assertEqual(utils.normalize_rule_value({'a': None, 'b': [], 'c': {}, 'd': [{}]}), {'d': [{}]})
+
+
+class PlanRulesTest(unittest.TestCase):
+
+    def test_create(self):
+        self.assertEqual(utils.plan_rules([RULE], {}), ([RULE], [], []))
+
+    def test_unchanged(self):
+        self.assertEqual(utils.plan_rules([RULE], {RULE['RuleName']: deployed()}), ([], [], [RULE['RuleName']]))
+
+    def test_update(self):
+        to_create, to_update, unchanged = utils.plan_rules([RULE], {RULE['RuleName']: deployed(RuleOrder=2.0, RuleStatus='DISABLED')})
+        self.assertEqual((to_create, unchanged), ([], []))
+        self.assertEqual(to_update, [{'RuleArn': deployed()['RuleArn'], 'RuleOrder': 1, 'RuleStatus': 'ENABLED'}])
+
+    def test_fields_not_in_definition(self):
+        self.assertEqual(utils.plan_rules([RULE], {RULE['RuleName']: deployed(IsTerminal=True)}), ([], [], [RULE['RuleName']]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import unittest
+
+from botocore.exceptions import ClientError
+from loader import load_utils
+
+utils = load_utils('cis14-enable')
+
+STANDARDS_ARN = 'arn:aws:securityhub:eu-west-1::standards/cis-aws-foundations-benchmark/v/1.4.0'
+
+
+def control_arn(account, control):
+    return 'arn:aws:securityhub:eu-west-1:{}:control/cis-aws-foundations-benchmark/v/1.4.0/{}'.format(account, control)
+
+
+class FakePaginator(object):
+
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, **params):
+        self.client.calls.append(self.operation)
+        yield {'SecurityControlDefinitions': [{'SecurityControlId': security_control_id} for security_control_id in self.client.security_control_ids]}
+
+
+class FakeSecurityHub(object):
+    """
+    SecurityHub client of an account exposing the CIS 1.4 controls mapped to security control IDs
+    """
+
+    def __init__(self, account, security_controls, unprocessed=()):
+        self.account = account
+        self.security_controls = security_controls
+        self.security_control_ids = sorted(set(security_controls.values()))
+        self.unprocessed = unprocessed
+        self.calls = []
+        self.updates = []
+
+    def get_paginator(self, operation):
+        return FakePaginator(self, operation)
+
+    def batch_get_standards_control_associations(self, StandardsControlAssociationIds):
+        self.calls.append('batch_get_standards_control_associations')
+        return {'StandardsControlAssociationDetails': [{
+            'SecurityControlId': association['SecurityControlId'],
+            'StandardsControlArns': [control_arn(self.account, control) for control, security_control_id in sorted(self.security_controls.items())
+                                     if security_control_id == association['SecurityControlId']]
+        } for association in StandardsControlAssociationIds]}
+
+    def batch_update_standards_control_associations(self, StandardsControlAssociationUpdates):
+        self.calls.append('batch_update_standards_control_associations')
+        self.updates.extend(update['SecurityControlId'] for update in StandardsControlAssociationUpdates)
+        return {'UnprocessedAssociationUpdates': [
+            {'StandardsControlAssociationUpdate': update, 'ErrorCode': 'ResourceNotFoundException', 'ErrorReason': 'not found'}
+            for update in StandardsControlAssociationUpdates if update['SecurityControlId'] in self.unprocessed
+        ]}
+
+    def update_standards_control(self, StandardsControlArn, ControlStatus, DisabledReason):
+        self.calls.append('update_standards_control')
+        if StandardsControlArn.endswith('/5.9'):
+            raise ClientError({'Error': {'Code': 'InvalidInputException', 'Message': 'invalid'}}, 'UpdateStandardsControl')
+
+
+class DisableStandardsControlsTest(unittest.TestCase):
+
+    def test_batched(self):
+        client = FakeSecurityHub('111122223333', {'1.7': 'IAM.1', '1.8': 'IAM.2', '4.1': 'CloudWatch.1'})
+        failures = utils.disable_standards_controls(client, STANDARDS_ARN, [control_arn('111122223333', control) for control in ('1.7', '1.8', '4.1')], 'mapped')
+        self.assertEqual(failures, {})
+        self.assertEqual(client.updates, ['IAM.1', 'IAM.2', 'CloudWatch.1'])
+        self.assertEqual(client.calls.count('batch_update_standards_control_associations'), 1)
+
+    def test_batch_size(self):
+        controls = dict(('1.{}'.format(number), 'Control.{}'.format(number)) for number in range(utils.CONTROL_ASSOCIATIONS_BATCH_SIZE + 1))
+        client = FakeSecurityHub('111122223333', controls)
+        utils.disable_standards_controls(client, STANDARDS_ARN, [control_arn('111122223333', control) for control in controls], 'mapped')
+        self.assertEqual(client.calls.count('batch_update_standards_control_associations'), 2)
+        self.assertEqual(utils.get_batch_calls(len(controls)), 2)
+
+    def test_failures(self):
+        client = FakeSecurityHub('111122223333', {'1.7': 'IAM.1', '1.8': 'IAM.2'}, unprocessed=['IAM.2'])
+        control_arns = [control_arn('111122223333', control) for control in ('1.7', '1.8', '5.9')]
+        failures = utils.disable_standards_controls(client, STANDARDS_ARN, control_arns, 'mapped')
+        self.assertEqual(failures, {
+            control_arns[1]: 'ResourceNotFoundException: not found',
+            control_arns[2]: 'InvalidInputException: An error occurred (InvalidInputException) when calling the UpdateStandardsControl operation: invalid'
+        })
+        self.assertEqual(client.calls.count('update_standards_control'), 1)
+
+
+class SecurityControlIdCacheTest(unittest.TestCase):
+
+    def test_shared_by_accounts(self):
+        cache = utils.SecurityControlIdCache()
+        first = FakeSecurityHub('111122223333', {'1.7': 'IAM.1'})
+        second = FakeSecurityHub('444455556666', {'1.7': 'IAM.1'})
+        utils.disable_standards_controls(first, STANDARDS_ARN, [control_arn('111122223333', '1.7')], 'mapped', cache)
+        utils.disable_standards_controls(second, STANDARDS_ARN, [control_arn('444455556666', '1.7')], 'mapped', cache)
+        self.assertEqual(second.updates, ['IAM.1'])
+        self.assertNotIn('list_security_control_definitions', second.calls)
+        self.assertEqual(cache.get(second, STANDARDS_ARN), {'control/cis-aws-foundations-benchmark/v/1.4.0/1.7': 'IAM.1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
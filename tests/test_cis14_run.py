@@ -0,0 +1,117 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import threading
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+from loader import load_script, load_utils
+from unittest import mock
+
+utils = load_utils('cis14-enable')
+enablecis14 = load_script('cis14-enable', 'enablecis14')
+
+ACCOUNT = '111122223333'
+REGION = 'eu-west-1'
+
+
+class RunWithRegionLimitsTest(unittest.TestCase):
+
+    def test_limits(self):
+        units = [(str(account), region) for region in ('us-east-1', 'eu-west-1', 'ap-south-1') for account in range(6)]
+        lock = threading.Lock()
+        running = {}
+        peaks = {'total': 0}
+
+        def function(account, region):
+            with lock:
+                running[region] = running.get(region, 0) + 1
+                peaks[region] = max(peaks.get(region, 0), running[region])
+                peaks['total'] = max(peaks['total'], sum(running.values()))
+            time.sleep(0.01)
+            with lock:
+                running[region] -= 1
+            return account, region
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = utils.run_with_region_limits(executor, units, function, max_workers=4, max_workers_per_region=2)
+
+        self.assertEqual(list(futures), units)
+        self.assertEqual([future.result() for future in futures.values()], units)
+        self.assertLessEqual(peaks.pop('total'), 4)
+        self.assertTrue(all(peak <= 2 for peak in peaks.values()))
+
+
+class FakeSecurityHub(object):
+
+    def __init__(self):
+        self.disabled = []
+
+    def batch_enable_standards(self, StandardsSubscriptionRequests):
+        return {'StandardsSubscriptions': [{'StandardsSubscriptionArn': 'arn:aws:securityhub:eu-west-1:111122223333:subscription/cis-aws-foundations-benchmark/v/1.4.0'}]}
+
+    def batch_disable_standards(self, StandardsSubscriptionArns):
+        self.disabled.extend(StandardsSubscriptionArns)
+
+
+class FakeClientPool(object):
+
+    def __init__(self, client):
+        self.sh_client = client
+
+    def client(self, session, service_name, region_name=None):
+        return self.sh_client
+
+
+class FakeEventLog(object):
+
+    def emit(self, step, status, **fields):
+        pass
+
+
+class ProcessAccountRegionTest(unittest.TestCase):
+
+    def process(self, outcome):
+        sh_client = FakeSecurityHub()
+        standards_wait = utils.StandardsWait(outcome == 'READY', outcome, {}, 3, 100.0)
+        with mock.patch.object(enablecis14, 'client_pool', FakeClientPool(sh_client)), \
+                mock.patch.object(enablecis14, 'events', FakeEventLog()), \
+                mock.patch.object(enablecis14.utils, 'wait_for_standards_ready', return_value=standards_wait), \
+                ThreadPoolExecutor(max_workers=1) as wait_executor:
+            result = enablecis14.process_account_region(ACCOUNT, REGION, None, 'No', 'Yes', wait_executor)
+        return result, sh_client.disabled
+
+    def test_ready(self):
+        result, disabled = self.process('READY')
+        self.assertEqual((result['status'], result['cis12_disabled'], result['error']), ('succeeded', True, None))
+        self.assertEqual(len(disabled), 1)
+
+    def test_timeout_keeps_cis12(self):
+        result, disabled = self.process('TIMEOUT')
+        self.assertEqual((result['status'], result['cis14_outcome'], result['cis12_disabled']), ('timeout', 'TIMEOUT', False))
+        self.assertIn('not READY', result['error'])
+        self.assertEqual(disabled, [])
+
+    def test_failed_keeps_cis12(self):
+        result, disabled = self.process('FAILED')
+        self.assertEqual((result['status'], result['cis12_disabled']), ('failed', False))
+        self.assertEqual(disabled, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from loader import load_utils
+
+utils = load_utils('cis14-enable')
+
+SUBSCRIPTION_ARN = 'arn:aws:securityhub:eu-west-1:111122223333:subscription/cis-aws-foundations-benchmark/v/1.4.0'
+
+
+class FakePaginator(object):
+
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, StandardsSubscriptionArn):
+        self.client.describes.append(StandardsSubscriptionArn)
+        for page in self.client.pages:
+            yield {'Controls': page}
+
+
+class FakeSecurityHub(object):
+    """
+    SecurityHub client answering describe_standards_controls with fixed pages
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.describes = []
+
+    def get_paginator(self, operation):
+        assert operation == 'describe_standards_controls'
+        return FakePaginator(self)
+
+
+class ControlStatusCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'controls.jsonl')
+        self.client = FakeSecurityHub([
+            [{'ControlId': 'CIS.1.1', 'ControlStatus': 'ENABLED'}],
+            [{'ControlId': 'CIS.1.2', 'ControlStatus': 'DISABLED'}]
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_all_pages(self):
+        controls = utils.ControlStatusCache().get_control_statuses(self.client, SUBSCRIPTION_ARN)
+        self.assertEqual(list(controls.items()), [('CIS.1.1', 'ENABLED'), ('CIS.1.2', 'DISABLED')])
+
+    def test_in_memory(self):
+        cache = utils.ControlStatusCache()
+        cache.get_control_statuses(self.client, SUBSCRIPTION_ARN)
+        cache.get_control_statuses(self.client, SUBSCRIPTION_ARN)
+        self.assertEqual(self.client.describes, [SUBSCRIPTION_ARN])
+
+    def test_persisted(self):
+        utils.ControlStatusCache(self.path).get_control_statuses(self.client, SUBSCRIPTION_ARN)
+        controls = utils.ControlStatusCache(self.path).get_control_statuses(self.client, SUBSCRIPTION_ARN)
+        self.assertEqual(controls, {'CIS.1.1': 'ENABLED', 'CIS.1.2': 'DISABLED'})
+        self.assertEqual(self.client.describes, [SUBSCRIPTION_ARN])
+
+    def test_expired(self):
+        expired = {'subscription_arn': SUBSCRIPTION_ARN, 'controls': {'CIS.1.1': 'DISABLED'}, 'described_at': time.time() - 10}
+        with open(self.path, 'w') as cache_file:
+            cache_file.write(json.dumps(expired) + '\n')
+            cache_file.write('{"subscription_arn": ')
+
+        controls = utils.ControlStatusCache(self.path, ttl=5).get_control_statuses(self.client, SUBSCRIPTION_ARN)
+        self.assertEqual(controls['CIS.1.1'], 'ENABLED')
+        self.assertEqual(self.client.describes, [SUBSCRIPTION_ARN])
+        with open(self.path) as cache_file:
+            self.assertEqual([json.loads(line)['controls']['CIS.1.1'] for line in cache_file], ['ENABLED'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import boto3
+import time
+import unittest
+
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from loader import load_module
+
+fleet = load_module('benchmarks', 'fleet')
+
+REGION = 'eu-west-1'
+MEMBER = '111122223333'
+
+# Single attempt clients, so throttled calls fail instead of being retried
+NO_RETRIES = Config(retries={'mode': 'standard', 'total_max_attempts': 1})
+
+
+def securityhub(account=fleet.ADMIN_ACCOUNT):
+    """
+    :return: SecurityHub client sending its requests as the account
+    """
+
+    prefix = 'AKIA' if account == fleet.ADMIN_ACCOUNT else fleet.ASSUMED_KEY_PREFIX
+    session = boto3.Session(aws_access_key_id=prefix + account, aws_secret_access_key='test', aws_session_token='test', region_name=REGION)
+    return session.client('securityhub', config=NO_RETRIES)
+
+
+class SimulatedFleetTest(unittest.TestCase):
+
+    def test_members_are_paginated(self):
+        simulated = fleet.SimulatedFleet()
+        simulated.enable_hub(fleet.ADMIN_ACCOUNT, REGION)
+        for number in range(fleet.MEMBERS_PAGE_SIZE + 1):
+            simulated.add_member(fleet.ADMIN_ACCOUNT, '{:012d}'.format(number), REGION)
+
+        with simulated.installed():
+            client = securityhub()
+            first = client.list_members(OnlyAssociated=False)
+            second = client.list_members(OnlyAssociated=False, NextToken=first['NextToken'])
+
+        self.assertEqual(len(first['Members']), fleet.MEMBERS_PAGE_SIZE)
+        self.assertEqual([member['AccountId'] for member in second['Members']], ['{:012d}'.format(fleet.MEMBERS_PAGE_SIZE)])
+        self.assertNotIn('NextToken', second)
+        self.assertEqual(simulated.calls[('securityhub', 'ListMembers')], 2)
+
+    def test_invitations_are_eventually_consistent(self):
+        simulated = fleet.SimulatedFleet(invite_delay=0.5)
+        simulated.enable_hub(fleet.ADMIN_ACCOUNT, REGION)
+        simulated.enable_hub(MEMBER, REGION)
+
+        with simulated.installed():
+            admin_client, member_client = securityhub(), securityhub(MEMBER)
+            admin_client.create_members(AccountDetails=[{'AccountId': MEMBER}])
+            admin_client.invite_members(AccountIds=[MEMBER])
+            self.assertEqual(member_client.list_invitations()['Invitations'], [])
+            time.sleep(0.5)
+            invitations = member_client.list_invitations()['Invitations']
+
+        self.assertEqual([invitation['AccountId'] for invitation in invitations], [fleet.ADMIN_ACCOUNT])
+
+    def test_standards_stay_pending(self):
+        simulated = fleet.SimulatedFleet(standards_delay=60)
+        simulated.enable_hub(MEMBER, REGION)
+
+        with simulated.installed():
+            client = securityhub(MEMBER)
+            subscriptions = client.batch_enable_standards(StandardsSubscriptionRequests=[
+                {'StandardsArn': simulated.regional_standard(REGION, fleet.CIS14_STANDARD)}
+            ])['StandardsSubscriptions']
+            enabled = client.get_enabled_standards(StandardsSubscriptionArns=[subscriptions[0]['StandardsSubscriptionArn']])
+
+        self.assertEqual([subscription['StandardsStatus'] for subscription in enabled['StandardsSubscriptions']], ['PENDING'])
+
+    def test_throttling(self):
+        simulated = fleet.SimulatedFleet(throttle_rate=1, throttle_burst=2)
+        simulated.enable_hub(MEMBER, REGION)
+
+        with simulated.installed():
+            client = securityhub(MEMBER)
+            client.get_enabled_standards()
+            client.get_enabled_standards()
+            with self.assertRaises(ClientError) as raised:
+                client.get_enabled_standards()
+
+        self.assertEqual(raised.exception.response['Error']['Code'], fleet.THROTTLING_ERRORS['rest-json'][0])
+        self.assertEqual(simulated.calls[('securityhub', 'GetEnabledStandards')], 3)
+        self.assertEqual(simulated.throttled[('securityhub', 'GetEnabledStandards')], 1)
+
+    def test_error_responses(self):
+        simulated = fleet.SimulatedFleet()
+
+        with simulated.installed():
+            with self.assertRaises(ClientError) as raised:
+                securityhub(MEMBER).get_enabled_standards()
+
+        self.assertEqual(raised.exception.response['Error']['Code'], 'InvalidAccessException')
+
+    def test_uninstall(self):
+        original = fleet.botocore.client.ClientCreator.create_client
+        with fleet.SimulatedFleet().installed():
+            self.assertIsNot(fleet.botocore.client.ClientCreator.create_client, original)
+        self.assertIs(fleet.botocore.client.ClientCreator.create_client, original)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from loader import load_script, load_utils
+from unittest import mock
+
+utils = load_utils('multiaccount-enable')
+enablesecurityhub = load_script('multiaccount-enable', 'enablesecurityhub')
+
+ACCOUNT = '111122223333'
+REGION = 'eu-west-1'
+FSBP_RESOURCE = 'standards/aws-foundational-security-best-practices/v/1.0.0'
+PARAMETERS = {'standards': [FSBP_RESOURCE]}
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journal.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replay(self):
+        journal = utils.Journal(self.path, parameters=PARAMETERS)
+        journal.record(ACCOUNT, REGION, 'enable')
+        journal.record(ACCOUNT, REGION, 'link')
+        with open(self.path, 'a') as journal_file:
+            journal_file.write(json.dumps({'account': ACCOUNT, 'region': 'us-east-1', 'step': 'enable'})[:20])
+
+        resumed = utils.Journal(self.path, resume=True, parameters=PARAMETERS)
+        self.assertTrue(resumed.is_done(ACCOUNT, REGION, 'enable'))
+        self.assertTrue(resumed.is_done(ACCOUNT, REGION, 'link'))
+        self.assertFalse(resumed.is_done(ACCOUNT, 'us-east-1', 'enable'))
+
+    def test_other_parameters(self):
+        utils.Journal(self.path, parameters=PARAMETERS).record(ACCOUNT, REGION, 'enable')
+        with self.assertRaises(ValueError):
+            utils.Journal(self.path, resume=True, parameters={'standards': []})
+
+    def test_without_header(self):
+        with open(self.path, 'w') as journal_file:
+            journal_file.write(json.dumps({'account': ACCOUNT, 'region': REGION, 'step': 'enable'}) + '\n')
+        with self.assertRaises(ValueError):
+            utils.Journal(self.path, resume=True, parameters=PARAMETERS)
+
+    def test_no_resume_truncates(self):
+        utils.Journal(self.path, parameters=PARAMETERS).record(ACCOUNT, REGION, 'enable')
+        self.assertFalse(utils.Journal(self.path, parameters=PARAMETERS).is_done(ACCOUNT, REGION, 'enable'))
+        self.assertFalse(utils.Journal(self.path, resume=True, parameters=PARAMETERS).is_done(ACCOUNT, REGION, 'enable'))
+        with open(self.path) as journal_file:
+            self.assertEqual([json.loads(line) for line in journal_file], [{'parameters': PARAMETERS}])
+
+    def test_missing_file(self):
+        self.assertFalse(utils.Journal(self.path, resume=True, parameters=PARAMETERS).is_done(ACCOUNT, REGION, 'enable'))
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_without_path(self):
+        journal = utils.Journal()
+        journal.record(ACCOUNT, REGION, 'enable')
+        self.assertTrue(journal.is_done(ACCOUNT, REGION, 'enable'))
+        self.assertFalse(os.listdir(self.directory))
+
+
+class FakeSecurityHub(object):
+
+    def batch_enable_standards(self, StandardsSubscriptionRequests):
+        return {'StandardsSubscriptions': [{'StandardsSubscriptionArn': request['StandardsArn'].replace('::', ':' + ACCOUNT + ':')}
+                                           for request in StandardsSubscriptionRequests]}
+
+
+class FakeClientPool(object):
+
+    def client(self, session, service_name, region_name=None):
+        return FakeSecurityHub()
+
+
+class FakeEventLog(object):
+
+    def emit(self, step, status, **fields):
+        pass
+
+
+class StandardsOutcomeTest(unittest.TestCase):
+
+    def enable(self, outcome):
+        standards_wait = utils.StandardsWait(outcome == 'READY', outcome, {}, 1, 0.1)
+        with mock.patch.object(enablesecurityhub, 'client_pool', FakeClientPool()), \
+                mock.patch.object(enablesecurityhub, 'events', FakeEventLog()), \
+                mock.patch.object(enablesecurityhub.utils, 'wait_for_standards_ready', return_value=standards_wait):
+            return enablesecurityhub.enable_account_region(ACCOUNT, REGION, None, None, [FSBP_RESOURCE], {'enable_standards': [FSBP_RESOURCE]})
+
+    def test_ready(self):
+        self.assertEqual(self.enable('READY'), ([], True, True))
+
+    def test_timeout_is_not_complete(self):
+        self.assertEqual(self.enable('TIMEOUT'), ([], True, False))
+
+    def test_failed(self):
+        failures, linkable, standards_ready = self.enable('FAILED')
+        self.assertEqual((len(failures), linkable, standards_ready), (1, True, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
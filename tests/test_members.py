@@ -0,0 +1,122 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import threading
+import unittest
+
+from botocore.exceptions import EndpointConnectionError
+from loader import load_script, load_utils
+
+utils = load_utils('multiaccount-enable')
+enablesecurityhub = load_script('multiaccount-enable', 'enablesecurityhub')
+
+REGION = 'eu-west-1'
+
+
+class MembersTest(unittest.TestCase):
+
+    def test_accounts_to_create_and_invite(self):
+        statuses = {'1': 'Enabled', '2': 'Created'}
+        to_create, members = utils.get_accounts_to_create(['1', '2', '3'], statuses.get)
+        self.assertEqual((to_create, members), (['3'], ['1', '2']))
+
+        statuses['3'] = 'Created'
+        self.assertEqual(utils.get_accounts_to_invite(['1', '2', '3'], statuses.get, {'3': 'Unable to add account'}), ['2'])
+
+    def test_unprocessed_accounts(self):
+        response = {'UnprocessedAccounts': [{'AccountId': '3', 'ProcessingResult': 'Invalid email'}]}
+        self.assertEqual(dict(utils.get_unprocessed_accounts(response, 'invite account {}', REGION)),
+                         {'3': 'Unable to invite account 3 in eu-west-1: Invalid email'})
+        self.assertEqual(utils.get_unprocessed_accounts({}, 'invite account {}', REGION), {})
+
+
+class FakeMemberCache(object):
+    """
+    Membership of an administrator account recording the accounts of each refresh
+    """
+
+    def __init__(self, statuses, error=None):
+        self.statuses = statuses
+        self.error = error
+        self.refreshes = []
+
+    def get_status(self, account):
+        return self.statuses.get(account)
+
+    def refresh(self, account_ids):
+        self.refreshes.append(sorted(account_ids))
+        if self.error:
+            raise self.error
+
+
+class FakeEventLog(object):
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, step, status, **fields):
+        self.events.append((step, status))
+
+
+class MembershipReconcilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.events = enablesecurityhub.events
+        enablesecurityhub.events = FakeEventLog()
+
+    def tearDown(self):
+        enablesecurityhub.events = self.events
+
+    def wait_together(self, reconciler, accounts):
+        results = {}
+        barrier = threading.Barrier(len(accounts))
+
+        def wait(account):
+            barrier.wait()
+            results[account] = reconciler.wait_for_refresh(account, 5)
+
+        threads = [threading.Thread(target=wait, args=(account,)) for account in accounts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_one_refresh_for_every_waiting_account(self):
+        member_cache = FakeMemberCache({'1': 'Invited', '2': 'Invited', '3': 'Enabled'})
+        reconciler = enablesecurityhub.MembershipReconciler(member_cache, REGION, interval=0.2)
+        self.assertEqual(self.wait_together(reconciler, ['1', '2', '3']), {'1': True, '2': True, '3': True})
+        self.assertEqual(member_cache.refreshes, [['1', '2', '3']])
+        self.assertEqual(reconciler.get_status('3'), 'Enabled')
+
+    def test_refresh_failure(self):
+        member_cache = FakeMemberCache({}, EndpointConnectionError(endpoint_url='https://securityhub.eu-west-1.amazonaws.com'))
+        reconciler = enablesecurityhub.MembershipReconciler(member_cache, REGION, interval=0.01)
+        self.assertEqual(self.wait_together(reconciler, ['1']), {'1': True})
+        self.assertEqual(enablesecurityhub.events.events, [('refresh_members', 'failed')])
+
+    def test_timeout(self):
+        reconciler = enablesecurityhub.MembershipReconciler(FakeMemberCache({}), REGION, interval=5)
+        self.assertFalse(reconciler.wait_for_refresh('1', 0.05))
+
+    def test_invitation_id(self):
+        self.assertIsNone(utils.get_invitation_id({'Invitations': []}))
+        self.assertEqual(utils.get_invitation_id({'Invitations': [{'InvitationId': 'a'}, {'InvitationId': 'b'}]}), 'b')
+
+
+if __name__ == '__main__':
+    unittest.main()
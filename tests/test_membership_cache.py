@@ -0,0 +1,97 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import unittest
+
+from loader import load_utils
+
+utils = load_utils('multiaccount-enable')
+
+
+class FakeSecurityHub(object):
+    """
+    SecurityHub client of an administrator account answering list_members and get_members
+    """
+
+    def __init__(self, members, page_size=2):
+        self.members = members
+        self.page_size = page_size
+        self.calls = []
+
+    def list_members(self, OnlyAssociated, NextToken=None):
+        self.calls.append('list_members')
+        start = int(NextToken or 0)
+        accounts = sorted(self.members)
+        response = {'Members': [{'AccountId': account, 'MemberStatus': self.members[account]} for account in accounts[start:start + self.page_size]]}
+        if start + self.page_size < len(accounts):
+            response['NextToken'] = str(start + self.page_size)
+        return response
+
+    def get_members(self, AccountIds):
+        self.calls.append('get_members')
+        return {
+            'Members': [{'AccountId': account, 'MemberStatus': self.members[account]} for account in AccountIds if account in self.members],
+            'UnprocessedAccounts': [{'AccountId': account} for account in AccountIds if account not in self.members]
+        }
+
+
+class MembershipCacheTest(unittest.TestCase):
+
+    def test_listed_once_per_ttl(self):
+        client = FakeSecurityHub({'1': 'Enabled', '2': 'Invited', '3': 'Created'})
+        cache = utils.MembershipCache(client, ttl=300)
+        self.assertEqual(cache.get_members(), {'1': 'Enabled', '2': 'Invited', '3': 'Created'})
+        self.assertEqual(cache.get_status('2'), 'Invited')
+        self.assertIsNone(cache.get_status('4'))
+        self.assertEqual(client.calls, ['list_members', 'list_members'])
+
+    def test_expired(self):
+        client = FakeSecurityHub({'1': 'Enabled'})
+        cache = utils.MembershipCache(client, ttl=0)
+        cache.get_members()
+        client.members['2'] = 'Created'
+        self.assertEqual(cache.get_members(), {'1': 'Enabled', '2': 'Created'})
+
+    def test_own_changes(self):
+        client = FakeSecurityHub({'1': 'Enabled'})
+        cache = utils.MembershipCache(client)
+        cache.get_members()
+        cache.set_status(['2', '3'], 'Created')
+        cache.remove(['1'])
+        self.assertEqual(cache.get_members(), {'2': 'Created', '3': 'Created'})
+        self.assertEqual(client.calls, ['list_members'])
+
+    def test_targeted_refresh(self):
+        client = FakeSecurityHub({'1': 'Invited', '2': 'Invited'})
+        cache = utils.MembershipCache(client)
+        cache.get_members()
+        client.members['1'] = 'Enabled'
+        del client.members['2']
+        self.assertEqual(cache.refresh(['1', '2']), {'1': 'Enabled'})
+        self.assertEqual(cache.get_members(), {'1': 'Enabled'})
+        self.assertEqual(client.calls, ['list_members', 'get_members'])
+
+    def test_clear(self):
+        client = FakeSecurityHub({'1': 'Enabled'})
+        cache = utils.MembershipCache(client)
+        cache.clear()
+        self.assertEqual(cache.get_members(), {})
+        self.assertEqual(client.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import unittest
+
+from loader import load_utils
+
+utils = load_utils('multiaccount-enable')
+
+ACCOUNT = '111122223333'
+REGION = 'eu-west-1'
+FSBP_RESOURCE = 'standards/aws-foundational-security-best-practices/v/1.0.0'
+FSBP_ARN = 'arn:aws:securityhub:eu-west-1::' + FSBP_RESOURCE
+
+
+class PlanConfigActionsTest(unittest.TestCase):
+
+    def test_recording(self):
+        snapshot = utils.ConfigSnapshot([{'name': 'default'}], [{'name': 'default', 'recording': True}], [{'name': 'channel'}])
+        self.assertEqual(utils.plan_config_actions(ACCOUNT, snapshot, 'bucket'), [])
+
+    def test_nothing_configured(self):
+        snapshot = utils.ConfigSnapshot([], [], [])
+        actions = utils.plan_config_actions(ACCOUNT, snapshot, 'bucket')
+        self.assertEqual([action.name for action in actions],
+                         ['put_configuration_recorder', 'ensure_bucket', 'put_delivery_channel', 'start_configuration_recorder'])
+        self.assertIn(ACCOUNT, actions[0].params['ConfigurationRecorder']['roleARN'])
+        self.assertEqual(actions[2].params['DeliveryChannel']['s3BucketName'], 'bucket')
+        self.assertEqual(actions[3].params, {'ConfigurationRecorderName': 'default'})
+
+    def test_stopped_recorder(self):
+        snapshot = utils.ConfigSnapshot([{'name': 'custom'}], [{'name': 'custom', 'recording': False}], [{'name': 'channel'}])
+        self.assertEqual(utils.plan_config_actions(ACCOUNT, snapshot, 'bucket'),
+                         [utils.ConfigAction('start_configuration_recorder', {'ConfigurationRecorderName': 'custom'})])
+
+    def test_missing_delivery_channel(self):
+        snapshot = utils.ConfigSnapshot([{'name': 'custom'}], [{'name': 'custom', 'recording': False}], [])
+        actions = utils.plan_config_actions(ACCOUNT, snapshot, 'bucket')
+        self.assertEqual([action.name for action in actions], ['ensure_bucket', 'put_delivery_channel', 'start_configuration_recorder'])
+
+
+class PlanAccountRegionTest(unittest.TestCase):
+
+    def test_up_to_date(self):
+        inventory = utils.UnitInventory(True, [FSBP_ARN], [], 'Enabled')
+        self.assertEqual(utils.plan_account_region(inventory, REGION, [FSBP_RESOURCE]), {})
+
+    def test_new_member(self):
+        config_actions = [utils.ConfigAction('start_configuration_recorder', {'ConfigurationRecorderName': 'default'})]
+        inventory = utils.UnitInventory(False, [], config_actions, None)
+        actions = utils.plan_account_region(inventory, REGION, [FSBP_RESOURCE])
+        self.assertEqual(list(actions), ['enable_config', 'enable_security_hub', 'enable_standards', 'add_member', 'accept_invitation'])
+        self.assertEqual(actions['enable_standards'], [FSBP_RESOURCE])
+
+    def test_invited_member(self):
+        inventory = utils.UnitInventory(True, [FSBP_ARN], [], 'Invited')
+        self.assertEqual(list(utils.plan_account_region(inventory, REGION, [FSBP_RESOURCE])), ['accept_invitation'])
+
+    def test_master(self):
+        config_actions = [utils.ConfigAction('start_configuration_recorder', {'ConfigurationRecorderName': 'default'})]
+        inventory = utils.UnitInventory(True, [], config_actions, None)
+        self.assertEqual(list(utils.plan_account_region(inventory, REGION, [FSBP_RESOURCE], member=False)), ['enable_standards'])
+
+
+if __name__ == '__main__':
+    unittest.main()
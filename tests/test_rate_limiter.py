@@ -0,0 +1,121 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import inspect
+import unittest
+
+from loader import load_shared, load_utils
+
+sharedutils = load_shared()
+
+SCRIPT_DIRECTORIES = ('multiaccount-enable', 'multiaccount-product-disablement', 'nist800-53-enable', 'cis14-enable', 'automation_rules')
+
+
+class FakeHttpResponse(object):
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst(self):
+        bucket = sharedutils.TokenBucket(10, burst=2)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        delay = bucket.try_acquire()
+        self.assertGreater(delay, 0)
+        self.assertLessEqual(delay, 0.1)
+
+    def test_refill(self):
+        bucket = sharedutils.TokenBucket(10, burst=1)
+        self.assertEqual(bucket.try_acquire(), 0)
+        bucket.timestamp -= 0.1
+        self.assertEqual(bucket.try_acquire(), 0)
+
+    def test_acquire_waits(self):
+        bucket = sharedutils.TokenBucket(50, burst=1)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertLess(bucket.tokens, 1)
+
+    def test_throttled_and_recovery(self):
+        bucket = sharedutils.TokenBucket(10)
+        bucket.throttled()
+        self.assertEqual(bucket.rate, 10 * sharedutils.RATE_LIMIT_BACKOFF)
+        self.assertGreater(bucket.try_acquire(), 0)
+        for _ in range(100):
+            bucket.succeeded()
+        self.assertEqual(bucket.rate, 10)
+
+    def test_minimum_rate(self):
+        bucket = sharedutils.TokenBucket(1)
+        for _ in range(20):
+            bucket.throttled()
+        self.assertEqual(bucket.rate, sharedutils.MIN_RATE_LIMIT)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_operation_rates(self):
+        rate_limiter = sharedutils.RateLimiter(default_rate=10, operation_rates={'BatchEnableStandards': 1, 'ListMembers': 20})
+        self.assertEqual(rate_limiter.get_bucket('BatchEnableStandards', 'eu-west-1').max_rate, 1)
+        self.assertEqual(rate_limiter.get_bucket('ListMembers', 'eu-west-1').max_rate, 10)
+        self.assertEqual(rate_limiter.get_bucket('GetEnabledStandards', 'eu-west-1').max_rate, 10)
+
+    def test_buckets_per_operation_and_region(self):
+        rate_limiter = sharedutils.RateLimiter()
+        bucket = rate_limiter.get_bucket('ListMembers', 'eu-west-1')
+        self.assertIs(rate_limiter.get_bucket('ListMembers', 'eu-west-1'), bucket)
+        self.assertIsNot(rate_limiter.get_bucket('ListMembers', 'us-east-1'), bucket)
+        self.assertIsNot(rate_limiter.get_bucket('GetMembers', 'eu-west-1'), bucket)
+
+    def test_record_response(self):
+        rate_limiter = sharedutils.RateLimiter(default_rate=10)
+        bucket = rate_limiter.get_bucket('ListMembers', 'eu-west-1')
+        rate_limiter.record_response('ListMembers', 'eu-west-1', (FakeHttpResponse(400), {'Error': {'Code': 'ThrottlingException'}}))
+        self.assertEqual(bucket.rate, 5)
+        rate_limiter.record_response('ListMembers', 'eu-west-1', (FakeHttpResponse(429), {}))
+        self.assertEqual(bucket.rate, 2.5)
+        rate_limiter.record_response('ListMembers', 'eu-west-1', (FakeHttpResponse(400), {'Error': {'Code': 'InvalidInputException'}}))
+        rate_limiter.record_response('ListMembers', 'eu-west-1', None)
+        self.assertEqual(bucket.rate, 2.5)
+        rate_limiter.record_response('ListMembers', 'eu-west-1', (FakeHttpResponse(200), {}))
+        self.assertEqual(bucket.rate, 3)
+
+
+class SharedHelpersTest(unittest.TestCase):
+
+    def test_every_directory_uses_the_shared_helpers(self):
+        shared = dict((name, value) for name, value in vars(sharedutils).items()
+                      if not name.startswith('_') and getattr(value, '__module__', None) == 'sharedutils')
+        for directory in SCRIPT_DIRECTORIES:
+            utils = load_utils(directory)
+            for name, value in vars(utils).items():
+                if name in shared:
+                    self.assertIs(value, shared[name], '{}/utils.py defines its own {}'.format(directory, name))
+                elif inspect.isclass(value) or inspect.isfunction(value):
+                    self.assertNotEqual(value.__module__, 'sharedutils', '{}/utils.py renames {}'.format(directory, name))
+
+    def test_operation_rates_are_known_operations(self):
+        for directory in SCRIPT_DIRECTORIES:
+            operation_rates = getattr(load_utils(directory), 'OPERATION_RATE_LIMITS', {})
+            self.assertTrue(all(rate < sharedutils.DEFAULT_RATE_LIMIT for rate in operation_rates.values()), directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from botocore.exceptions import ClientError
+from loader import load_shared
+
+sharedutils = load_shared()
+
+AVAILABLE_REGIONS = ['eu-south-1', 'eu-west-1', 'us-east-1']
+
+
+class FakeCredentials(object):
+    access_key = 'AKIAEXAMPLE'
+
+
+class FakeSession(object):
+
+    def get_available_regions(self, service_name):
+        return list(AVAILABLE_REGIONS)
+
+    def get_credentials(self):
+        return FakeCredentials()
+
+
+class FakePaginator(object):
+
+    def __init__(self, account_client):
+        self.account_client = account_client
+
+    def paginate(self, RegionOptStatusContains):
+        self.account_client.calls += 1
+        if self.account_client.error:
+            raise self.account_client.error
+        yield {'Regions': [{'RegionName': region} for region in self.account_client.regions]}
+
+
+class FakeAccount(object):
+
+    def __init__(self, regions, error=None):
+        self.regions = regions
+        self.error = error
+        self.calls = 0
+
+    def get_paginator(self, operation_name):
+        return FakePaginator(self)
+
+
+class FakeClientPool(object):
+
+    def __init__(self, account_client):
+        self.account_client = account_client
+
+    def client(self, session, service_name, region_name=None):
+        return self.account_client
+
+
+class FakeEventLog(object):
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, step, status, **fields):
+        self.events.append((step, status))
+
+
+class EligibleRegionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_enabled_regions(self):
+        account_client = FakeAccount(['us-east-1', 'eu-west-1', 'ap-east-1'])
+        regions = sharedutils.get_eligible_regions(FakeSession(), client_pool=FakeClientPool(account_client))
+        self.assertEqual(regions, ['eu-west-1', 'us-east-1'])
+
+    def test_every_available_region(self):
+        account_client = FakeAccount(['us-east-1'])
+        regions = sharedutils.get_eligible_regions(FakeSession(), client_pool=FakeClientPool(account_client), enabled_only=False)
+        self.assertEqual(regions, AVAILABLE_REGIONS)
+        self.assertEqual(account_client.calls, 0)
+
+    def test_cached(self):
+        cache_file = os.path.join(self.directory, 'regions.json')
+        account_client = FakeAccount(['eu-west-1'])
+        for _ in range(2):
+            regions = sharedutils.get_eligible_regions(FakeSession(), cache_file=cache_file, client_pool=FakeClientPool(account_client))
+        self.assertEqual(regions, ['eu-west-1'])
+        self.assertEqual(account_client.calls, 1)
+
+    def test_list_regions_failure_is_reported(self):
+        error = ClientError({'Error': {'Code': 'AccessDeniedException', 'Message': 'denied'}}, 'ListRegions')
+        events = FakeEventLog()
+        regions = sharedutils.get_eligible_regions(FakeSession(), client_pool=FakeClientPool(FakeAccount([], error)), events=events)
+        self.assertEqual(regions, AVAILABLE_REGIONS)
+        self.assertEqual(events.events, [('list_regions', 'failed')])
+
+
+if __name__ == '__main__':
+    unittest.main()
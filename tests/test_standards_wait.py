@@ -0,0 +1,136 @@
+"""
+Copyright 2026 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify,
+merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import threading
+import unittest
+
+from loader import load_shared, load_utils
+
+sharedutils = load_shared()
+utils = load_utils('multiaccount-enable')
+
+ACCOUNT = '111122223333'
+REGION = 'eu-west-1'
+FSBP_RESOURCE = 'standards/aws-foundational-security-best-practices/v/1.0.0'
+
+
+def response(*statuses):
+    return {'StandardsSubscriptions': [{'StandardsSubscriptionArn': arn, 'StandardsStatus': status} for arn, status in statuses]}
+
+
+class FakeSecurityHub(object):
+    """
+    SecurityHub client answering get_enabled_standards with the next statuses of each subscription
+    """
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.calls = []
+
+    def get_enabled_standards(self, StandardsSubscriptionArns):
+        self.calls.append(list(StandardsSubscriptionArns))
+        return response(*[(arn, self.statuses[arn].pop(0) if len(self.statuses[arn]) > 1 else self.statuses[arn][0])
+                          for arn in StandardsSubscriptionArns])
+
+
+class FakeEventLog(object):
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, step, status, **fields):
+        self.events.append((step, status))
+
+
+class StandardsPollTest(unittest.TestCase):
+
+    def test_batches(self):
+        poll = sharedutils.StandardsPoll(['arn-{}'.format(i) for i in range(sharedutils.STANDARDS_BATCH_SIZE + 1)])
+        self.assertEqual([len(batch) for batch in poll.batches()], [sharedutils.STANDARDS_BATCH_SIZE, 1])
+
+    def test_ready(self):
+        poll = sharedutils.StandardsPoll(['a', 'b'])
+        self.assertIsNone(poll.record([response(('a', 'READY'), ('b', 'PENDING'))]))
+        standards_wait = poll.record([response(('a', 'READY'), ('b', 'READY'))])
+        self.assertTrue(standards_wait.ready)
+        self.assertEqual(standards_wait.outcome, 'READY')
+        self.assertEqual(standards_wait.polls, 2)
+
+    def test_failed(self):
+        poll = sharedutils.StandardsPoll(['a', 'b'])
+        standards_wait = poll.record([response(('a', 'FAILED'), ('b', 'PENDING'))])
+        self.assertFalse(standards_wait.ready)
+        self.assertEqual(standards_wait.outcome, 'FAILED')
+        self.assertEqual(standards_wait.status, {'a': 'FAILED', 'b': 'PENDING'})
+
+    def test_timeout(self):
+        poll = sharedutils.StandardsPoll(['a'], timeout=0)
+        self.assertEqual(poll.record([response(('a', 'PENDING'))]).outcome, 'TIMEOUT')
+
+    def test_next_delay(self):
+        poll = sharedutils.StandardsPoll(['a'], timeout=60, initial_delay=1, max_delay=4)
+        delays = [poll.next_delay() for _ in range(4)]
+        self.assertTrue(all(0 <= delay <= limit for delay, limit in zip(delays, [1, 2, 4, 4])))
+        self.assertEqual(poll.delay, 4)
+
+
+class WaitForStandardsReadyTest(unittest.TestCase):
+
+    def test_ready(self):
+        client = FakeSecurityHub({'a': ['PENDING', 'PENDING', 'READY'], 'b': ['READY']})
+        standards_wait = sharedutils.wait_for_standards_ready(client, ['a', 'b'], initial_delay=0.01)
+        self.assertEqual((standards_wait.outcome, standards_wait.polls), ('READY', 3))
+        self.assertEqual(client.calls, [['a', 'b']] * 3)
+
+    def test_timeout(self):
+        standards_wait = sharedutils.wait_for_standards_ready(FakeSecurityHub({'a': ['PENDING']}), ['a'], timeout=0.05, initial_delay=0.01)
+        self.assertEqual(standards_wait.outcome, 'TIMEOUT')
+        self.assertEqual(standards_wait.status, {'a': 'PENDING'})
+
+    def test_stopped(self):
+        stop = threading.Event()
+        stop.set()
+        standards_wait = sharedutils.wait_for_standards_ready(FakeSecurityHub({'a': ['PENDING']}), ['a'], stop=stop)
+        self.assertEqual((standards_wait.outcome, standards_wait.polls), ('STOPPED', 1))
+
+    def test_stop_interrupts_the_delay(self):
+        stop = threading.Event()
+        threading.Timer(0.05, stop.set).start()
+        standards_wait = sharedutils.wait_for_standards_ready(FakeSecurityHub({'a': ['PENDING']}), ['a'], initial_delay=20, max_delay=20, stop=stop)
+        self.assertEqual(standards_wait.outcome, 'STOPPED')
+        self.assertLess(standards_wait.elapsed, 10)
+
+
+class ReportStandardsWaitTest(unittest.TestCase):
+
+    def test_outcomes(self):
+        events = FakeEventLog()
+        regional_standards_arns = utils.get_regional_standards_arns(REGION, [FSBP_RESOURCE])
+        for outcome, ready in (('READY', True), ('FAILED', False), ('TIMEOUT', False)):
+            utils.report_standards_wait(events, ACCOUNT, REGION, regional_standards_arns, sharedutils.StandardsWait(ready, outcome, {}, 1, 0.5))
+        self.assertEqual(events.events, [('enable_standards', 'succeeded'), ('enable_standards', 'failed'), ('enable_standards', 'timeout')])
+
+    def test_subscription_arn(self):
+        standards_arns = utils.get_regional_standards_arns(REGION, [FSBP_RESOURCE, utils.CIS_STANDARD_ARN])
+        self.assertEqual([utils.get_standards_subscription_arn(ACCOUNT, REGION, standard) for standard in standards_arns], [
+            'arn:aws:securityhub:eu-west-1:111122223333:subscription/aws-foundational-security-best-practices/v/1.0.0',
+            'arn:aws:securityhub:eu-west-1:111122223333:subscription/cis-aws-foundations-benchmark/v/1.2.0'
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()